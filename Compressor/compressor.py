@@ -16,6 +16,7 @@ from PyQt5 import QtCore
 from PyQt5 import QtWidgets
 
 import PyTango as PT
+from PyQTango import EventDispatcher
 
 from Ui_compressor import Ui_Compressor
 
@@ -24,9 +25,6 @@ class Compressor(QtWidgets.QMainWindow, Ui_Compressor):
 
     """ HE compressor control """
 
-    # Tango change event signal
-    tango_event = QtCore.pyqtSignal(PT.EventData)
-
     def __init__(self, debug=False, parent=None):
         # Parent constructors
         QtWidgets.QMainWindow.__init__(self, parent)
@@ -68,8 +66,8 @@ class Compressor(QtWidgets.QMainWindow, Ui_Compressor):
         self.velocity.setTangoAttribute(self.dev.name() + "/Velocity")
         self.acceleration.setTangoAttribute(self.dev.name() + "/Acceleration")
 
-        # Connect event to slot
-        self.tango_event.connect(self.event_handler)
+        # Deliver events to slot
+        self.dispatcher = EventDispatcher(self.event_handler, self)
 
         # Subscribe events
         try:
@@ -115,7 +113,7 @@ class Compressor(QtWidgets.QMainWindow, Ui_Compressor):
     def event_callback(self, event):
         """ Event callback
         """
-        self.tango_event.emit(event)
+        self.dispatcher.push(event)
 
     @QtCore.pyqtSlot(PT.EventData)
     def event_handler(self, ev):
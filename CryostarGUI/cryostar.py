@@ -20,14 +20,11 @@ from PyQt5 import QtGui
 from Ui_cryostar import Ui_Cryostar
 
 import PyTango as PT
-from PyQTango import QStatusLed
+from PyQTango import QStatusLed, EventDispatcher
 
 
 class CryostarGUI(QtWidgets.QMainWindow, Ui_Cryostar):
 
-    # Tango change event signal
-    tango_event = QtCore.pyqtSignal(PT.EventData)
-
     """ Constructor
     """
     def __init__(self, parent=None):
@@ -68,8 +65,8 @@ class CryostarGUI(QtWidgets.QMainWindow, Ui_Cryostar):
             QtWidgets.QMessageBox.critical(self, "Device not found", "The water valve device is missing or is not running")
             exit(-1)
 
-        # Connect event to slot
-        self.tango_event.connect(self.event_handler)
+        # Deliver events to slot
+        self.dispatcher = EventDispatcher(self.event_handler, self)
 
         # Subscribe all the relevant events
         self.eid_c = []
@@ -110,7 +107,7 @@ class CryostarGUI(QtWidgets.QMainWindow, Ui_Cryostar):
     def event_callback(self, event):
         """ Event callback
         """
-        self.tango_event.emit(event)
+        self.dispatcher.push(event)
 
     @QtCore.pyqtSlot(PT.EventData)
     def event_handler(self, event):
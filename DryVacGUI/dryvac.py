@@ -6,6 +6,11 @@ Created on Mon Jul 13 13:16:03 2015
 @author: wyrdmeister
 """
 
+import sys
+import os
+## Add import paths
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
 from PyQt5 import QtCore
 from PyQt5 import QtWidgets
 
@@ -13,13 +18,11 @@ from Ui_dryvac import Ui_DryVacGUI
 
 import time
 import PyTango as PT
+from PyQTango import EventDispatcher
 
 
 class DryVacGUI(QtWidgets.QMainWindow, Ui_DryVacGUI):
 
-    # Tango change event signal
-    tango_event = QtCore.pyqtSignal(PT.EventData)
-
     """ Constructor
     """
     def __init__(self, parent=None):
@@ -43,8 +46,8 @@ class DryVacGUI(QtWidgets.QMainWindow, Ui_DryVacGUI):
         self.dev = PT.DeviceProxy("udyni/vacuum/mainpump01")
         self.dev.ping()
 
-        # Connect event to slot
-        self.tango_event.connect(self.event_handler)
+        # Deliver events to slot
+        self.dispatcher = EventDispatcher(self.event_handler, self)
 
         # Subscribe all the relevant events
         self.dev.subscribe_event("FreqSetpoint", PT.EventType.CHANGE_EVENT, self.event_callback)
@@ -85,7 +88,7 @@ class DryVacGUI(QtWidgets.QMainWindow, Ui_DryVacGUI):
         """ Event callback
         """
         if not event.err:
-            self.tango_event.emit(event)
+            self.dispatcher.push(event)
 
     @QtCore.pyqtSlot(PT.EventData)
     def event_handler(self, event):
@@ -0,0 +1,878 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 11:05:42 2026
+
+Beam analysis engine of LaserCamera. This module does not depend on Qt, so that the same analysis can
+run in the GUI, in batch jobs and in background services.
+
+When executed as a script it analyzes the frames recorded by LaserCamera in an HDF5 file, in parallel
+on all the available cores.
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import concurrent.futures
+import numpy as np
+import h5py as h5
+import cv2
+from scipy.optimize import curve_fit, least_squares
+
+
+def clipped_mean(values, nsigma=3.0):
+    """ Robust background level along the last axis of values. Mean of the values within nsigma standard
+        deviations (estimated from the median absolute deviation) of the median. Unlike the median alone,
+        it is not biased by the quantization of integer images
+    """
+    values = np.asarray(values, dtype=np.float64)
+    med = np.median(values, axis=-1, keepdims=True)
+    dev = np.abs(values - med)
+    lim = np.maximum(nsigma * 1.4826 * np.median(dev, axis=-1, keepdims=True), 1.0)
+    keep = dev <= lim
+    return (values * keep).sum(axis=-1) / keep.sum(axis=-1)
+
+
+class SpotTracker(object):
+    """ Give persistent identities to the spots of an image
+
+    Spots are matched to the tracks of the previous frame by nearest neighbour, closest pairs first, up to
+    max_distance pixels. Unmatched spots start new tracks and tracks unmatched for more than max_missed
+    frames are dropped.
+    """
+
+    def __init__(self, max_distance=20.0, max_missed=5):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.tracks = {}
+        self.next_id = 0
+        self.timestamp = None
+
+    def match(self, spots):
+        """ Match spots to the current tracks. Return a list of track ids (None for unmatched spots)
+        """
+        ids = [None] * len(spots)
+        if len(spots) == 0 or len(self.tracks) == 0:
+            return ids
+        track_ids = list(self.tracks.keys())
+        tp = np.array([self.tracks[t][0:2] for t in track_ids])
+        sp = np.array([s[0:2] for s in spots])
+        dist = np.hypot(tp[:, np.newaxis, 0] - sp[np.newaxis, :, 0], tp[:, np.newaxis, 1] - sp[np.newaxis, :, 1])
+        used = set()
+        for k in np.argsort(dist, axis=None):
+            (ti, si) = np.unravel_index(k, dist.shape)
+            if dist[ti, si] > self.max_distance:
+                break
+            if ids[si] is None and ti not in used:
+                ids[si] = track_ids[ti]
+                used.add(ti)
+        return ids
+
+    def update(self, spots, timestamp=None):
+        """ Match spots and update the tracks. Return a list of (id, spot)
+        """
+        ids = self.match(spots)
+        for (i, s) in enumerate(spots):
+            if ids[i] is None:
+                ids[i] = self.next_id
+                self.next_id += 1
+            self.tracks[ids[i]] = [s[0], s[1], 0]
+        for t in list(self.tracks.keys()):
+            if t not in ids:
+                self.tracks[t][2] += 1
+                if self.tracks[t][2] > self.max_missed:
+                    del self.tracks[t]
+        self.timestamp = timestamp
+        return list(zip(ids, spots))
+
+    def reset(self):
+        self.tracks = {}
+        self.next_id = 0
+        self.timestamp = None
+
+
+class CentroidScratch(object):
+    """ Preallocated buffers for the centroid computation of frames of a given shape and type
+
+    Buffers are reused from frame to frame so that the thresholding pipeline does not allocate
+    full frame temporaries. Each analysis thread needs its own instance.
+    """
+
+    # Structuring element for the opening of the threshold mask
+    element = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2))
+
+    def __init__(self, shape, dtype):
+        self.shape = shape
+        self.dtype = dtype
+        # Corner indexes (up to 10x10 pixels in each corner)
+        n = min(10, shape[0], shape[1])
+        self.corner_size = n
+        self.corner_rows = np.r_[0:n, shape[0]-n:shape[0]][:, np.newaxis]
+        self.corner_cols = np.r_[0:n, shape[1]-n:shape[1]]
+        # Threshold masks
+        self.mask = np.empty(shape, dtype=np.uint8)
+        self.opened = np.empty(shape, dtype=np.uint8)
+        # Contour mask and masked image
+        self.contour = np.empty(shape, dtype=np.uint8)
+        self.masked = np.empty(shape, dtype=dtype)
+        # Background subtracted image
+        self.work = np.empty(shape, dtype=dtype)
+        # Connected component labels
+        self.labels = np.empty(shape, dtype=np.int32)
+
+    def matches(self, img):
+        return img.shape == self.shape and img.dtype == self.dtype
+
+    def corners(self, img):
+        """ Background level of the four corners of the image
+        """
+        n = self.corner_size
+        return clipped_mean(img[self.corner_rows, self.corner_cols].reshape(2, n, 2, n).transpose(0, 2, 1, 3).reshape(4, n * n))
+
+
+class GaussFitter(object):
+
+    def __init__(self):
+        # Warm start. When enabled, 2D fits called with a key are seeded with the last solution for that key
+        self.warm_start = True
+        self.residual_jump = 2.0
+        # Maximum number of function evaluations of a seeded fit
+        self.seeded_nfev = 30
+        # Function and jacobian evaluations of all the 2D fits (statistics only, not updated atomically)
+        self.nfev = 0
+        self.njev = 0
+        # Last (parameters, residual) of each key. Stored and read as a single item, as fits run in the
+        # analysis workers while reset() is called from the GUI
+        self.solutions = {}
+
+    def warm_guess(self, key):
+        """ Get the last solution for key, or None if warm start is not possible
+        """
+        if self.warm_start and key is not None:
+            last = self.solutions.get(key)
+            if last is not None:
+                return last[0]
+        return None
+
+    def accept_warm(self, key, residual):
+        """ Check that the residual of a warm started fit did not jump with respect to the last one. The warm
+            start is rejected if the solution of key was reset in the meantime
+        """
+        last = self.solutions.get(key)
+        return last is not None and residual <= self.residual_jump * last[1]
+
+    def store_solution(self, key, popt, residual):
+        """ Store the solution of a fit as the seed for the next one
+        """
+        if key is not None:
+            self.solutions[key] = (popt, max(residual, np.finfo(np.float64).tiny))
+
+    def reset(self, key=None):
+        """ Forget the stored solutions (of key only if given)
+        """
+        if key is None:
+            self.solutions = {}
+        else:
+            self.solutions.pop(key, None)
+
+    def initial_guess(self, x, y):
+        baseline = np.min(y)
+        maximum = np.max(y) - baseline
+        id_max = np.argmax(y)
+        mean = x[id_max]
+        # FWHM = 2 * sqrt(2 * log(2)) * sigma
+        y_fwhm = np.abs(y - baseline - maximum/2)
+        if id_max > 0:
+            fwhm_id1 = np.argmin(y_fwhm[0:id_max])
+        else:
+            fwhm_id1 = 0
+        if id_max < len(y_fwhm):
+            fwhm_id2 = id_max + np.argmin(y_fwhm[id_max:])
+        else:
+            fwhm_id2 = len(y_fwhm) - 1
+        fwhm = x[fwhm_id2] - x[fwhm_id1]
+        sigma = fwhm / 2 / np.sqrt(2 * np.log(2))
+        return (baseline, maximum, mean, sigma)
+
+    def fit(self, x, y):
+        guess = self.initial_guess(x, y)
+        popt, pcov = curve_fit(self.gaussian_1D, x, y, guess)
+        return popt
+
+    def batch_guess(self, x, Y, W, passes=2):
+        """ Closed form initial guess for fit_batch. The gaussian is a parabola in log scale, which is fitted
+            by weighted least squares (weights y^2) to the points above 25% of the maximum. Baseline and
+            maximum are then solved exactly by linear least squares and the log-parabola fit is repeated
+        """
+        n = Y.shape[0]
+        valid = W > 0
+        # Low percentile rather than minimum, which is biased by the noise
+        baseline = np.nanpercentile(np.where(valid, Y, np.nan), 10, axis=1)
+
+        # Scaled coordinates for a well conditioned system
+        xc = np.mean(x)
+        xs = max(np.ptp(x) / 2.0, 1e-12)
+        u = (x - xc) / xs
+        U = np.stack([u**k for k in range(5)], axis=-1)
+        dx = np.abs(x[-1] - x[0]) / max(len(x) - 1, 1)
+
+        guess = np.empty((n, 4))
+        for i in range(passes):
+            yb = Y - baseline[:, np.newaxis]
+            maximum = np.where(valid, yb, -np.inf).max(axis=1)
+            sel = valid & (yb > 0.25 * maximum[:, np.newaxis])
+            w = np.where(sel, yb**2, 0.0)
+            ly = np.log(np.where(sel, yb, 1.0))
+            S = np.dot(w, U)
+            T = np.dot(w * ly, U[:, 0:3])
+            M = np.stack([S[:, 0:3], S[:, 1:4], S[:, 2:5]], axis=1) + 1e-12 * np.eye(3)
+            (a, b, c) = np.linalg.solve(M, T[..., np.newaxis])[..., 0].T
+
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                mean = xc + xs * (-b / (2 * c))
+                sigma = xs * np.sqrt(-1.0 / (2 * c))
+            ok = (c < 0) & np.isfinite(mean) & np.isfinite(sigma) & (mean >= min(x[0], x[-1])) & (mean <= max(x[0], x[-1]))
+
+            # Fallback on maximum position and FWHM
+            fwhm = np.maximum(np.sum(valid & (yb > maximum[:, np.newaxis] / 2), axis=1), 1) * dx
+            guess[:, 2] = np.where(ok, mean, x[np.argmax(np.where(valid, yb, -np.inf), axis=1)])
+            guess[:, 3] = np.where(ok, sigma, fwhm / 2 / np.sqrt(2 * np.log(2)))
+
+            # Baseline and maximum are linear parameters once mean and sigma are fixed
+            e = np.exp(-(x[np.newaxis, :] - guess[:, 2:3])**2 / (2 * guess[:, 3:4]**2)) * W
+            s_w = np.sum(W, axis=1)
+            s_e = np.sum(e, axis=1)
+            s_ee = np.sum(e * e, axis=1)
+            s_y = np.sum(W * Y, axis=1)
+            s_ey = np.sum(e * Y, axis=1)
+            det = s_w * s_ee - s_e**2
+            with np.errstate(divide='ignore', invalid='ignore'):
+                lin_b = (s_ee * s_y - s_e * s_ey) / det
+                lin_a = (s_w * s_ey - s_e * s_y) / det
+            lin = np.isfinite(lin_b) & np.isfinite(lin_a) & (lin_a > 0)
+            guess[:, 0] = np.where(lin, lin_b, baseline)
+            guess[:, 1] = np.where(lin, lin_a, maximum)
+            baseline = guess[:, 0]
+        return guess
+
+    def batch_residuals(self, x, Y, W, p):
+        """ Weighted residuals and jacobian of the gaussian model for each row
+        """
+        d = x[np.newaxis, :] - p[:, 2:3]
+        s2 = p[:, 3:4]**2
+        e = np.exp(-d**2 / (2 * s2))
+        r = W * (Y - p[:, 0:1] - p[:, 1:2] * e)
+        J = np.empty(Y.shape + (4, ))
+        J[..., 0] = W
+        J[..., 1] = W * e
+        J[..., 2] = W * p[:, 1:2] * e * d / s2
+        J[..., 3] = W * p[:, 1:2] * e * d**2 / (s2 * p[:, 3:4])
+        return (r, J)
+
+    def fit_batch(self, x, Y, valid=None, iterations=5):
+        """ 1D gaussian fit of all the rows of Y at once
+            x is the common abscissa and valid an optional boolean mask of the points to use for each row
+            (to fit profiles of different lengths padded to the same size). Return an (N, 4) array of
+            (baseline, maximum, mean, sigma). The closed form guess is refined with vectorized damped
+            Gauss-Newton iterations; the step is accepted only for the rows where the residual decreases
+        """
+        x = np.asarray(x, dtype=np.float64)
+        Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+        W = np.ones(Y.shape) if valid is None else np.asarray(valid, dtype=np.float64)
+
+        p = self.batch_guess(x, Y, W)
+        (r, J) = self.batch_residuals(x, Y, W, p)
+        sse = np.sum(r**2, axis=1)
+        lam = np.full(Y.shape[0], 1e-3)
+        eye = np.eye(4)
+        for i in range(iterations):
+            Jt = J.transpose(0, 2, 1)
+            JTJ = np.matmul(Jt, J)
+            JTr = np.matmul(Jt, r[..., np.newaxis])[..., 0]
+            A = JTJ + lam[:, np.newaxis, np.newaxis] * JTJ * eye + 1e-12 * eye
+            with np.errstate(all='ignore'):
+                delta = np.linalg.solve(A, JTr[..., np.newaxis])[..., 0]
+                pn = p + delta
+                pn[:, 3] = np.abs(pn[:, 3])
+                (rn, Jn) = self.batch_residuals(x, Y, W, pn)
+                ssen = np.sum(rn**2, axis=1)
+            better = np.isfinite(ssen) & (ssen < sse)
+            p[better] = pn[better]
+            r[better] = rn[better]
+            J[better] = Jn[better]
+            sse[better] = ssen[better]
+            lam = np.where(better, lam * 0.3, lam * 10)
+        return p
+
+    def fit_profiles(self, profiles):
+        """ 1D gaussian fit of a list of profiles with fit_batch. Profiles shorter than the longest one are padded
+            and masked out of the fit. The abscissa is the pixel index
+        """
+        n = max(len(p) for p in profiles)
+        Y = np.zeros((len(profiles), n))
+        valid = np.zeros((len(profiles), n), dtype=bool)
+        for (i, p) in enumerate(profiles):
+            Y[i, 0:len(p)] = p
+            valid[i, 0:len(p)] = True
+        return self.fit_batch(np.arange(n), Y, valid)
+
+    def gaussian_1D(self, x, baseline, maximum, mean, sigma):
+        """ 1D gaussian function
+        """
+        return baseline + maximum * np.exp( -np.power(x - mean, 2) / (2 * np.power(sigma, 2)))
+
+    def gaussian_2D_angle(self, x, y, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y, theta):
+        """ 2D gaussian function with rotation
+        """
+        a = (np.cos(theta)**2)/(2*sigma_x**2) + (np.sin(theta)**2)/(2*sigma_y**2)
+        b = -(np.sin(2*theta))/(4*sigma_x**2) + (np.sin(2*theta))/(4*sigma_y**2)
+        c = (np.sin(theta)**2)/(2*sigma_x**2) + (np.cos(theta)**2)/(2*sigma_y**2)
+        g = baseline + maximum * np.exp( - (a * ((x - mean_x)**2) + 2 * b * (x - mean_y) * (y - mean_y) + c * ((y - mean_y)**2)) )
+        return g
+
+    def gaussian_2D(self, x, y, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y):
+        return baseline + maximum * np.exp( - ( (x - mean_x)**2 / (2 * sigma_x**2) + (y - mean_y)**2 / (2 * sigma_y**2) ) )
+
+    def gaussian_2D_model(self, X, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y):
+        """ 2D gaussian model
+        """
+        x, y = X
+        g = self.gaussian_2D(x, y, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y)
+        return g.ravel()
+
+    def moments_2d(self, x, y, z, baseline=0.0, iterations=5, window=None):
+        """ Beam parameters from the first and second moments of the image (ISO 11146)
+
+        The baseline is subtracted from the image. As in ISO 11146 the moments are computed iteratively over
+        an integration area three times the beam diameter, to limit the contribution of the background noise.
+        At each iteration the baseline is estimated again from a band of pixels around the integration area,
+        as any residual offset is weighted by the square of the distance from the center. If window is given
+        as (c0, c1, r0, r1) the first estimate uses only z[r0:r1, c0:c1].
+        Return (mean_x, mean_y, sigma_1, sigma_2, theta), where sigma_1 and sigma_2 are the widths along
+        the principal axes and theta is the angle (in radians) of the first principal axis with respect to
+        the x axis. Return None if the image has no signal.
+        """
+        (c0, c1, r0, r1) = window if window is not None else (0, len(x), 0, len(y))
+        params = None
+        for i in range(iterations):
+            w = np.subtract(z[r0:r1, c0:c1], baseline, dtype=np.float64)
+            if i == 0:
+                # First estimate only from the pixels above the 1/e^2 level, as the noise of the background
+                # over the full frame would dominate the second moments
+                w[w <= 0.135 * np.max(w)] = 0.0
+            xw = x[c0:c1]
+            yw = y[r0:r1]
+            # Profiles
+            h = w.sum(axis=0)
+            v = w.sum(axis=1)
+            m00 = h.sum()
+            if m00 <= 0:
+                return params
+            # First moments
+            mean_x = h.dot(xw) / m00
+            mean_y = v.dot(yw) / m00
+            # Second moments
+            dx = xw - mean_x
+            dy = yw - mean_y
+            sxx = h.dot(dx * dx) / m00
+            syy = v.dot(dy * dy) / m00
+            sxy = dy.dot(w).dot(dx) / m00
+            if sxx <= 0 or syy <= 0:
+                return params
+            # Principal axes
+            theta = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+            delta = np.sqrt((sxx - syy)**2 + 4 * sxy**2)
+            sigma_1 = np.sqrt(0.5 * (sxx + syy + delta))
+            sigma_2 = np.sqrt(max(0.5 * (sxx + syy - delta), 0.0))
+            params = (mean_x, mean_y, sigma_1, sigma_2, theta)
+            # New integration area (3 times the 4 sigma diameter)
+            window = (int(np.searchsorted(x, mean_x - 6 * np.sqrt(sxx))), int(np.searchsorted(x, mean_x + 6 * np.sqrt(sxx))) + 1,
+                      int(np.searchsorted(y, mean_y - 6 * np.sqrt(syy))), int(np.searchsorted(y, mean_y + 6 * np.sqrt(syy))) + 1)
+            if window == (c0, c1, r0, r1):
+                break
+            (c0, c1, r0, r1) = window
+            baseline = self.band_background(z, window, baseline)
+        return params
+
+    def band_background(self, z, window, default=0.0, width=16):
+        """ Background level of the pixels of z in a band of width pixels around window (c0, c1, r0, r1)
+            Return default if the window covers the whole image
+        """
+        (c0, c1, r0, r1) = window
+        (b0, b1, a0, a1) = (max(c0 - width, 0), min(c1 + width, z.shape[1]), max(r0 - width, 0), min(r1 + width, z.shape[0]))
+        band = [z[a0:r0, b0:b1], z[r1:a1, b0:b1], z[r0:r1, b0:c0], z[r0:r1, c1:b1]]
+        band = [b.ravel() for b in band if b.size]
+        if len(band) == 0:
+            return default
+        return float(clipped_mean(np.concatenate(band)))
+
+    def bin_axis(self, x, binning):
+        """ Average blocks of binning consecutive coordinates
+        """
+        n = len(x) // binning * binning
+        return x[0:n].reshape(-1, binning).mean(axis=1)
+
+    def bin_image(self, z, binning):
+        """ Average blocks of binning x binning pixels
+        """
+        ny = z.shape[0] // binning * binning
+        nx = z.shape[1] // binning * binning
+        return z[0:ny, 0:nx].reshape(ny // binning, binning, nx // binning, binning).mean(axis=(1, 3))
+
+    def fit_2d(self, x, y, z, roi=None, binning=1, refine=False, key=None):
+        """ 2D gaussian fit of the image z
+
+        If roi is given as (x, y, width, height) the fit runs only on that part of the image. If binning is
+        larger than one the fit runs on an image binned by binning x binning pixels and, if refine is True,
+        the result is used as initial guess of a fit at full resolution. If key is given the fit is seeded
+        with the last solution for the same key.
+        """
+        # Crop to ROI
+        if roi is not None:
+            (c0, r0, w, h) = roi
+            x = x[c0:c0+w]
+            y = y[r0:r0+h]
+            z = z[r0:r0+h, c0:c0+w]
+
+        # Binned fit (only if the binned image is still large enough)
+        if binning > 1 and min(z.shape) >= 8 * binning:
+            xb = self.bin_axis(x, binning)
+            yb = self.bin_axis(y, binning)
+            zb = self.bin_image(z, binning)
+            popt = self.fit_2d_image(xb, yb, zb, key=None if key is None else (key, binning))
+            # Remove the broadening due to the averaging over the bin
+            popt = np.array(popt, dtype=np.float64)
+            popt[4:6] = np.sqrt(np.maximum(popt[4:6]**2 - (binning**2 - 1) / 12.0, 0.25))
+            if not refine:
+                return popt
+            return self.fit_2d_image(x, y, z, popt)
+
+        return self.fit_2d_image(x, y, z, key=key)
+
+    def fit_2d_image(self, x, y, z, guess=None, key=None):
+        """ 2D gaussian fit of a full image
+
+        If guess is None the fit is seeded with the last solution for key, if available, otherwise an
+        initial guess is computed from the image. The initial guess is used also when the residual of the
+        seeded fit jumps with respect to the previous frame.
+        """
+        # Get baseline by comapring corners of the image
+        n = max(1, min(10, min(z.shape) // 5))
+        corners = np.mean(z[0:n,0:n])                      # Up left
+        corners = np.append(corners, np.mean(z[0:n,-n:]))  # Up right
+        corners = np.append(corners, np.mean(z[-n:,0:n]))  # Down left
+        corners = np.append(corners, np.mean(z[-n:,-n:]))  # Down right
+        xx, yy = np.meshgrid(x, y)
+
+        # Warm start
+        warm = self.warm_guess(key) if guess is None else None
+        if warm is not None:
+            (popt, residual) = self.curve_fit_2d(xx, yy, z, warm, corners, seeded=True)
+            if popt is not None and self.accept_warm(key, residual):
+                self.store_solution(key, popt, residual)
+                return popt
+
+        if guess is None:
+            # Get h and v profiles to estimate mean and sigma
+            v = np.sum(z, axis=1) / z.shape[1]
+            h = np.sum(z, axis=0) / z.shape[0]
+            gh = self.initial_guess(x, h)
+            gv = self.initial_guess(y, v)
+            baseline = np.mean(corners[corners <= np.median(corners)])
+            # Get maximum
+            maximum = np.max(z) - baseline
+            # Compose initial guess
+            guess = (baseline, maximum, gh[2], gv[2], gh[3], gv[3])
+
+        (popt, residual) = self.curve_fit_2d(xx, yy, z, guess, corners)
+        if popt is None:
+            print("[D] Fit failed")
+            return guess
+        self.store_solution(key, popt, residual)
+        return popt
+
+    def curve_fit_2d(self, xx, yy, z, guess, corners, seeded=False):
+        """ Run the bounded 2D fit starting from guess. Return the parameters and the RMS residual
+            or (None, None) if the fit fails
+
+        A seeded fit starts from the solution of the previous frame, so it has a reduced budget of function
+        evaluations and looser tolerances. It fails if it does not converge within the budget.
+        """
+        # Lower and upper bounds
+        lower_l = (0, guess[1] * 0.8, guess[2] * 0.8, guess[3] * 0.8, guess[4] * 0.8, guess[5] * 0.8)
+        upper_l = (max(np.max(corners), guess[0] * 1.2), guess[1] * 1.2, guess[2] * 1.2, guess[3] * 1.2, guess[4] * 1.2, guess[5] * 1.2)
+        guess = np.clip(guess, lower_l, upper_l)
+        zr = z.ravel()
+        if seeded:
+            # The iterative trust region solver avoids the SVD of the full jacobian at each step
+            options = dict(max_nfev=self.seeded_nfev, ftol=1e-6, xtol=1e-6, x_scale=np.maximum(np.abs(guess), 1.0), tr_solver='lsmr')
+        else:
+            options = dict(max_nfev=10000)
+        try:
+            res = least_squares(lambda p: self.gaussian_2D_model((xx, yy), *p) - zr, guess, bounds=(lower_l, upper_l), **options)
+        except ValueError:
+            return (None, None)
+        self.nfev += res.nfev
+        self.njev += res.njev
+        if res.status <= 0:
+            return (None, None)
+        # Residual of the solution, already evaluated by the optimizer
+        residual = np.sqrt(np.mean(res.fun**2))
+        return (res.x, residual)
+
+
+class BeamAnalyzer(object):
+    """ Beam analysis of single frames
+
+    analyze() takes a frame and returns a dict with the requested results:
+        centroid    (x, y, ellipse) of the main beam, or None if no beam is found. The ellipse is
+                    (x, y, width, height[, angle]) with width and height equal to 2*sqrt(2) sigma
+        spots       list of (x, y, ellipse, area) of all the spots, sorted by decreasing intensity
+        profiles    (v, h) vertical and horizontal profiles of the frame
+        fits        (2, 4) gauss fit (baseline, maximum, mean, sigma) of the (v, h) profiles
+
+    The compute_* methods can also be called on their own. They are thread safe, as the scratch buffers
+    are allocated per thread, but warm started fits with the same key should not run concurrently.
+    The key identifies the image source (the attribute name in LaserCamera) and selects the dark frame
+    and the warm start solution.
+    """
+
+    engines = ('fit', 'moments')
+
+    def __init__(self, engine='fit', fit_roi=True, fit_binning=1, fit_refine=False, spot_min_area=20, debug=False):
+        if engine not in self.engines:
+            raise ValueError("unknown beam estimator '{0}'".format(engine))
+        self.gf = GaussFitter()
+        self.centroid_engine = engine
+        self.fit_roi = fit_roi
+        self.fit_binning = fit_binning
+        self.fit_refine = fit_refine
+        self.spot_min_area = spot_min_area
+        self.debug_enabled = debug
+
+        # Per thread scratch buffers for the centroid computation
+        self.scratch = threading.local()
+
+        # Dark frames for background subtraction
+        self.dark_frames = {}
+        self.dark_subtract = False
+
+    def analyze(self, img, key=None, spots=False, profiles=False):
+        """ Analyze a frame. Return a dict with the centroid and, if requested, the spots and the profile fits
+        """
+        result = {'centroid': self.compute_centroid(img, key)}
+        if spots:
+            result['spots'] = self.compute_spots(img, key)
+        if profiles:
+            result['profiles'] = self.compute_profiles(img)
+            result['fits'] = self.fit_profiles(img, result['profiles'])
+        return result
+
+    def compute_profiles(self, img):
+        """ Vertical and horizontal profiles (mean over rows and columns) of the image
+        """
+        v = np.sum(img, axis=1) / img.shape[1]
+        h = np.sum(img, axis=0) / img.shape[0]
+        return (v, h)
+
+    def fit_profiles(self, img, profiles=None):
+        """ Gauss fit of the vertical and horizontal profiles of the image in a single batch
+            Return a (2, 4) array with the (baseline, maximum, mean, sigma) of the (v, h) profiles
+        """
+        if profiles is None:
+            profiles = self.compute_profiles(img)
+        return self.gf.fit_profiles(profiles)
+
+    def contour_roi(self, contour, shape):
+        """ Get a fit ROI around a contour, extended by the contour size on each side
+        """
+        (x, y, w, h) = cv2.boundingRect(contour)
+        x0 = max(x - w, 0)
+        y0 = max(y - h, 0)
+        x1 = min(x + 2 * w, shape[1])
+        y1 = min(y + 2 * h, shape[0])
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def check_mean(self, corners):
+        """ Mean of the corners not above the median, to reject corners hit by the beam
+        """
+        return np.mean(corners[corners <= np.median(corners)])
+
+    def get_scratch(self, img):
+        """ Get the scratch buffers of the calling thread for the shape and type of img
+        """
+        scratch = getattr(self.scratch, 'buffers', None)
+        if scratch is None or not scratch.matches(img):
+            scratch = CentroidScratch(img.shape, img.dtype)
+            self.scratch.buffers = scratch
+        return scratch
+
+    def threshold_image(self, img, key=None):
+        """ Dark subtraction, background estimation and thresholding of the image
+            Return (img, scratch, background, mask) or None if there is no signal. img is dark subtracted if enabled
+        """
+        scratch = self.get_scratch(img)
+
+        # Subtract the dark frame (saturating to zero)
+        dark = self.dark_frames.get(key) if self.dark_subtract else None
+        if dark is not None and dark.shape == img.shape and dark.dtype == img.dtype:
+            img = cv2.subtract(img, dark, dst=scratch.work)
+
+        # Find background of the image from the four corners. Kept as float, as truncation
+        # would leave an offset in the background subtracted image
+        background = float(self.check_mean(scratch.corners(img)))
+
+        # Find maximum value of the image
+        img_max = int(img.max())
+        self.debug("Centroid: Background = {0:.1f}, Max = {1:d}".format(background, img_max))
+
+        # Check if we have at least some singal
+        if np.abs(img_max - background) <= 10:
+            return None
+
+        # Compute threshold
+        th = int(0.33 * (img_max - background))
+        self.debug("Centroid: threshold = {0:d}".format(th))
+
+        # Threshold the image and remove isolated pixels
+        mask = cv2.compare(img, th, cv2.CMP_GE, dst=scratch.mask)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, scratch.element, dst=scratch.opened)
+        return (img, scratch, background, mask)
+
+    def compute_centroid(self, img, key=None):
+        """ Compute a centroid from the image. key identifies the image source for warm started fits
+        """
+        th = self.threshold_image(img, key)
+        if th is not None:
+            (img, scratch, background, mask) = th
+
+            # Find contours in the mask and inititalize the current
+            # (x,y) of the ball
+            cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if len(cnts) == 3:
+                cnts = cnts[1]
+            else:
+                cnts = cnts[0]
+            self.debug("Centroid: found {0:d} contours".format(len(cnts)))
+
+            # Proceed only if at least one contour is found
+            if len(cnts) > 0:
+                # Get the contour with the largest area
+                c = max(cnts, key=cv2.contourArea)
+
+                # Fit ellipse
+                #ellipse = cv2.fitEllipse(c)
+
+                ## Beam size
+                x = np.arange(img.shape[1])
+                y = np.arange(img.shape[0])
+                if self.fit_roi:
+                    roi = self.contour_roi(c, img.shape)
+                else:
+                    roi = None
+                if self.centroid_engine == 'moments':
+                    # Second moments. Params: mean_x, mean_y, sigma_1, sigma_2, theta
+                    # The ROI is only the first integration area, the background is estimated around it
+                    if roi is not None:
+                        (c0, r0, w, h) = roi
+                        params = self.gf.moments_2d(x, y, img, background, window=(c0, c0+w, r0, r0+h))
+                    else:
+                        params = self.gf.moments_2d(x, y, img, background)
+                    if params is None:
+                        return None
+                    ellipse = (params[0], params[1], 2*np.sqrt(2)*params[2], 2*np.sqrt(2)*params[3], np.degrees(params[4]))
+                else:
+                    # Gauss 2D fit. Params: baseline, maximum, mean_x, mean_y, sigma_x, sigma_y
+                    params = self.gf.fit_2d(x, y, img, roi=roi, binning=self.fit_binning, refine=self.fit_refine, key=key)
+                    ellipse = (params[2], params[3], 2*np.sqrt(2)*params[4], 2*np.sqrt(2)*params[5])
+                self.debug("Ellipse: {0!s}".format(ellipse))
+
+                # Create a mask from the single contour, only in its bounding box
+                (c0, r0, w, h) = cv2.boundingRect(c)
+                cmask = scratch.contour[r0:r0+h, c0:c0+w]
+                cmask.fill(0)
+                cv2.drawContours(cmask, [c], 0, 1, -1, offset=(-c0, -r0))
+
+                # Take the moments to get the centroid (by using the masked image)
+                masked = np.multiply(img[r0:r0+h, c0:c0+w], cmask, out=scratch.masked[r0:r0+h, c0:c0+w], casting='unsafe')
+                moments = cv2.moments(masked)
+                if moments['m00'] != 0:
+                    centroid_x = c0 + (moments['m10']/moments['m00'])
+                    centroid_y = r0 + (moments['m01']/moments['m00'])
+                    return (centroid_x, centroid_y, ellipse)
+
+        return None
+
+    def compute_spots(self, img, key=None):
+        """ Find all the spots in the image with a single connected components pass
+            Return a list of (x, y, ellipse, area) sorted by decreasing intensity. The centroids are intensity
+            weighted and the ellipse (x, y, width, height, angle) comes from the second moments of each spot
+        """
+        th = self.threshold_image(img, key)
+        if th is None:
+            return []
+        (img, scratch, background, mask) = th
+
+        (n, labels, stats, _) = cv2.connectedComponentsWithStats(mask, scratch.labels, connectivity=8, ltype=cv2.CV_32S)
+        keep = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= self.spot_min_area) + 1
+        if len(keep) == 0:
+            return []
+
+        # Intensity weighted moments of all the components at once
+        idx = np.flatnonzero(mask)
+        lab = labels.ravel()[idx]
+        w = img.ravel()[idx].astype(np.float64)
+        (yy, xx) = np.divmod(idx, img.shape[1])
+        m0 = np.bincount(lab, w, n)[keep]
+        mx = np.bincount(lab, w * xx, n)[keep] / m0
+        my = np.bincount(lab, w * yy, n)[keep] / m0
+        sxx = np.bincount(lab, w * xx * xx, n)[keep] / m0 - mx**2
+        syy = np.bincount(lab, w * yy * yy, n)[keep] / m0 - my**2
+        sxy = np.bincount(lab, w * xx * yy, n)[keep] / m0 - mx * my
+
+        # Principal axes
+        theta = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+        d = np.sqrt(((sxx - syy) / 2)**2 + sxy**2)
+        s1 = np.sqrt(np.maximum((sxx + syy) / 2 + d, 0))
+        s2 = np.sqrt(np.maximum((sxx + syy) / 2 - d, 0))
+
+        spots = []
+        for i in np.argsort(-m0):
+            ellipse = (mx[i], my[i], 2*np.sqrt(2)*s1[i], 2*np.sqrt(2)*s2[i], np.degrees(theta[i]))
+            spots.append((mx[i], my[i], ellipse, int(stats[keep[i], cv2.CC_STAT_AREA])))
+        return spots
+
+    def debug(self, message):
+        if self.debug_enabled:
+            print("[D]", message)
+
+
+def init_worker():
+    """ Initialize a worker process. Parallelism is across processes, so OpenCV must not spawn its own threads
+    """
+    cv2.setNumThreads(1)
+
+
+def analyze_range(filename, attr_name, start, stop, options, block=16):
+    """ Analyze the frames [start, stop) of an attribute recorded in filename. Runs in the worker processes
+        Return (start, centroid, ellipse, spots, fits) with the results of each frame (NaN where no beam is found)
+    """
+    analyzer = BeamAnalyzer(engine=options['engine'], fit_roi=options['fit_roi'], fit_binning=options['fit_binning'], fit_refine=options['fit_refine'])
+    n = stop - start
+    centroid = np.full((n, 2), np.nan)
+    ellipse = np.full((n, 5), np.nan)
+    spots = np.zeros(n, dtype=np.int32)
+    fits = np.full((n, 2, 4), np.nan)
+    with h5.File(filename, "r") as f:
+        frames = f[attr_name]['frames']
+        for b0 in range(start, stop, block):
+            # Read a block of frames at once to limit the HDF5 overhead
+            data = frames[b0:min(b0 + block, stop)]
+            for j in range(data.shape[0]):
+                i = b0 - start + j
+                try:
+                    res = analyzer.analyze(data[j], attr_name, spots=options['spots'], profiles=options['profiles'])
+                except Exception as e:
+                    print("[E] Analysis of frame {0:d} of '{1}' failed ({2!s})".format(b0 + j, attr_name, e))
+                    continue
+                c = res['centroid']
+                if c is not None:
+                    centroid[i] = c[0:2]
+                    ellipse[i, 0:len(c[2])] = c[2]
+                    if len(c[2]) < 5:
+                        ellipse[i, 4] = 0.0
+                if options['spots']:
+                    spots[i] = len(res['spots'])
+                if options['profiles']:
+                    fits[i] = res['fits']
+    return (start, centroid, ellipse, spots, fits)
+
+
+def analyze_file(filename, output, attributes=None, workers=None, chunk=64, **options):
+    """ Analyze all the frames of the given attributes (all by default) recorded in filename in parallel
+        and write the results to output
+    """
+    options.setdefault('engine', 'fit')
+    options.setdefault('fit_roi', True)
+    options.setdefault('fit_binning', 1)
+    options.setdefault('fit_refine', False)
+    options.setdefault('spots', False)
+    options.setdefault('profiles', False)
+
+    with h5.File(filename, "r") as f:
+        if attributes is None:
+            attributes = [k for k in f.keys() if isinstance(f[k], h5.Group) and 'frames' in f[k]]
+        sizes = {}
+        for a in attributes:
+            if a not in f or 'frames' not in f[a]:
+                raise KeyError("no frames recorded for attribute '{0}'".format(a))
+            sizes[a] = f[a]['frames'].shape[0]
+        timestamps = {a: f[a]['timestamps'][:] for a in attributes}
+
+    results = {}
+    start_time = time.time()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = {}
+        for a in attributes:
+            n = sizes[a]
+            results[a] = {'centroid': np.full((n, 2), np.nan), 'ellipse': np.full((n, 5), np.nan),
+                          'spots': np.zeros(n, dtype=np.int32), 'profile_fits': np.full((n, 2, 4), np.nan)}
+            for s in range(0, n, chunk):
+                futures[executor.submit(analyze_range, filename, a, s, min(s + chunk, n), options)] = a
+        for fut in concurrent.futures.as_completed(futures):
+            a = futures[fut]
+            (s, centroid, ellipse, spots, fits) = fut.result()
+            e = s + centroid.shape[0]
+            results[a]['centroid'][s:e] = centroid
+            results[a]['ellipse'][s:e] = ellipse
+            results[a]['spots'][s:e] = spots
+            results[a]['profile_fits'][s:e] = fits
+    elapsed = time.time() - start_time
+
+    with h5.File(output, "w") as f:
+        f.attrs.create("Source", os.path.abspath(filename))
+        f.attrs.create("Beam estimator", options['engine'])
+        f.attrs.create("Fit binning", options['fit_binning'])
+        for a in attributes:
+            g = f.create_group(a)
+            g.create_dataset("timestamps", data=timestamps[a])
+            g.create_dataset("centroid", data=results[a]['centroid'])
+            g.create_dataset("ellipse", data=results[a]['ellipse'])
+            if options['spots']:
+                g.create_dataset("spots", data=results[a]['spots'])
+            if options['profiles']:
+                g.create_dataset("profile_fits", data=results[a]['profile_fits'])
+
+    return (sum(sizes.values()), elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze the frames recorded by LaserCamera")
+    parser.add_argument("filename", help="HDF5 file recorded by LaserCamera")
+    parser.add_argument("-o", "--output", help="Output HDF5 file (default: <filename>_analysis.h5)")
+    parser.add_argument("-a", "--attribute", action="append", help="Attribute to analyze (default: all)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes (default: number of cores)")
+    parser.add_argument("--chunk", type=int, default=64, help="Number of frames for each task")
+    parser.add_argument("--engine", choices=BeamAnalyzer.engines, default='fit', help="Beam estimator")
+    parser.add_argument("--binning", type=int, default=1, help="Binning of the gauss fit")
+    parser.add_argument("--refine", action="store_true", help="Refine binned fits at full resolution")
+    parser.add_argument("--full-frame", action="store_true", help="Fit the full frame instead of a ROI around the beam")
+    parser.add_argument("--spots", action="store_true", help="Count the spots in each frame")
+    parser.add_argument("--profiles", action="store_true", help="Gauss fit the vertical and horizontal profiles")
+    args = parser.parse_args()
+
+    output = args.output
+    if output is None:
+        output = os.path.splitext(args.filename)[0] + "_analysis.h5"
+    try:
+        (n, elapsed) = analyze_file(args.filename, output, args.attribute, args.workers, max(args.chunk, 1),
+                                    engine=args.engine, fit_roi=not args.full_frame, fit_binning=args.binning,
+                                    fit_refine=args.refine, spots=args.spots, profiles=args.profiles)
+    except Exception as e:
+        print("[E] Analysis failed ({0!s})".format(e))
+        sys.exit(1)
+    print("Analyzed {0:d} frames in {1:.1f} s ({2:.1f} frames/s). Results saved to {3}".format(n, elapsed, n / max(elapsed, 1e-9), output))
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the LaserCamera frame pipeline on synthetic frames
+
+Each stage of the pipeline (thresholding, centroid, 2D fit, profiles, profile fit, spots and rendering) runs
+on frames of several sizes and types. Latency percentiles and frames per second of each stage are printed
+and can be saved to a JSON file, together with the git revision, to compare runs across commits.
+Runs headless (Qt offscreen) and does not need a Tango database.
+
+The accuracy of the beam estimators can be compared with --estimators, and the cost of cold and warm
+started 2D fits with --warm.
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import sys
+import os
+## Add import paths
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+sys.path.insert(1, os.path.join(sys.path[0], '../Icons'))
+
+import time
+import json
+import argparse
+import platform
+import datetime
+import subprocess
+import numpy as np
+import cv2
+
+from beamanalysis import BeamAnalyzer, GaussFitter
+
+
+# Default frame sizes (height, width) and types
+SIZES = ((240, 320), (480, 640), (1024, 1280), (2048, 2048))
+DTYPES = ('uint8', 'uint16', 'float32')
+
+# Signal levels (baseline, maximum, noise) for each type
+LEVELS = {'uint8': (10, 200, 2), 'uint16': (100, 2000, 10), 'float32': (100, 2000, 10)}
+
+
+def synthetic_frame(gf, shape, params, noise, rng, dtype=np.uint16):
+    """ Generate a frame with a gaussian beam and gaussian noise
+        params: (baseline, maximum, mean_x, mean_y, sigma_x, sigma_y)
+    """
+    x = np.arange(shape[1])
+    y = np.arange(shape[0])
+    xx, yy = np.meshgrid(x, y)
+    img = gf.gaussian_2D(xx, yy, *params)
+    img += noise * rng.standard_normal(shape)
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return img.astype(dtype)
+    return np.clip(np.rint(img), 0, np.iinfo(dtype).max).astype(dtype)
+
+
+def synthetic_frames(shape, dtype, count, seed=0):
+    """ Generate count frames with a random beam position
+    """
+    gf = GaussFitter()
+    rng = np.random.default_rng(seed)
+    (baseline, maximum, noise) = LEVELS[dtype]
+    frames = []
+    for i in range(count):
+        sigma = 0.04 * min(shape)
+        params = (baseline, maximum, rng.uniform(0.3, 0.7) * shape[1], rng.uniform(0.3, 0.7) * shape[0], 1.3 * sigma, sigma)
+        frames.append(synthetic_frame(gf, shape, params, noise, rng, dtype))
+    return frames
+
+
+def latency_stats(times):
+    """ Latency percentiles (ms) and throughput (frames/s) from a list of times in seconds
+    """
+    t = 1e3 * np.array(times)
+    return {'n': len(t), 'mean_ms': float(np.mean(t)), 'p50_ms': float(np.percentile(t, 50)),
+            'p90_ms': float(np.percentile(t, 90)), 'p99_ms': float(np.percentile(t, 99)),
+            'max_ms': float(np.max(t)), 'fps': float(1e3 / np.mean(t))}
+
+
+def time_stage(stage, frames, repeat, warmup=2):
+    """ Time stage(img) over the frames, repeat times. The first warmup calls are not timed
+    """
+    for i in range(min(warmup, len(frames))):
+        stage(frames[i])
+    times = []
+    for r in range(repeat):
+        for img in frames:
+            s = time.perf_counter()
+            stage(img)
+            times.append(time.perf_counter() - s)
+    return times
+
+
+def analysis_stages(selected):
+    """ Pipeline stages that do not need Qt. Return a dict of name: stage(img)
+    """
+    fit = BeamAnalyzer(engine='fit')
+    fit_bin = BeamAnalyzer(engine='fit', fit_binning=4)
+    moments = BeamAnalyzer(engine='moments')
+    # Warm starts would make the timing depend on the order of the frames
+    for b in (fit, fit_bin):
+        b.gf.warm_start = False
+    gf = fit.gf
+
+    def fit_2d(img):
+        return gf.fit_2d(np.arange(img.shape[1]), np.arange(img.shape[0]), img)
+
+    stages = {
+        'threshold': lambda img: fit.threshold_image(img),
+        'centroid_fit': lambda img: fit.compute_centroid(img),
+        'centroid_fit_bin4': lambda img: fit_bin.compute_centroid(img),
+        'centroid_moments': lambda img: moments.compute_centroid(img),
+        'fit_2d': fit_2d,
+        'profiles': lambda img: fit.compute_profiles(img),
+        'profile_fit': lambda img: fit.fit_profiles(img),
+        'spots': lambda img: fit.compute_spots(img),
+    }
+    return {k: v for k, v in stages.items() if selected is None or k in selected}
+
+
+def render_stages(selected):
+    """ Rendering stages on the image views. Return a dict of name: stage(img), empty if Qt is not available
+    """
+    names = [n for n in ('render_matplotlib', 'render_pyqtgraph') if selected is None or n in selected]
+    if len(names) == 0:
+        return {}
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5 import QtWidgets
+        from imageview import create_image_view, pg
+    except ImportError as e:
+        print("[E] Skipping rendering benchmarks ({0!s})".format(e))
+        return {}
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication([sys.argv[0]])
+
+    stages = {}
+    for name in names:
+        backend = name.split('_')[1]
+        if backend == 'pyqtgraph' and pg is None:
+            print("[E] Skipping {0}, pyqtgraph is not installed".format(name))
+            continue
+        view = create_image_view(backend)
+        view.widget.resize(800, 600)
+        view.widget.show()
+
+        def render(img, view=view):
+            view.set_image(img, (img.min(), img.max()))
+            view.set_tracking((img.shape[1] / 2, img.shape[0] / 2, 20, 10, 0))
+            view.refresh()
+            app.processEvents()
+        stages[name] = render
+    # Keep the application alive with the views
+    render_stages.app = app
+    return stages
+
+
+def git_revision():
+    """ Return (revision, dirty) of the source tree, or (None, None) if not available
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=cwd, stderr=subprocess.DEVNULL).decode().strip()
+        status = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd, stderr=subprocess.DEVNULL).decode()
+        return (rev, len(status.strip()) > 0)
+    except (OSError, subprocess.CalledProcessError):
+        return (None, None)
+
+
+def run_pipeline(sizes, dtypes, frames, repeat, selected=None):
+    """ Benchmark all the stages on all the sizes and types. Return a list of results
+    """
+    stages = analysis_stages(selected)
+    stages.update(render_stages(selected))
+    results = []
+    for shape in sizes:
+        for dtype in dtypes:
+            imgs = synthetic_frames(shape, dtype, frames)
+            for (name, stage) in stages.items():
+                try:
+                    times = time_stage(stage, imgs, repeat)
+                except Exception as e:
+                    print("[E] Stage {0} failed on {1:d}x{2:d} {3} ({4!s})".format(name, shape[1], shape[0], dtype, e))
+                    continue
+                r = {'stage': name, 'width': shape[1], 'height': shape[0], 'dtype': dtype}
+                r.update(latency_stats(times))
+                results.append(r)
+                print_result(r)
+    return results
+
+
+def print_result(r, ref=None):
+    line = "{0:>20s} {1:>10s} {2:>8s} {3:10.2f} {4:10.2f} {5:10.2f} {6:10.1f}".format(
+        r['stage'], "{0:d}x{1:d}".format(r['width'], r['height']), r['dtype'], r['p50_ms'], r['p90_ms'], r['p99_ms'], r['fps'])
+    if ref is not None:
+        line += " {0:9.2f}x".format(ref['p50_ms'] / r['p50_ms'])
+    print(line)
+
+
+def compare(results, filename):
+    """ Print the speedup of the median latency with respect to a previous run
+    """
+    with open(filename) as f:
+        old = json.load(f)
+    index = {(r['stage'], r['width'], r['height'], r['dtype']): r for r in old['results']}
+    print("\nComparison with {0} (revision {1})".format(filename, old.get('git_revision')))
+    print_header(True)
+    for r in results:
+        ref = index.get((r['stage'], r['width'], r['height'], r['dtype']))
+        if ref is not None:
+            print_result(r, ref)
+
+
+def print_header(speedup=False):
+    header = "{0:>20s} {1:>10s} {2:>8s} {3:>10s} {4:>10s} {5:>10s} {6:>10s}".format("Stage", "Size", "Type", "p50 [ms]", "p90 [ms]", "p99 [ms]", "fps")
+    if speedup:
+        header += " {0:>10s}".format("Speedup")
+    print(header)
+
+
+def run_estimators(shape, frames, noise, seed=0):
+    """ Compare the gauss fit and the second moments estimators
+        Return a dict with timing and error statistics for each estimator
+    """
+    gf = GaussFitter()
+    rng = np.random.default_rng(seed)
+    x = np.arange(shape[1])
+    y = np.arange(shape[0])
+
+    estimators = {
+        'fit': lambda img: gf.fit_2d(x, y, img)[2:6],
+        'fit_bin4': lambda img: gf.fit_2d(x, y, img, binning=4)[2:6],
+        'moments': lambda img: gf.moments_2d(x, y, img, baseline=np.mean(img[0:10, 0:10]))[0:4],
+    }
+    results = {k: {'time': [], 'error': []} for k in estimators}
+
+    for i in range(frames):
+        # Random beam, sigma_x > sigma_y so that the principal axes of the moments match x and y
+        sigma_y = rng.uniform(0.02, 0.05) * min(shape)
+        sigma_x = sigma_y * rng.uniform(1.1, 1.8)
+        mean_x = rng.uniform(0.3, 0.7) * shape[1]
+        mean_y = rng.uniform(0.3, 0.7) * shape[0]
+        truth = np.array([mean_x, mean_y, sigma_x, sigma_y])
+        img = synthetic_frame(gf, shape, (100, 2000, mean_x, mean_y, sigma_x, sigma_y), noise, rng)
+
+        for name, estimator in estimators.items():
+            s = time.perf_counter()
+            est = estimator(img)
+            results[name]['time'].append(time.perf_counter() - s)
+            results[name]['error'].append(np.abs(np.array(est) - truth))
+
+    out = {}
+    for name, r in results.items():
+        err = np.array(r['error'])
+        out[name] = {'time_ms': 1e3 * np.mean(r['time']),
+                     'err_mean_px': np.mean(err[:, 0:2]),
+                     'err_sigma_px': np.mean(err[:, 2:4])}
+    return out
+
+
+def run_warm_start(shape, frames, noise, seed=0):
+    """ Compare cold and warm started 2D fits over a sequence of frames of a slowly drifting beam
+        Return a dict with the time and the number of function and jacobian evaluations per fit for each mode
+    """
+    rng = np.random.default_rng(seed)
+    x = np.arange(shape[1])
+    y = np.arange(shape[0])
+    gf = GaussFitter()
+    sigma = 0.04 * min(shape)
+    (mean_x, mean_y) = (0.5 * shape[1], 0.5 * shape[0])
+    sequence = []
+    for i in range(frames):
+        mean_x += rng.normal(0, 0.05 * sigma)
+        mean_y += rng.normal(0, 0.05 * sigma)
+        sequence.append(synthetic_frame(gf, shape, (100, 2000, mean_x, mean_y, 1.3 * sigma, sigma), noise, rng))
+
+    out = {}
+    for (name, warm) in (('cold', False), ('warm', True)):
+        gf = GaussFitter()
+        gf.warm_start = warm
+        # The first fit of the warm sequence is always cold
+        gf.fit_2d(x, y, sequence[0], key='beam')
+        gf.nfev = 0
+        gf.njev = 0
+        s = time.perf_counter()
+        for img in sequence[1:]:
+            gf.fit_2d(x, y, img, key='beam')
+        n = max(len(sequence) - 1, 1)
+        out[name] = {'time_ms': 1e3 * (time.perf_counter() - s) / n, 'nfev': gf.nfev / n, 'njev': gf.njev / n}
+    return out
+
+
+def parse_size(text):
+    (w, h) = [int(v) for v in text.lower().split("x")]
+    return (h, w)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the LaserCamera frame pipeline")
+    parser.add_argument("--frames", type=int, default=10, help="Number of frames for each size and type")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of passes over the frames")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=None, help="Frame sizes as WIDTHxHEIGHT")
+    parser.add_argument("--dtypes", nargs="+", choices=DTYPES, default=DTYPES, help="Frame types")
+    parser.add_argument("--stages", nargs="+", default=None, help="Stages to run (default: all)")
+    parser.add_argument("--output", help="Save the results to a JSON file")
+    parser.add_argument("--compare", help="Compare with the results saved in a JSON file")
+    parser.add_argument("--estimators", action="store_true", help="Compare the accuracy of the beam estimators instead")
+    parser.add_argument("--warm", action="store_true", help="Compare cold and warm started 2D fits instead")
+    parser.add_argument("--noise", type=float, default=10.0, help="RMS noise in counts (with --estimators and --warm)")
+    args = parser.parse_args()
+
+    if args.warm:
+        print("{0:>12s} {1:>10s} {2:>12s} {3:>14s} {4:>14s}".format("Size", "Mode", "Time [ms]", "Evaluations", "Jacobians"))
+        for shape in ((240, 320), (480, 640)):
+            res = run_warm_start(shape, max(args.frames, 2), args.noise)
+            for name, r in res.items():
+                print("{0:>12s} {1:>10s} {2:12.2f} {3:14.1f} {4:14.1f}".format("{0:d}x{1:d}".format(shape[1], shape[0]), name, r['time_ms'], r['nfev'], r['njev']))
+        sys.exit(0)
+
+    if args.estimators:
+        print("{0:>12s} {1:>10s} {2:>12s} {3:>14s} {4:>14s}".format("Size", "Engine", "Time [ms]", "Center [px]", "Sigma [px]"))
+        for shape in ((240, 320), (480, 640), (1024, 1280)):
+            res = run_estimators(shape, args.frames, args.noise)
+            for name, r in res.items():
+                print("{0:>12s} {1:>10s} {2:12.2f} {3:14.3f} {4:14.3f}".format("{0:d}x{1:d}".format(shape[1], shape[0]), name, r['time_ms'], r['err_mean_px'], r['err_sigma_px']))
+        sys.exit(0)
+
+    # Parallelism would make the latencies depend on the machine load
+    cv2.setNumThreads(1)
+
+    print_header()
+    results = run_pipeline(args.sizes or SIZES, args.dtypes, max(args.frames, 1), max(args.repeat, 1), args.stages)
+
+    (rev, dirty) = git_revision()
+    if args.output:
+        data = {'git_revision': rev, 'git_dirty': dirty, 'date': datetime.datetime.now().isoformat(),
+                'host': platform.node(), 'python': platform.python_version(), 'numpy': np.__version__,
+                'opencv': cv2.__version__, 'frames': args.frames, 'repeat': args.repeat, 'results': results}
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=1)
+    if args.compare:
+        compare(results, args.compare)
@@ -11,30 +11,22 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 sys.path.insert(1, os.path.join(sys.path[0], '../Icons'))
 
-import time
-import numpy as np
-
 from PyQt5 import QtCore
 from PyQt5 import QtWidgets
 
 from Ui_camerasetup import Ui_CameraSetup
 
 import PyTango as PT
-from PyQTango import TangoUtil
+from PyQTango import TangoUtil, QRateLimiter, EventDispatcher
 
-# Matplotlib stuff
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from imageview import create_image_view
 
 
 class CameraSetup(QtWidgets.QDialog, Ui_CameraSetup):
     """ Configure camera
     """
 
-    # Tango change event signal
-    tango_event = QtCore.pyqtSignal(PT.EventData)
-
-    def __init__(self, camera, scaling=1.0, parent=None):
+    def __init__(self, camera, scaling=1.0, parent=None, backend='matplotlib'):
         """ Constructor. Initialize dialog
         """
         # Parent construcor
@@ -55,14 +47,11 @@ class CameraSetup(QtWidgets.QDialog, Ui_CameraSetup):
         self.ev_id = []
         self.dev_ready = False
 
-        # Setup canvas for spectrum
-        self.fig = Figure()
-        self.canvas = FigureCanvas(self.fig)
-        self.canvas.setParent(self)
-        self.image_plot = None
-        self.image_last = 0
+        # Setup view for the camera preview
+        self.view = create_image_view(backend, self, toolbar=False, axis=False)
+        self.limiter = QRateLimiter(2.0, self.update_image, self)
         vbox = QtWidgets.QVBoxLayout()
-        vbox.addWidget(self.canvas)
+        vbox.addWidget(self.view.widget)
         self.image_area.setLayout(vbox)
 
         # Get camera classes
@@ -89,8 +78,8 @@ class CameraSetup(QtWidgets.QDialog, Ui_CameraSetup):
         else:
             self.cam_select.setCurrentIndex(0)
 
-        # Connect event to slot
-        self.tango_event.connect(self.event_handler)
+        # Deliver events to slot
+        self.dispatcher = EventDispatcher(self.event_handler, self)
 
         # Setup camera
         self.setup_camera(self.cam_select.currentText())
@@ -140,6 +129,8 @@ class CameraSetup(QtWidgets.QDialog, Ui_CameraSetup):
             self.dev = None
             self.ev_id = []
             self.dev_ready = False
+            self.dispatcher.discard()
+        self.limiter.discard()
 
     def setup_camera(self, device):
         """ Setup a new camera for the dialog
@@ -211,7 +202,7 @@ class CameraSetup(QtWidgets.QDialog, Ui_CameraSetup):
     def event_callback(self, event):
         """ Event callback
         """
-        self.tango_event.emit(event)
+        self.dispatcher.push(event)
 
     @QtCore.pyqtSlot(PT.EventData)
     def event_handler(self, ev):
@@ -277,18 +268,13 @@ class CameraSetup(QtWidgets.QDialog, Ui_CameraSetup):
                     self.autoexposure_max.blockSignals(False)
 
             elif attr_name == 'image':
-                if time.time() - self.image_last > 0.5:
-                    img = ev.attr_value.value
-                    if self.image_plot is None:
-                        self.image_plot = self.fig.add_subplot(111)
-                        self.image_plot.axis('Off')
-                        self.image_plot.imshow(img, cmap='jet')
-                        self.fig.tight_layout()
-                    else:
-                        self.image_plot.images[0].set_array(img)
-                        self.image_plot.images[0].set_clim([np.min(img), np.max(img)])
-                    self.image_last = time.time()
-                    self.canvas.draw()
+                self.limiter.push(attr_name, ev.attr_value.value)
+
+    def update_image(self, attr_name, img):
+        """ Update the camera preview
+        """
+        self.view.set_image(img)
+        self.view.refresh()
 
     def accept(self):
         """ Intercept accept() to close camera
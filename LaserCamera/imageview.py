@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+"""
+Image views for the live camera images
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import numpy as np
+
+from PyQt5 import QtWidgets
+
+# Matplotlib stuff
+import matplotlib
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
+from matplotlib.figure import Figure
+from matplotlib.patches import Ellipse
+
+# pyqtgraph is optional
+try:
+    import pyqtgraph as pg
+except ImportError:
+    pg = None
+
+
+# Available view backends
+BACKENDS = ('matplotlib', 'pyqtgraph')
+
+# Overlay colors
+TRACKING_COLOR = 'xkcd:sunflower yellow'
+REFERENCE_COLOR = 'xkcd:lime green'
+SPOT_COLORS = ('xkcd:hot pink', 'xkcd:white', 'xkcd:orange', 'xkcd:cyan', 'xkcd:lavender')
+
+
+def spot_color(spot_id):
+    return SPOT_COLORS[spot_id % len(SPOT_COLORS)]
+
+
+def create_image_view(backend, parent=None, toolbar=True, axis=True):
+    """ Create an image view with the given backend. Fall back to matplotlib if the backend is not available
+    """
+    if backend == 'pyqtgraph':
+        if pg is not None:
+            return PgImageView(parent, toolbar, axis)
+        print("[E] pyqtgraph is not available. Falling back to matplotlib")
+    return MplImageView(parent, toolbar, axis)
+
+
+class NavigationToolbar(NavigationToolbar2QT):
+    toolitems = [t for t in NavigationToolbar2QT.toolitems if t[0] not in ('Subplots', 'Back', 'Forward')]
+
+
+class BlitManager(object):
+    """ Redraw only the animated artists of a canvas over a cached background
+
+    The background (axes, ticks, labels and every artist not marked as animated) is cached after each full
+    redraw of the canvas. update() restores it and draws only the animated artists of the figure. A full
+    redraw is done automatically when the axes or their limits change.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.background = None
+        self.axes_state = None
+        self.cid = canvas.mpl_connect('draw_event', self.on_draw)
+
+    def get_axes_state(self):
+        """ Get the list of axes and view limits of the figure
+        """
+        return [(ax, tuple(ax.viewLim.bounds)) for ax in self.canvas.figure.axes]
+
+    def on_draw(self, event):
+        """ Cache the background after a full redraw and paint animated artists over it
+        """
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.axes_state = self.get_axes_state()
+        self.draw_animated()
+
+    def draw_animated(self):
+        """ Draw all the animated artists of the figure
+        """
+        fig = self.canvas.figure
+        for ax in fig.axes:
+            artists = [a for a in ax.get_children() if a.get_animated() and a.get_visible()]
+            for a in sorted(artists, key=lambda a: a.get_zorder()):
+                fig.draw_artist(a)
+
+    def invalidate(self):
+        """ Force a full redraw at the next update
+        """
+        self.background = None
+
+    def update(self):
+        """ Update the canvas
+        """
+        if self.background is None or self.axes_state != self.get_axes_state():
+            # Full redraw. Background is cached by on_draw()
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_animated()
+            self.canvas.blit(self.canvas.figure.bbox)
+
+
+class MplImageView(object):
+    """ Image view with crosshair and ellipse overlays drawn with matplotlib
+
+    Overlays are given as (x, y) for a crosshair or (x, y, width, height[, angle]) for a crosshair with an
+    ellipse. References are dicts with the 'x', 'y', 'h' and 'v' keys.
+    """
+
+    def __init__(self, parent=None, toolbar=True, axis=True):
+        self.fig = Figure()
+        self.canvas = FigureCanvas(self.fig)
+        self.canvas.setParent(parent)
+        self.blit = BlitManager(self.canvas)
+        self.widget = self.canvas
+        self.axis = axis
+        if toolbar:
+            self.toolbar = NavigationToolbar(self.canvas, parent)
+            # Remove current position label
+            n = self.toolbar.layout().count()
+            self.toolbar.layout().takeAt(n - 1)
+            self.toolbar.addSeparator()
+        else:
+            self.toolbar = None
+        self.ax = None
+        self.plot = None
+        self.tracking = None
+        self.ref = None
+        self.spots = {}
+
+    def has_image(self):
+        return self.ax is not None
+
+    def set_image(self, img, clim=None):
+        """ Show a new image. clim defaults to the image minimum and maximum
+        """
+        if clim is None:
+            clim = (np.min(img), np.max(img))
+        if self.ax is None:
+            self.ax = self.fig.add_subplot(111)
+            if not self.axis:
+                self.ax.axis('Off')
+            self.plot = self.ax.imshow(img, cmap='jet', animated=True)
+            self.plot.set_clim(clim)
+            self.fig.tight_layout()
+        else:
+            self.plot.set_data(img)
+            self.plot.set_clim(clim)
+
+    def set_tracking(self, centroid):
+        """ Show or update the tracking overlay
+        """
+        if self.ax is None:
+            return
+        if self.tracking is None:
+            self.tracking = self.draw_cross(centroid, TRACKING_COLOR)
+        else:
+            self.update_cross(self.tracking, centroid, TRACKING_COLOR)
+
+    def clear_tracking(self):
+        """ Remove the tracking overlay
+        """
+        if self.tracking is not None:
+            for a in self.tracking:
+                a.remove()
+            self.tracking = None
+            self.canvas.draw()
+
+    def set_reference(self, ref):
+        """ Show or update the reference overlay
+        """
+        if self.ax is None:
+            return
+        if ref['h'] > 0 and ref['v'] > 0:
+            cross = (ref['x'], ref['y'], ref['h'], ref['v'])
+        else:
+            cross = (ref['x'], ref['y'])
+        if self.ref is None:
+            self.ref = self.draw_cross(cross, REFERENCE_COLOR)
+        else:
+            self.update_cross(self.ref, cross, REFERENCE_COLOR)
+
+    def clear_reference(self):
+        """ Remove the reference overlay
+        """
+        if self.ref is not None:
+            for a in self.ref:
+                a.remove()
+            self.ref = None
+            self.canvas.draw()
+
+    def set_spots(self, spots):
+        """ Show or update the spot overlays. spots is a list of (id, (x, y, width, height, angle))
+        """
+        if self.ax is None:
+            return
+        current = set()
+        for (spot_id, e) in spots:
+            current.add(spot_id)
+            if spot_id not in self.spots:
+                color = spot_color(spot_id)
+                ellipse = self.draw_ellipse(e, color)
+                label = self.ax.text(e[0], e[1], " {0:d}".format(spot_id), color=color, animated=True)
+                self.spots[spot_id] = (ellipse, label)
+            else:
+                (ellipse, label) = self.spots[spot_id]
+                ellipse.set_center((e[0], e[1]))
+                ellipse.width = e[2]
+                ellipse.height = e[3]
+                ellipse.angle = e[4]
+                label.set_position((e[0], e[1]))
+        for spot_id in list(self.spots.keys()):
+            if spot_id not in current:
+                for a in self.spots.pop(spot_id):
+                    a.remove()
+
+    def clear_spots(self):
+        """ Remove the spot overlays
+        """
+        if len(self.spots):
+            for artists in self.spots.values():
+                for a in artists:
+                    a.remove()
+            self.spots = {}
+            self.canvas.draw()
+
+    def draw_cross(self, centroid, color):
+        """ Draw a crosshair at (x, y), with an ellipse if width and height are given
+        """
+        xlim = self.ax.get_xlim()
+        ylim = self.ax.get_ylim()
+        out = []
+        # First plot horizontal
+        out += self.ax.plot(xlim, (centroid[1], centroid[1]), color=color, linewidth=2, animated=True)
+        # Second plot vertical
+        out += self.ax.plot((centroid[0], centroid[0]), ylim, color=color, linewidth=2, animated=True)
+        # Restore limits
+        self.ax.set_xlim(xlim)
+        self.ax.set_ylim(ylim)
+        if len(centroid) > 2:
+            # Draw also ellipse
+            out.append(self.draw_ellipse(centroid, color))
+        return out
+
+    def update_cross(self, lines, centroid, color):
+        """ Update a crosshair in place
+        """
+        xlim = self.ax.get_xlim()
+        ylim = self.ax.get_ylim()
+        # First update horizontal
+        lines[0].set_data(xlim, (centroid[1], centroid[1]))
+        # Second update vertical
+        lines[1].set_data((centroid[0], centroid[0]), ylim)
+        # Update ellipse
+        if len(centroid) > 2:
+            if len(lines) > 2:
+                lines[2].set_center((centroid[0], centroid[1]))
+                lines[2].width = centroid[2]
+                lines[2].height = centroid[3]
+                lines[2].angle = centroid[4] if len(centroid) > 4 else 0
+            else:
+                lines.append(self.draw_ellipse(centroid, color))
+        elif len(lines) > 2:
+            lines[2].remove()
+            del lines[2]
+
+    def draw_ellipse(self, centroid, color):
+        angle = centroid[4] if len(centroid) > 4 else 0
+        e = Ellipse((centroid[0], centroid[1]), centroid[2], centroid[3], angle=angle, fill=False, color=color, linewidth=2, animated=True)
+        self.ax.add_patch(e)
+        return e
+
+    def refresh(self):
+        """ Fast update of the view after a new image or new overlays
+        """
+        self.blit.update()
+
+    def redraw(self):
+        """ Full redraw of the view
+        """
+        self.canvas.draw()
+
+    def clear(self):
+        """ Remove the image and all the overlays
+        """
+        self.fig.clear()
+        self.ax = None
+        self.plot = None
+        self.tracking = None
+        self.ref = None
+        self.spots = {}
+
+
+class PgImageView(object):
+    """ Image view with crosshair and ellipse overlays drawn with pyqtgraph
+
+    Same interface as MplImageView. The image is converted to a QImage through a lookup table, without
+    going through the matplotlib renderer.
+    """
+
+    def __init__(self, parent=None, toolbar=True, axis=True):
+        self.widget = pg.GraphicsLayoutWidget(parent)
+        self.plot = self.widget.addPlot()
+        self.plot.setAspectLocked(True)
+        self.plot.invertY(True)
+        self.plot.setMenuEnabled(False)
+        if not axis:
+            self.plot.hideAxis('left')
+            self.plot.hideAxis('bottom')
+        if toolbar:
+            self.toolbar = QtWidgets.QToolBar(parent)
+            ac = self.toolbar.addAction("Reset view")
+            ac.setToolTip("Reset zoom and pan")
+            ac.triggered.connect(lambda checked: self.plot.autoRange())
+            self.toolbar.addSeparator()
+        else:
+            self.toolbar = None
+        # Jet lookup table
+        if hasattr(matplotlib, 'colormaps'):
+            cmap = matplotlib.colormaps['jet']
+        else:
+            cmap = matplotlib.cm.get_cmap('jet')
+        self.lut = np.uint8(255 * cmap(np.linspace(0.0, 1.0, 256))[:, 0:3])
+        self.image = None
+        self.tracking = None
+        self.ref = None
+        self.spots = {}
+
+    def has_image(self):
+        return self.image is not None
+
+    def set_image(self, img, clim=None):
+        """ Show a new image. clim defaults to the image minimum and maximum
+        """
+        if clim is None:
+            clim = (np.min(img), np.max(img))
+        if clim[1] <= clim[0]:
+            clim = (clim[0], clim[0] + 1)
+        if self.image is None:
+            self.image = pg.ImageItem(axisOrder='row-major')
+            self.image.setLookupTable(self.lut)
+            # Pixel centers on integer coordinates, as with imshow
+            self.image.setPos(-0.5, -0.5)
+            self.plot.addItem(self.image)
+            self.image.setImage(img, autoLevels=False, levels=clim)
+            self.plot.autoRange()
+        else:
+            self.image.setImage(img, autoLevels=False, levels=clim)
+
+    def set_tracking(self, centroid):
+        """ Show or update the tracking overlay
+        """
+        if self.image is None:
+            return
+        if self.tracking is None:
+            self.tracking = self.draw_cross(TRACKING_COLOR)
+        self.update_cross(self.tracking, centroid, TRACKING_COLOR)
+
+    def clear_tracking(self):
+        """ Remove the tracking overlay
+        """
+        if self.tracking is not None:
+            for item in self.tracking:
+                self.plot.removeItem(item)
+            self.tracking = None
+
+    def set_reference(self, ref):
+        """ Show or update the reference overlay
+        """
+        if self.image is None:
+            return
+        if ref['h'] > 0 and ref['v'] > 0:
+            cross = (ref['x'], ref['y'], ref['h'], ref['v'])
+        else:
+            cross = (ref['x'], ref['y'])
+        if self.ref is None:
+            self.ref = self.draw_cross(REFERENCE_COLOR)
+        self.update_cross(self.ref, cross, REFERENCE_COLOR)
+
+    def clear_reference(self):
+        """ Remove the reference overlay
+        """
+        if self.ref is not None:
+            for item in self.ref:
+                self.plot.removeItem(item)
+            self.ref = None
+
+    def set_spots(self, spots):
+        """ Show or update the spot overlays. spots is a list of (id, (x, y, width, height, angle))
+        """
+        if self.image is None:
+            return
+        current = set()
+        for (spot_id, e) in spots:
+            current.add(spot_id)
+            if spot_id not in self.spots:
+                color = spot_color(spot_id)
+                ellipse = QtWidgets.QGraphicsEllipseItem()
+                ellipse.setPen(self.pen(color))
+                label = pg.TextItem(" {0:d}".format(spot_id), color=matplotlib.colors.to_hex(color))
+                for item in (ellipse, label):
+                    self.plot.addItem(item, ignoreBounds=True)
+                self.spots[spot_id] = (ellipse, label)
+            (ellipse, label) = self.spots[spot_id]
+            ellipse.setRect(-e[2] / 2.0, -e[3] / 2.0, e[2], e[3])
+            ellipse.setPos(e[0], e[1])
+            ellipse.setRotation(e[4])
+            label.setPos(e[0], e[1])
+        for spot_id in list(self.spots.keys()):
+            if spot_id not in current:
+                for item in self.spots.pop(spot_id):
+                    self.plot.removeItem(item)
+
+    def clear_spots(self):
+        """ Remove the spot overlays
+        """
+        for items in self.spots.values():
+            for item in items:
+                self.plot.removeItem(item)
+        self.spots = {}
+
+    def pen(self, color):
+        return pg.mkPen(matplotlib.colors.to_hex(color), width=2)
+
+    def draw_cross(self, color):
+        """ Add horizontal and vertical lines of a crosshair
+        """
+        out = [pg.InfiniteLine(angle=0, pen=self.pen(color), movable=False),
+               pg.InfiniteLine(angle=90, pen=self.pen(color), movable=False)]
+        for item in out:
+            self.plot.addItem(item, ignoreBounds=True)
+        return out
+
+    def update_cross(self, items, centroid, color):
+        """ Update a crosshair in place
+        """
+        items[0].setValue(centroid[1])
+        items[1].setValue(centroid[0])
+        if len(centroid) > 2:
+            if len(items) < 3:
+                e = QtWidgets.QGraphicsEllipseItem()
+                e.setPen(self.pen(color))
+                self.plot.addItem(e, ignoreBounds=True)
+                items.append(e)
+            items[2].setRect(-centroid[2] / 2.0, -centroid[3] / 2.0, centroid[2], centroid[3])
+            items[2].setPos(centroid[0], centroid[1])
+            items[2].setRotation(centroid[4] if len(centroid) > 4 else 0)
+        elif len(items) > 2:
+            self.plot.removeItem(items.pop())
+
+    def refresh(self):
+        """ Nothing to do, pyqtgraph repaints changed items automatically
+        """
+        pass
+
+    def redraw(self):
+        pass
+
+    def clear(self):
+        """ Remove the image and all the overlays
+        """
+        self.plot.clear()
+        self.image = None
+        self.tracking = None
+        self.ref = None
+        self.spots = {}
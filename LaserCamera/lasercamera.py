@@ -19,75 +19,123 @@ from PyQt5.QtWidgets import QFileDialog
 
 from Ui_lasercamera import Ui_LaserCamera
 from camerasetup import CameraSetup
-from reference import ReferencePanel
+from reference import ReferencePanel, ReferenceStore
+from recorder import FrameRecorder
+from pointing import PointingPanel
+from beamanalysis import BeamAnalyzer, SpotTracker
+from latency import LatencyMonitor
+from imageview import BlitManager, NavigationToolbar, create_image_view
+from PyQTango import QRateLimiter, EventDispatcher
 
 import re
 import h5py as h5
 import time
 import datetime
 import numpy as np
-import cv2
 import PyTango as PT
-from scipy.optimize import curve_fit
 import threading
+import collections
+import concurrent.futures
 
 
 # Matplotlib stuff
 import matplotlib
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
 from matplotlib.figure import Figure
-from matplotlib.patches import Ellipse
-
-
-class NavigationToolbar(NavigationToolbar2QT):
-    toolitems = [t for t in NavigationToolbar2QT.toolitems if t[0] not in ('Subplots', 'Back', 'Forward')]
 
 
 class EventSimulator(threading.Thread):
     """ Simulator for image events
+
+    Generates frames with a gaussian beam for each attribute at a fixed rate. To work as a load generator
+    at high frame rates and large sensor sizes, frames are generated in advance into a pool that is then
+    cycled. The beam moves across the pool frames with a random jitter (RMS in pixels) plus a drift (in
+    pixels per second) back and forth over one cycle of the pool. The true beam position of the last
+    frame of each attribute is stored in positions.
+
+    Events go through the event dispatcher of the GUI like real Tango events, so frames arriving faster
+    than the GUI handles them replace each other in the dispatcher. When running as fast as possible the
+    simulator waits instead for the GUI to take the previous frames.
     """
 
-    def __init__(self, parent, img_attr):
-        """ Init thread and start
+    def __init__(self, parent, img_attr, width=100, height=120, rate=2.0, pool=32, drift=0.0, jitter=5.0, noise=5.0, sigma=10.0, max_bytes=512*1024*1024):
+        """ Init thread, generate the frame pool and start. A rate of zero sends frames as fast as possible
         """
         threading.Thread.__init__(self)
         self.img_attr = img_attr
         self.parent = parent
+        self.rate = rate
+        self.sent = 0
+        self.late = 0
+        self.positions = {}
+        self.generate_pool(width, height, pool, drift, jitter, noise, sigma, max_bytes)
         self._terminate = False
         self.start()
 
+    def generate_pool(self, width, height, size, drift, jitter, noise, sigma, max_bytes):
+        """ Pre-generate the frames. The pool size is limited to max_bytes of memory
+        """
+        size = int(max(2, min(size, max_bytes // (2 * width * height))))
+        rng = np.random.default_rng()
+        # Beam positions: drift back and forth over the pool cycle plus jitter
+        dt = 1.0 / self.rate if self.rate > 0 else 0.0
+        half = size // 2
+        steps = np.minimum(np.arange(size), size - np.arange(size)) * dt
+        x0 = width / 2.0 + drift * (steps - half * dt / 2.0) + jitter * rng.standard_normal(size)
+        y0 = height / 2.0 + drift * (steps - half * dt / 2.0) + jitter * rng.standard_normal(size)
+        self.pool_positions = np.stack([x0, y0], axis=1)
+        # Baseline 10 and maximum 100 counts (like a dim beam on a real camera)
+        x = np.arange(width, dtype=np.float32)
+        y = np.arange(height, dtype=np.float32)
+        self.pool = np.empty((size, height, width), dtype=np.uint16)
+        frame = np.empty((height, width), dtype=np.float32)
+        for i in range(size):
+            gx = np.exp(-(x - x0[i])**2 / (2 * sigma**2))
+            gy = np.exp(-(y - y0[i])**2 / (2 * sigma**2))
+            # The beam is separable, an outer product is much cheaper than evaluating the 2D gaussian
+            np.multiply(gy[:, np.newaxis], 100 * gx[np.newaxis, :], out=frame)
+            frame += rng.standard_normal((height, width), dtype=np.float32) * noise + 10
+            np.clip(frame, 0, 65535, out=frame)
+            self.pool[i] = frame
+
     def run(self):
         """ Main loop
         """
+        start = time.time()
+        n = 0
         while not self._terminate:
             s = time.time()
 
-            # Create an image with noise 100x120
-            x = np.arange(100)
-            y = np.arange(120)
-            xx, yy = np.meshgrid(x, y)
-            self.parent.gf.last_x0 = 20*np.random.rand()+40
-            self.parent.gf.last_y0 = 20*np.random.rand()+40
-            image = self.parent.gf.gaussian_2D(xx, yy, 10, 100, self.parent.gf.last_x0, self.parent.gf.last_y0, 10, 10)
-            image += 10 * np.random.rand(*image.shape) - 5
-            image = np.uint16(image)
-
-            for a in self.img_attr:
+            if self.rate <= 0 and self.parent.dispatcher.pending() > 0:
+                time.sleep(0.001)
+                continue
+
+            for (j, a) in enumerate(self.img_attr):
+                # Each attribute cycles the pool with a different offset
+                k = (n + j * 7) % self.pool.shape[0]
+                self.positions[a] = tuple(self.pool_positions[k])
                 # Push fake events (just populate attributes that are really used by the handler)
                 ev = PT.EventData()
                 ev.attr_name = a
                 val = PT.DeviceAttribute()
                 val.name = a
-                val.value = image
+                val.value = self.pool[k]
+                val.time = PT.TimeVal.fromtimestamp(s)
                 ev.attr_value = val
                 ev.err = False
-                self.parent.tango_event.emit(ev)
-
-            # Sleep to have a burst of events every 0.5s
-            e = time.time() - s
-            if e < 0.5:
-                time.sleep(0.5 - e)
+                self.parent.event_callback(ev)
+            n += 1
+            self.sent = n
+
+            # Keep the average rate, without bursts to catch up when late
+            if self.rate > 0:
+                wait = start + n / self.rate - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    self.late += 1
+                    if wait < -1.0:
+                        start = time.time() - n / self.rate
 
     def terminate(self):
         """ Terminate event simulator
@@ -95,97 +143,192 @@ class EventSimulator(threading.Thread):
         self._terminate = True
 
 
-class GaussFitter(object):
+class FrameAnalyzer(QtCore.QObject):
+    """ Worker pool that runs the beam analysis outside of the GUI thread
 
-    def __init__(self):
-        self.last_x0 = 0
-        self.last_y0 = 0
+    Each attribute is processed by at most one worker at a time. Frames that
+    arrive while the previous one is still being analyzed replace each other,
+    so only the newest frame is processed next and stale frames are dropped.
+    """
 
-    def initial_guess(self, x, y):
-        baseline = np.min(y)
-        maximum = np.max(y) - baseline
-        id_max = np.argmax(y)
-        mean = x[id_max]
-        # FWHM = 2 * sqrt(2 * log(2)) * sigma
-        y_fwhm = np.abs(y - baseline - maximum/2)
-        if id_max > 0:
-            fwhm_id1 = np.argmin(y_fwhm[0:id_max])
-        else:
-            fwhm_id1 = 0
-        if id_max < len(y_fwhm):
-            fwhm_id2 = id_max + np.argmin(y_fwhm[id_max:])
-        else:
-            fwhm_id2 = len(y_fwhm) - 1
-        fwhm = x[fwhm_id2] - x[fwhm_id1]
-        sigma = fwhm / 2 / np.sqrt(2 * np.log(2))
-        return (baseline, maximum, mean, sigma)
-
-    def fit(self, x, y):
-        guess = self.initial_guess(x, y)
-        popt, pcov = curve_fit(self.gaussian_1D, x, y, guess)
-        return popt
-
-    def gaussian_1D(self, x, baseline, maximum, mean, sigma):
-        """ 1D gaussian function
+    # Analysis result signal (attribute name, frame, centroid)
+    analysis_done = QtCore.pyqtSignal(str, object, object)
+
+    def __init__(self, analyze, max_workers=2, parent=None):
+        """ Init worker pool. analyze is called in the worker threads with the frame and the attribute name
+        """
+        QtCore.QObject.__init__(self, parent)
+        self.analyze = analyze
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.busy = set()
+        self.dropped = 0
+
+    def submit(self, attr_name, img):
+        """ Queue a frame for analysis. Replace any frame of the same attribute still waiting
+        """
+        with self.lock:
+            if attr_name in self.busy:
+                if attr_name in self.pending:
+                    self.dropped += 1
+                self.pending[attr_name] = img
+                return
+            self.busy.add(attr_name)
+        self.executor.submit(self.run, attr_name, img)
+
+    def run(self, attr_name, img):
+        """ Worker loop. Process frames of one attribute until there is nothing newer waiting
         """
-        return baseline + maximum * np.exp( -np.power(x - mean, 2) / (2 * np.power(sigma, 2)))
+        while img is not None:
+            try:
+                result = self.analyze(img, attr_name)
+            except Exception as e:
+                print("[E] Analysis of a frame from '{0}' failed ({1!s})".format(attr_name, e))
+                result = None
+            self.analysis_done.emit(attr_name, img, result)
+            with self.lock:
+                img = self.pending.pop(attr_name, None)
+                if img is None:
+                    self.busy.discard(attr_name)
+
+    def shutdown(self):
+        """ Drop pending frames and stop worker threads
+        """
+        with self.lock:
+            self.pending = {}
+        self.executor.shutdown(wait=True)
+
+
+class Frame(object):
+    """ A single frame of an image attribute with its analysis results
 
-    def gaussian_2D_angle(self, x, y, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y, theta):
-        """ 2D gaussian function with rotation
+    Results are computed on first request and then shared by all the views showing the frame, so
+    each frame is processed only once. get() can be called from the analysis workers as well.
+    """
+
+    def __init__(self, attr_name, timestamp, img):
+        self.attr_name = attr_name
+        self.timestamp = timestamp
+        self.img = img
+        self.submitted = False
+        self.lock = threading.Lock()
+        self.results = {}
+        # Monotonic times of the Tango callback, of the event handling and of the analysis end
+        self.t_emit = None
+        self.t_received = None
+        self.t_analyzed = None
+
+    def get(self, name, compute, *args):
+        """ Return the result name, computing it as compute(img, *args) if not yet available
         """
-        a = (np.cos(theta)**2)/(2*sigma_x**2) + (np.sin(theta)**2)/(2*sigma_y**2)
-        b = -(np.sin(2*theta))/(4*sigma_x**2) + (np.sin(2*theta))/(4*sigma_y**2)
-        c = (np.sin(theta)**2)/(2*sigma_x**2) + (np.cos(theta)**2)/(2*sigma_y**2)
-        g = baseline + maximum * np.exp( - (a * ((x - mean_x)**2) + 2 * b * (x - mean_y) * (y - mean_y) + c * ((y - mean_y)**2)) )
-        return g
+        with self.lock:
+            if name in self.results:
+                return self.results[name]
+        value = compute(self.img, *args)
+        with self.lock:
+            return self.results.setdefault(name, value)
+
+    def has(self, name):
+        with self.lock:
+            return name in self.results
 
-    def gaussian_2D(self, x, y, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y):
-        return baseline + maximum * np.exp( - ( (x - mean_x)**2 / (2 * sigma_x**2) + (y - mean_y)**2 / (2 * sigma_y**2) ) )
 
-    def gaussian_2D_model(self, X, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y):
-        """ 2D gaussian model
+class FrameCache(object):
+    """ Cache of the most recent frames keyed by attribute name and event timestamp
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.frames = collections.OrderedDict()
+
+    def frame(self, attr_name, timestamp, img):
+        """ Return the cached frame for (attr_name, timestamp), creating it if needed
         """
-        x, y = X
-        g = self.gaussian_2D(x, y, baseline, maximum, mean_x, mean_y, sigma_x, sigma_y)
-        return g.ravel()
-
-    def fit_2d(self, x, y, z):
-        # Get h and v profiles to estimate mean and sigma
-        v = np.sum(z, axis=1) / z.shape[1]
-        h = np.sum(z, axis=0) / z.shape[0]
-        gh = self.initial_guess(x, h)
-        gv = self.initial_guess(y, v)
-        # Get baseline by comapring corners of the image
-        corners = np.mean(z[0:10,0:10])                      # Up left
-        corners = np.append(corners, np.mean(z[0:10,-10:]))  # Up right
-        corners = np.append(corners, np.mean(z[-10:,0:10]))  # Down left
-        corners = np.append(corners, np.mean(z[-10:,-10:]))  # Down right
-        baseline = np.mean(corners[corners <= np.median(corners)])
-        # Get maximum
-        maximum = np.max(z) - baseline
-        # Compose initial guess
-        guess = (baseline, maximum, gh[2], gv[2], gh[3], gv[3])
-        # Lower and upper bounds
-        lower_l = (0, maximum * 0.8, gh[2] * 0.8, gv[2] * 0.8, gh[3] * 0.8, gv[3] * 0.8)
-        upper_l = (np.max(corners), maximum * 1.2, gh[2] * 1.2, gv[2] * 1.2, gh[3] * 1.2, gv[3] * 1.2)
-        xx, yy = np.meshgrid(x, y)
-        try:
-            #popt, pcov = curve_fit(self.gaussian_2D_model, (xx, yy), z.ravel(), guess, maxfev=10000)
-            popt, pcov = curve_fit(self.gaussian_2D_model, (xx, yy), z.ravel(), guess, bounds=(lower_l, upper_l), max_nfev=10000)
-            return popt
-        except RuntimeError:
-            print("[D] Fit failed")
-            return guess
+        key = (attr_name, timestamp)
+        if key in self.frames:
+            return self.frames[key]
+        f = Frame(attr_name, timestamp, img)
+        self.frames[key] = f
+        while len(self.frames) > self.size:
+            self.frames.popitem(last=False)
+        return f
+
+    def clear(self):
+        self.frames.clear()
+
+
+class FrameRing(object):
+    """ Fixed memory history of the last frames of an attribute
+
+    Frames are copied into a single preallocated array, so recording the history does not allocate
+    memory per frame. The buffer is allocated on the first frame and reallocated only if the frame
+    shape or type changes. The number of frames is limited to length and to max_bytes of memory.
+    """
+
+    def __init__(self, length=100, max_bytes=512*1024*1024):
+        self.length = length
+        self.max_bytes = max_bytes
+        self.buffer = None
+        self.timestamps = None
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, timestamp, img):
+        """ Copy a frame into the history, overwriting the oldest one when full
+        """
+        if self.buffer is None or self.buffer.shape[1:] != img.shape or self.buffer.dtype != img.dtype:
+            n = int(max(1, min(self.length, self.max_bytes // max(img.nbytes, 1))))
+            self.buffer = np.empty((n, ) + img.shape, dtype=img.dtype)
+            self.timestamps = np.zeros(n)
+            self.head = 0
+            self.count = 0
+        np.copyto(self.buffer[self.head], img)
+        self.timestamps[self.head] = timestamp
+        self.head = (self.head + 1) % self.buffer.shape[0]
+        self.count = min(self.count + 1, self.buffer.shape[0])
+
+    def get(self, age):
+        """ Return (timestamp, frame) of the frame age steps before the newest one. The frame is a copy
+        """
+        if age < 0 or age >= self.count:
+            raise IndexError("frame history has only {0:d} frames".format(self.count))
+        i = (self.head - 1 - age) % self.buffer.shape[0]
+        return (self.timestamps[i], self.buffer[i].copy())
+
+    def order(self):
+        """ Buffer indices of the stored frames, from the oldest to the newest
+        """
+        if self.buffer is None:
+            return np.zeros(0, dtype=np.intp)
+        return (self.head - self.count + np.arange(self.count)) % self.buffer.shape[0]
+
+    def profiles(self):
+        """ Return (timestamps, v, h) with the vertical and horizontal profiles of all the stored frames,
+            from the oldest to the newest. Profiles are computed on the whole buffer without copying the frames
+        """
+        if self.count == 0:
+            return (np.zeros(0), None, None)
+        # The valid slots are always the first count ones
+        frames = self.buffer[0:self.count]
+        v = frames.mean(axis=2)
+        h = frames.mean(axis=1)
+        i = self.order()
+        return (self.timestamps[i], v[i], h[i])
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
 
 
 class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
 
     """ Laser camera GUI main window. """
 
-    # Tango change event signal
-    tango_event = QtCore.pyqtSignal(PT.EventData)
-
-    def __init__(self, debug=False, simulation=False, parent=None):
+    def __init__(self, debug=False, simulation=False, backend='matplotlib', sim_options=None, parent=None):
         # Parent constructors
         QtWidgets.QMainWindow.__init__(self, parent)
 
@@ -194,6 +337,10 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
 
         # Simulation flag
         self.simulation = simulation
+        self.sim_options = {} if sim_options is None else sim_options
+
+        # Image view backend
+        self.view_backend = backend
 
         # Get scaling factor for HiDPI
         design_dpi = 95
@@ -215,10 +362,41 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
         self.setref_panel = None
         self.references = {}
         self.last_centroid = {}
-        self.last_update = {}
-
-        # GaussFitter
-        self.gf = GaussFitter()
+        self.frames = FrameCache()
+        self.history = {}
+        self.history_age = 0
+        self.history_shown = {}
+        self.recorder = None
+        self.ac_save.setText("Record frames")
+
+        # Display rate limiters for the left and right images and for the projections
+        self.limiter_l = QRateLimiter(2.0, self.update_image_l, self)
+        self.limiter_r = QRateLimiter(2.0, self.update_image_r, self)
+        self.limiter_u = QRateLimiter(2.0, self.update_projections, self)
+
+        # Beam analysis engine
+        self.beam = BeamAnalyzer(debug=debug)
+        self.gf = self.beam.gf
+
+        # Multi spot tracking
+        self.multi_spot = False
+        self.spot_trackers = {}
+
+        # Centroid analysis worker pool
+        self.analyzer = FrameAnalyzer(self.analyze_frame, max_workers=2, parent=self)
+        self.analyzer.analysis_done.connect(self.on_analysis_done)
+
+        # Pipeline latency statistics, with a CSV trace in debug mode
+        trace = None
+        if self.debug_enabled:
+            trace = "lasercamera_trace_{0}.csv".format(datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+            self.debug("Writing latency trace to {0}".format(trace))
+        self.latency = LatencyMonitor(trace=trace)
+        self.latency_label = QtWidgets.QLabel()
+        self.statusbar.addPermanentWidget(self.latency_label)
+        self.latency_timer = QtCore.QTimer(self)
+        self.latency_timer.timeout.connect(self.update_latency_readout)
+        self.latency_timer.start(1000)
 
         # Icons
         track_icon = QtGui.QIcon()
@@ -234,21 +412,29 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
         gauss_icon = QtGui.QIcon()
         gauss_icon.addPixmap(QtGui.QPixmap(":/buttons/gauss.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
 
-        # Setup canvas for images
+        # Setup views for images and canvas for projections
         for pos in ['l', 'r', 'u', 'd']:
-            setattr(self, 'fig_'+pos, Figure())
-            setattr(self, 'canvas_'+pos, FigureCanvas(getattr(self, 'fig_'+pos)))
-            getattr(self, 'canvas_'+pos).setParent(self)
             vbox = QtWidgets.QVBoxLayout()
-            vbox.addWidget(getattr(self, 'canvas_'+pos))
+            if pos in ['l', 'r']:
+                view = create_image_view(self.view_backend, self)
+                setattr(self, 'view_'+pos, view)
+                vbox.addWidget(view.widget)
+                toolbar = view.toolbar
 
-            # Toolbar
-            toolbar = NavigationToolbar(getattr(self, 'canvas_'+pos), self)
+            else:
+                setattr(self, 'fig_'+pos, Figure())
+                setattr(self, 'canvas_'+pos, FigureCanvas(getattr(self, 'fig_'+pos)))
+                getattr(self, 'canvas_'+pos).setParent(self)
+                setattr(self, 'blit_'+pos, BlitManager(getattr(self, 'canvas_'+pos)))
+                vbox.addWidget(getattr(self, 'canvas_'+pos))
+
+                # Toolbar
+                toolbar = NavigationToolbar(getattr(self, 'canvas_'+pos), self)
 
-            # Remove current position label
-            n = toolbar.layout().count()
-            toolbar.layout().takeAt(n - 1)
-            toolbar.addSeparator()
+                # Remove current position label
+                n = toolbar.layout().count()
+                toolbar.layout().takeAt(n - 1)
+                toolbar.addSeparator()
 
             ## Enable centroid
             setattr(self, 'image_bt_tracking_'+pos, QtWidgets.QToolButton())
@@ -296,20 +482,43 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
                 obj.setToolTip("Enable gauss fit")
                 toolbar.addWidget(obj)
 
+            if pos in ['l', 'r', 'u']:
+                ## Refresh rate
+                setattr(self, 'image_sb_fps_'+pos, QtWidgets.QSpinBox())
+                obj = getattr(self, 'image_sb_fps_'+pos)
+                obj.setRange(0, 50)
+                obj.setSuffix(" fps")
+                obj.setSpecialValueText("Max fps")
+                obj.setValue(int(getattr(self, 'limiter_'+pos).fps))
+                obj.setObjectName('image_sb_fps_'+pos)
+                if pos == 'u':
+                    obj.setToolTip("Maximum refresh rate of the projections")
+                else:
+                    obj.setToolTip("Maximum refresh rate of the image")
+                obj.valueChanged.connect(getattr(self, 'limiter_'+pos).set_fps)
+                toolbar.addWidget(obj)
+
             # Add toolbar to layout
             vbox.addWidget(toolbar)
 
             # Add layout to plot area
             getattr(self, 'image_'+pos).setLayout(vbox)
-            setattr(self, 'image_'+pos+'_ax', None)
-            setattr(self, 'image_'+pos+'_plot', None)
-            setattr(self, 'image_'+pos+'_tracking', None)
-            setattr(self, 'image_'+pos+'_ref', None)
             if pos in ['u', 'd']:
+                setattr(self, 'image_'+pos+'_ax', None)
+                setattr(self, 'image_'+pos+'_plot', None)
+                setattr(self, 'image_'+pos+'_tracking', None)
+                setattr(self, 'image_'+pos+'_ref', None)
                 setattr(self, 'image_'+pos+'_fit', None)
 
-        # Connect event to slot
-        self.tango_event.connect(self.event_handler)
+        # Deliver the latest event of each attribute to slot, with the time of the callback
+        self.dispatcher = EventDispatcher(self.event_handler, self, with_time=True)
+
+        # Frame history toolbar
+        self.setup_history_toolbar()
+
+        # Beam pointing tab
+        self.pointing = PointingPanel(self)
+        self.tabs.addTab(self.pointing, "Pointing")
 
         # Tango device
         if not self.simulation:
@@ -317,12 +526,22 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
             prop = self.db.get_property("LaserCamera", "camera")
             self.dev = None
             self.ev_id = {}
+            # References of all the cameras
+            self.ref_store = ReferenceStore(self.db)
+            try:
+                self.debug("Loaded {0:d} references".format(self.ref_store.load()))
+            except PT.DevFailed as e:
+                self.error("Failed to load references ({0!s})".format(e.args[0].desc))
             if len(prop['camera']):
                 self.setup_camera(prop['camera'][0])
         else:
             self.dev = None
+            self.ref_store = ReferenceStore()
             self.setup_simulator()
 
+        # Fit options menu
+        self.setup_fit_menu()
+
         # Connect plot buttons
         for pos in ['l', 'r', 'u', 'd']:
             getattr(self, 'image_bt_tracking_'+pos).toggled.connect(getattr(self, 'on_image_bt_tracking_'+pos+'_toggled'))
@@ -332,6 +551,98 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
             if pos in ['u', 'd']:
                 getattr(self, 'image_bt_gauss_'+pos).toggled.connect(getattr(self, 'on_image_bt_gauss_'+pos+'_toggled'))
 
+    def setup_fit_menu(self):
+        """ Add 2D gauss fit options to the configure menu
+        """
+        self.menuConfigure.addSeparator()
+
+        ## Beam estimator
+        menu = self.menuConfigure.addMenu("Beam estimator")
+        group = QtWidgets.QActionGroup(self)
+        for (engine, label) in (('fit', "Gauss fit"), ('moments', "Second moments")):
+            ac = menu.addAction(label)
+            ac.setCheckable(True)
+            ac.setChecked(engine == self.beam.centroid_engine)
+            ac.setData(engine)
+            group.addAction(ac)
+        group.triggered.connect(self.on_centroid_engine_triggered)
+
+        ## Fit only in a ROI around the beam
+        self.ac_fit_roi = self.menuConfigure.addAction("Fit around beam only")
+        self.ac_fit_roi.setCheckable(True)
+        self.ac_fit_roi.setChecked(self.beam.fit_roi)
+        self.ac_fit_roi.toggled.connect(self.on_ac_fit_roi_toggled)
+
+        ## Binning
+        menu = self.menuConfigure.addMenu("Fit binning")
+        group = QtWidgets.QActionGroup(self)
+        for b in (1, 2, 4):
+            ac = menu.addAction("{0:d}x{0:d}".format(b))
+            ac.setCheckable(True)
+            ac.setChecked(b == self.beam.fit_binning)
+            ac.setData(b)
+            group.addAction(ac)
+        group.triggered.connect(self.on_fit_binning_triggered)
+
+        ## Warm start
+        self.ac_fit_warm = self.menuConfigure.addAction("Seed fits with previous frame")
+        self.ac_fit_warm.setCheckable(True)
+        self.ac_fit_warm.setChecked(self.gf.warm_start)
+        self.ac_fit_warm.toggled.connect(self.on_ac_fit_warm_toggled)
+
+        ## Refinement at full resolution
+        self.ac_fit_refine = self.menuConfigure.addAction("Refine binned fit at full resolution")
+        self.ac_fit_refine.setCheckable(True)
+        self.ac_fit_refine.setChecked(self.beam.fit_refine)
+        self.ac_fit_refine.toggled.connect(self.on_ac_fit_refine_toggled)
+
+        ## Multiple spots
+        self.menuConfigure.addSeparator()
+        self.ac_multi_spot = self.menuConfigure.addAction("Track multiple spots")
+        self.ac_multi_spot.setCheckable(True)
+        self.ac_multi_spot.setChecked(self.multi_spot)
+        self.ac_multi_spot.toggled.connect(self.on_ac_multi_spot_toggled)
+
+        ## Dark frame subtraction
+        self.menuConfigure.addSeparator()
+        self.ac_dark_store = self.menuConfigure.addAction("Store dark frames")
+        self.ac_dark_store.setToolTip("Store the last frame of each image as dark frame. Block the beam first")
+        self.ac_dark_store.triggered.connect(self.on_ac_dark_store_triggered)
+        self.ac_dark_subtract = self.menuConfigure.addAction("Subtract dark frames in beam analysis")
+        self.ac_dark_subtract.setCheckable(True)
+        self.ac_dark_subtract.setChecked(self.beam.dark_subtract)
+        self.ac_dark_subtract.setEnabled(False)
+        self.ac_dark_subtract.toggled.connect(self.on_ac_dark_subtract_toggled)
+        self.ac_dark_clear = self.menuConfigure.addAction("Clear dark frames")
+        self.ac_dark_clear.triggered.connect(self.on_ac_dark_clear_triggered)
+
+    def setup_history_toolbar(self):
+        """ Add a toolbar with a slider to scrub back through the frame history
+        """
+        self.history_toolbar = QtWidgets.QToolBar("History", self)
+        self.history_toolbar.setObjectName("history_toolbar")
+        self.addToolBar(QtCore.Qt.BottomToolBarArea, self.history_toolbar)
+
+        self.history_toolbar.addWidget(QtWidgets.QLabel("History "))
+        self.history_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.history_slider.setObjectName("history_slider")
+        self.history_slider.setRange(0, 0)
+        self.history_slider.setToolTip("Scrub back through the last frames. History recording is paused while scrubbing")
+        self.history_slider.valueChanged.connect(self.on_history_slider_valueChanged)
+        self.history_toolbar.addWidget(self.history_slider)
+
+        self.history_label = QtWidgets.QLabel(" Live")
+        self.history_label.setMinimumWidth(120)
+        self.history_toolbar.addWidget(self.history_label)
+
+        self.history_live = self.history_toolbar.addAction("Live")
+        self.history_live.setToolTip("Go back to the live view")
+        self.history_live.triggered.connect(self.on_history_live_triggered)
+
+        self.history_fit = self.history_toolbar.addAction("Fit profiles")
+        self.history_fit.setToolTip("Gauss fit the profiles of all the frames in the history and add them to the pointing tab")
+        self.history_fit.triggered.connect(self.on_history_fit_triggered)
+
     def setup_fonts_and_scaling(self):
         # Setup font size and scaling on hidpi
         if self.scaling > 1.1:
@@ -374,15 +685,31 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
             self.sim_thread.terminate()
             self.sim_thread.join()
 
+        # Drop pending updates
+        self.dispatcher.discard()
+        for pos in ['l', 'r', 'u']:
+            getattr(self, 'limiter_'+pos).discard()
+        self.frames.clear()
+        self.history = {}
+        self.history_age = 0
+        self.history_shown = {}
+        self.history_slider.blockSignals(True)
+        self.history_slider.setRange(0, 0)
+        self.history_slider.blockSignals(False)
+        self.history_label.setText(" Live")
+        self.pointing.clear()
+        self.spot_trackers = {}
+
         # Clear plots
-        for pos in ['l', 'r', 'u', 'd']:
+        self.view_l.clear()
+        self.view_r.clear()
+        for pos in ['u', 'd']:
             getattr(self, 'fig_'+pos).clear()
             setattr(self, 'image_'+pos+'_ax', None)
             setattr(self, 'image_'+pos+'_plot', None)
             setattr(self, 'image_'+pos+'_tracking', None)
             setattr(self, 'image_'+pos+'_ref', None)
-            if pos in ['u', 'd']:
-                setattr(self, 'image_'+pos+'_fit', None)
+            setattr(self, 'image_'+pos+'_fit', None)
 
     def setup_camera(self, device):
         self.close_camera()
@@ -410,24 +737,8 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
             self.image_r_select.blockSignals(False)
             self.spec_img.blockSignals(False)
 
-            # Try to load references from database
-            prop_names = []
-            for a in img_attr:
-                prop_names.append("{0}:{1}".format(self.dev.name(), a.lower()))
-            props = self.db.get_property("LaserCamera", prop_names)
-            self.references = {}
-            for k, v in props.items():
-                self.debug("Property: {0} => {1}".format(k, v))
-                (d, a) = k.split(':')
-                self.references[a] = None
-                if len(v):
-                    m = re.match("x=(\d+\.\d+):y=(\d+\.\d+):h=(\d+\.\d+):v=(\d+\.\d+)", v[0])
-                    if m is not None:
-                        self.references[a] = {}
-                        self.references[a]['x'] = float(m.groups()[0])
-                        self.references[a]['y'] = float(m.groups()[1])
-                        self.references[a]['h'] = float(m.groups()[2])
-                        self.references[a]['v'] = float(m.groups()[3])
+            # References from the cache loaded at startup
+            self.references = self.ref_store.references(self.dev.name(), img_attr)
 
             # Select images
             if len(img_attr) > 2:
@@ -448,197 +759,391 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
             self.close_camera()
 
     def setup_simulator(self):
-        img_attr = ['Image_00', 'Image_01']
+        options = dict(self.sim_options)
+        img_attr = ['Image_{0:02d}'.format(i) for i in range(max(options.pop('attributes', 2), 1))]
          # Populate combo boxes
         self.image_l_select.addItems(img_attr)
         self.image_r_select.addItems(img_attr)
         self.image_r_select.setCurrentIndex(1)
         self.spec_img.addItems(img_attr)
-        self.sim_thread = EventSimulator(self, img_attr)
-        self.references = {}
-        for a in img_attr:
-            self.references[a.lower()] = None
+        self.sim_thread = EventSimulator(self, img_attr, **options)
+        self.references = self.ref_store.references("simulator", img_attr)
 
     def event_callback(self, event):
         """ Event callback
         """
-        self.tango_event.emit(event)
-
-    @QtCore.pyqtSlot(PT.EventData)
-    def event_handler(self, ev):
-        """ TANGO Event handler
+        # Record every frame here, as the dispatcher keeps only the latest event
+        recorder = self.recorder
+        if recorder is not None and not event.err:
+            recorder.record_frame(event.attr_value.name.lower(), event.attr_value.time.totime(), event.attr_value.value)
+        self.dispatcher.push(event)
+
+    def event_handler(self, ev, t_emit):
+        """ TANGO Event handler. t_emit is the monotonic time of the Tango callback
         """
+        start = time.monotonic()
         if ev.err:
             self.error("Event error ({0!s})".format(ev.errors[0].desc))
 
         else:
             self.debug("Got event from {0}".format(ev.attr_value.name))
             attr_name = ev.attr_value.name.lower()
+            frame = self.frames.frame(attr_name, ev.attr_value.time.totime(), ev.attr_value.value)
+            frame.t_emit = t_emit
+            frame.t_received = start
+            # Delivery time from the device timestamp to the callback (wall clock)
+            self.latency.record('delivery', time.time() - (start - t_emit) - frame.timestamp, attr_name, frame.timestamp)
+            self.latency.record('queue', start - t_emit, attr_name, frame.timestamp)
 
-            if attr_name in self.last_update:
-                if time.time() - self.last_update[attr_name] < 0.5:
-                    return
+            self.push_history(frame)
 
-            self.last_update[attr_name] = time.time()
-            img = ev.attr_value.value
+            # Coalesce updates to the refresh rate of each view. While looking at past frames the views are
+            # paused, but live frames still go through the limiters to be analyzed
+            if attr_name == self.image_l_select.currentText().lower():
+                self.limiter_l.push(attr_name, frame)
+            if attr_name == self.image_r_select.currentText().lower():
+                self.limiter_r.push(attr_name, frame)
+            if attr_name == self.spec_img.currentText().lower():
+                self.limiter_u.push(attr_name, frame)
+            self.latency.record('handler', time.monotonic() - start, attr_name, frame.timestamp)
 
-            # Compute image centroid if any of the views need it
-            if self.any_centroid_on(attr_name):
-                centroid = self.compute_centroid(img)
-                if centroid is None:
-                    self.last_centroid[attr_name] = None
-                    self.error("Failed to find a centroid")
-                else:
-                    self.last_centroid[attr_name] = centroid
+    def push_history(self, frame):
+        """ Add a frame to the history of its attribute and update the history slider
+        """
+        if frame.attr_name not in self.history:
+            self.history[frame.attr_name] = FrameRing()
+        self.history[frame.attr_name].push(frame.timestamp, frame.img)
+
+        n = max(len(h) for h in self.history.values())
+        if self.history_slider.maximum() != n - 1:
+            # Keep the slider at the same age from the newest frame
+            self.history_slider.blockSignals(True)
+            self.history_slider.setRange(0, n - 1)
+            self.history_slider.setValue(max(n - 1 - self.history_age, 0))
+            self.history_slider.blockSignals(False)
+
+    def show_history(self, age):
+        """ Show the frames age steps back in the history in all the views
+        """
+        # Live frames pending in the limiters are not discarded, they are still analyzed for the pointing
+        shown = {}
+        self.history_shown = shown
+        for (attr_name, update) in ((self.image_l_select.currentText().lower(), self.update_image_l),
+                                    (self.image_r_select.currentText().lower(), self.update_image_r),
+                                    (self.spec_img.currentText().lower(), self.update_projections)):
+            ring = self.history.get(attr_name)
+            if ring is None or len(ring) == 0:
+                continue
+            if attr_name not in shown:
+                (ts, img) = ring.get(min(age, len(ring) - 1))
+                frame = self.frames.frame(attr_name, ts, img)
+                if not frame.has('centroid'):
+                    # Live frames may have been skipped by the analyzer
+                    frame.submitted = False
+                shown[attr_name] = frame
+            update(attr_name, shown[attr_name])
+
+        # Centroids already computed are not submitted again, update the overlays now
+        for (attr_name, frame) in shown.items():
+            if frame.has('centroid'):
+                self.centroid_handler(attr_name, frame, frame.results['centroid'])
+
+        if len(shown):
+            ts = list(shown.values())[0].timestamp
+            self.history_label.setText(" -{0:d} ({1})".format(age, datetime.datetime.fromtimestamp(ts).strftime("%H:%M:%S.%f")[:-3]))
+
+    @QtCore.pyqtSlot(int)
+    def on_history_slider_valueChanged(self, value):
+        self.history_age = self.history_slider.maximum() - value
+        if self.history_age > 0:
+            self.show_history(self.history_age)
+        else:
+            self.history_shown = {}
+            self.history_label.setText(" Live")
+
+    @QtCore.pyqtSlot(bool)
+    def on_history_live_triggered(self, checked):
+        self.history_slider.setValue(self.history_slider.maximum())
+
+    @QtCore.pyqtSlot(bool)
+    def on_history_fit_triggered(self, checked):
+        """ Fit the profiles of the whole history of each attribute in a single batch
+        """
+        for (attr_name, ring) in self.history.items():
+            (ts, v, h) = ring.profiles()
+            if len(ts) == 0:
+                continue
+            param = self.gf.fit_profiles(list(h) + list(v))
+            (ph, pv) = (param[0:len(ts)], param[len(ts):])
+            name = attr_name + " profiles"
+            self.pointing.remove(name)
+            for i in range(len(ts)):
+                self.pointing.append(name, ts[i], (ph[i, 2], pv[i, 2], (ph[i, 2], pv[i, 2], 2*np.sqrt(2)*ph[i, 3], 2*np.sqrt(2)*pv[i, 3], 0.0)))
+
+    def is_paused(self, attr_name, frame):
+        """ True if the views are showing past frames and frame is not one of them
+        """
+        return self.history_age > 0 and self.history_shown.get(attr_name) is not frame
+
+    def submit_centroid(self, frame):
+        """ Queue centroid computation if any of the views need it
+        """
+        if self.any_centroid_on(frame.attr_name) and not frame.submitted:
+            frame.submitted = True
+            self.analyzer.submit(frame.attr_name, frame)
+
+    def analyze_frame(self, frame, attr_name):
+        """ Compute the centroid of a frame. Called in the analysis workers
+        """
+        start = time.monotonic()
+        if frame.t_received is not None:
+            self.latency.record('analysis_wait', start - frame.t_received, attr_name, frame.timestamp)
+        centroid = frame.get('centroid', self.beam.compute_centroid, attr_name)
+        if self.multi_spot:
+            frame.get('spots', self.beam.compute_spots, attr_name)
+        frame.t_analyzed = time.monotonic()
+        self.latency.record('analysis', frame.t_analyzed - start, attr_name, frame.timestamp)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record_centroid(attr_name, frame.timestamp, centroid)
+        return centroid
+
+    def frame_clim(self, img):
+        return (np.min(img), np.max(img))
+
+    def update_image_l(self, attr_name, frame):
+        """ Update the left image
+        """
+        if attr_name != self.image_l_select.currentText().lower():
+            return
+        start = time.monotonic()
+        self.submit_centroid(frame)
+        if self.is_paused(attr_name, frame):
+            return
+        self.view_l.set_image(frame.img, frame.get('clim', self.frame_clim))
+        self.view_l.refresh()
+        self.record_draw(frame, start)
+
+    def update_image_r(self, attr_name, frame):
+        """ Update the right image
+        """
+        if attr_name != self.image_r_select.currentText().lower():
+            return
+        start = time.monotonic()
+        self.submit_centroid(frame)
+        if self.is_paused(attr_name, frame):
+            return
+        self.view_r.set_image(frame.img, frame.get('clim', self.frame_clim))
+        self.view_r.refresh()
+        self.record_draw(frame, start)
+
+    def update_projections(self, attr_name, frame):
+        """ Update the horizontal and vertical projections
+        """
+        if attr_name != self.spec_img.currentText().lower():
+            return
+        start = time.monotonic()
+        self.submit_centroid(frame)
+        if self.is_paused(attr_name, frame):
+            return
+
+        # Update projections
+        (v, h) = frame.get('profiles', self.beam.compute_profiles)
+
+        # Plot top profile
+        if self.image_u_ax is None:
+            self.image_u_ax = self.fig_u.add_subplot(111)
+            self.image_u_ax.set_title("Horizontal profile")
+            self.image_u_plot = self.image_u_ax.plot(h, animated=True)
+            self.fig_u.tight_layout()
+        else:
+            self.image_u_plot[0].set_ydata(h)
+
+        # Check autoscale
+        if self.image_bt_autoscale_u.isChecked():
+            self.image_u_ax.set_ylim([np.min(h), np.max(h)])
+
+        # Check if we have to plot or update gauss fit
+        if self.image_bt_gauss_u.isChecked():
+            param = frame.get('fits', self.beam.fit_profiles, (v, h))[1]
+            if self.image_u_fit is None:
+                self.image_u_fit = self.draw_gauss_fit(self.image_u_ax, self.image_u_plot[0], param=param)
             else:
-                centroid = None
+                self.update_gauss_fit(self.image_u_plot[0], self.image_u_fit[0], param=param)
+
+        # Plot bottom profile
+        if self.image_d_ax is None:
+            self.image_d_ax = self.fig_d.add_subplot(111)
+            self.image_d_ax.set_title("Vertical profile")
+            self.image_d_plot = self.image_d_ax.plot(v, animated=True)
+            self.fig_d.tight_layout()
+        else:
+            self.image_d_plot[0].set_ydata(v)
 
-            ##
-            ## LEFT IMAGE
-            ##
-            if attr_name == self.image_l_select.currentText().lower():
+        # Check autoscale
+        if self.image_bt_autoscale_d.isChecked():
+            self.image_d_ax.set_ylim([np.min(v), np.max(v)])
 
-                # Update image
-                if self.image_l_ax is None:
-                    self.image_l_ax = self.fig_l.add_subplot(111)
-                    self.image_l_plot = self.image_l_ax.imshow(img, cmap='jet')
-                    self.fig_l.tight_layout()
-                else:
-                    self.image_l_plot.set_data(img)
-                    self.image_l_plot.set_clim([np.min(img), np.max(img)])
+        # Check if we have to plot or update gauss fit
+        if self.image_bt_gauss_d.isChecked():
+            param = frame.get('fits', self.beam.fit_profiles, (v, h))[0]
+            if self.image_d_fit is None:
+                self.image_d_fit = self.draw_gauss_fit(self.image_d_ax, self.image_d_plot[0], param=param)
+            else:
+                self.update_gauss_fit(self.image_d_plot[0], self.image_d_fit[0], param=param)
 
-                # Check if centroid is enabled
-                if self.image_bt_tracking_l.isChecked() and centroid is not None:
-                    # Check the type of plot
-                    if self.image_bt_swapref_l.isChecked():
-                        c_l = centroid[2]
-                    else:
-                        c_l = centroid[0:2]
+        # Update canvas
+        self.blit_u.update()
+        self.blit_d.update()
+        self.record_draw(frame, start)
 
-                    if self.image_l_tracking is None:
-                        # Add a new plot
-                        self.image_l_tracking = self.draw_centroid(self.image_l_ax, c_l)
+    def record_draw(self, frame, start):
+        """ Record the time spent drawing a frame and, for live frames, the total latency
+        """
+        now = time.monotonic()
+        self.latency.record('draw', now - start, frame.attr_name, frame.timestamp)
+        if frame.t_emit is not None and self.history_age == 0:
+            self.latency.record('end_to_end', now - frame.t_emit, frame.attr_name, frame.timestamp)
+
+    @QtCore.pyqtSlot(str, object, object)
+    def on_analysis_done(self, attr_name, frame, centroid):
+        """ Handle a result of the worker pool, recording the result latency
+        """
+        start = time.monotonic()
+        if frame.t_analyzed is not None:
+            self.latency.record('result_queue', start - frame.t_analyzed, attr_name, frame.timestamp)
+        self.centroid_handler(attr_name, frame, centroid)
+        self.latency.record('overlay', time.monotonic() - start, attr_name, frame.timestamp)
+
+    @QtCore.pyqtSlot()
+    def update_latency_readout(self):
+        """ Show the pipeline statistics in the status bar
+        """
+        (latency, rates) = self.latency.summary()
+        dropped_display = self.limiter_l.coalesced + self.limiter_r.coalesced + self.limiter_u.coalesced
+        dropped_record = self.recorder.dropped if self.recorder is not None else 0
+        text = "Queue {0:.1f}  Handler {1:.1f}  Analysis {2:.1f} (+{3:.1f} wait)  Draw {4:.1f}  Total {5:.1f} ms | ".format(
+            latency['queue'], latency['handler'], latency['analysis'], latency['analysis_wait'], latency['draw'], latency['end_to_end'])
+        text += "Pending {0:d} | Dropped: events {1:d}, analysis {2:d}, display {3:d}, recording {4:d} | ".format(
+            self.dispatcher.pending(), self.dispatcher.coalesced, self.analyzer.dropped, dropped_display, dropped_record)
+        text += "In {0:.1f}, analyzed {1:.1f}, drawn {2:.1f} fps".format(rates['handler'], rates['analysis'], rates['draw'])
+        self.latency_label.setText(text)
+        self.latency_label.setToolTip("Delivery from the device {0:.1f} ms (needs synchronized clocks)\nResult queue {1:.1f} ms, overlays {2:.1f} ms".format(
+            latency['delivery'], latency['result_queue'], latency['overlay']))
+
+    def track_spots(self, attr_name, frame):
+        """ Give persistent ids to the spots of a frame and add them to the pointing history
+            Return a list of (id, ellipse) for the overlays
+        """
+        if attr_name not in self.spot_trackers:
+            self.spot_trackers[attr_name] = SpotTracker()
+        tracker = self.spot_trackers[attr_name]
+        spots = frame.results['spots']
+        if tracker.timestamp is None or frame.timestamp > tracker.timestamp:
+            labelled = tracker.update(spots, frame.timestamp)
+            for (spot_id, spot) in labelled:
+                self.pointing.append("{0} spot {1:d}".format(attr_name, spot_id), frame.timestamp, spot)
+        else:
+            # Frame from the history, match without changing the tracks
+            labelled = [(i, s) for (i, s) in zip(tracker.match(spots), spots) if i is not None]
+        return [(spot_id, spot[2]) for (spot_id, spot) in labelled]
 
-                    else:
-                        # Update plot
-                        self.update_centroid(self.image_l_ax, self.image_l_tracking, c_l)
+    @QtCore.pyqtSlot(str, object, object)
+    def centroid_handler(self, attr_name, frame, centroid):
+        """ Handle the result of a centroid computation from the worker pool
+        """
+        if centroid is None:
+            self.last_centroid[attr_name] = None
+            self.error("Failed to find a centroid")
+            return
+        self.last_centroid[attr_name] = centroid
 
-                # Update canvas
-                self.canvas_l.draw()
+        # Pointing history. Live frames are analyzed also while the views show past frames, which are older
+        # and are ignored
+        self.pointing.append(attr_name, frame.timestamp, centroid)
 
-            ##
-            ## RIGHT IMAGE
-            ##
-            if attr_name == self.image_r_select.currentText().lower():
+        # Multiple spots
+        spots = None
+        if self.multi_spot and frame.has('spots'):
+            spots = self.track_spots(attr_name, frame)
+
+        # Overlays of live frames are not drawn over past frames
+        if self.is_paused(attr_name, frame):
+            return
 
-                # Update RIGHT
-                if self.image_r_ax is None:
-                    self.image_r_ax = self.fig_r.add_subplot(111)
-                    self.image_r_plot = self.image_r_ax.imshow(img, cmap='jet')
-                    self.fig_r.tight_layout()
+        ##
+        ## LEFT IMAGE
+        ##
+        if attr_name == self.image_l_select.currentText().lower() and self.view_l.has_image():
+            # Check if centroid is enabled
+            if self.image_bt_tracking_l.isChecked():
+                # Check the type of plot
+                if self.image_bt_swapref_l.isChecked():
+                    c_l = centroid[2]
                 else:
-                    self.image_r_plot.set_array(img)
-                    self.image_r_plot.set_clim([np.min(img), np.max(img)])
+                    c_l = centroid[0:2]
 
-                # Check if centroid is enabled
-                if self.image_bt_tracking_r.isChecked() and centroid is not None:
-                    # Check the type of plot
-                    if self.image_bt_swapref_r.isChecked():
-                        c_r = centroid[2]
-                    else:
-                        c_r = centroid[0:2]
+                # Update plot
+                self.view_l.set_tracking(c_l)
+                if spots is not None:
+                    self.view_l.set_spots(spots)
 
-                    if self.image_r_tracking is None:
-                        # Add a new plot
-                        self.image_r_tracking = self.draw_centroid(self.image_r_ax, c_r)
+                # Update canvas
+                self.view_l.refresh()
 
-                    else:
-                        # Update plot
-                        self.update_centroid(self.image_r_ax, self.image_r_tracking, c_r)
+        ##
+        ## RIGHT IMAGE
+        ##
+        if attr_name == self.image_r_select.currentText().lower() and self.view_r.has_image():
+            # Check if centroid is enabled
+            if self.image_bt_tracking_r.isChecked():
+                # Check the type of plot
+                if self.image_bt_swapref_r.isChecked():
+                    c_r = centroid[2]
+                else:
+                    c_r = centroid[0:2]
 
-                # Update canvas
-                self.canvas_r.draw()
+                # Update plot
+                self.view_r.set_tracking(c_r)
+                if spots is not None:
+                    self.view_r.set_spots(spots)
 
-            ##
-            ## PROJECTIONS
-            ##
-            # Spectrum view
-            if attr_name == self.spec_img.currentText().lower():
-                # Update projections
-                (v, h) = self.compute_profiles(img)
-
-                # Plot top profile
-                if self.image_u_ax is None:
-                    self.image_u_ax = self.fig_u.add_subplot(111)
-                    self.image_u_ax.set_title("Horizontal profile")
-                    self.image_u_plot = self.image_u_ax.plot(h)
-                    self.fig_u.tight_layout()
+                # Update canvas
+                self.view_r.refresh()
+
+        ##
+        ## PROJECTIONS
+        ##
+        if attr_name == self.spec_img.currentText().lower() and self.image_u_ax is not None:
+            # Check if tracking is enabled
+            if self.image_bt_tracking_u.isChecked():
+                if self.image_bt_swapref_u.isChecked():
+                    pos = centroid[2][0]
                 else:
-                    self.image_u_plot[0].set_ydata(h)
-
-                # Check autoscale
-                if self.image_bt_autoscale_u.isChecked():
-                    self.image_u_ax.set_ylim([np.min(h), np.max(h)])
-
-                # Check if tracking is enabled
-                if self.image_bt_tracking_u.isChecked():
-                    if self.image_bt_swapref_u.isChecked():
-                        pos = centroid[2][0]
-                    else:
-                        pos = centroid[0]
-                    if self.image_u_tracking is None:
-                        self.image_u_tracking = self.draw_projection_ref(self.image_u_ax, pos, 'xkcd:sunflower yellow')
-                    else:
-                        self.update_projection_ref(self.image_u_ax, self.image_u_tracking[0], pos)
-
-                # Check if we have to plot or update gauss fit
-                if self.image_bt_gauss_u.isChecked():
-                    if self.image_u_fit is None:
-                        self.image_u_fit = self.draw_gauss_fit(self.image_u_ax, self.image_u_plot[0])
-                    else:
-                        self.update_gauss_fit(self.image_u_plot[0], self.image_u_fit[0])
-
-                # Plot bottom profile
-                if self.image_d_ax is None:
-                    self.image_d_ax = self.fig_d.add_subplot(111)
-                    self.image_d_ax.set_title("Vertical profile")
-                    self.image_d_plot = self.image_d_ax.plot(v)
-                    self.fig_d.tight_layout()
+                    pos = centroid[0]
+                if self.image_u_tracking is None:
+                    self.image_u_tracking = self.draw_projection_ref(self.image_u_ax, pos, 'xkcd:sunflower yellow')
                 else:
-                    self.image_d_plot[0].set_ydata(v)
-
-                # Check autoscale
-                if self.image_bt_autoscale_d.isChecked():
-                    self.image_d_ax.set_ylim([np.min(v), np.max(v)])
-
-                # Check if tracking is enabled
-                if self.image_bt_tracking_d.isChecked():
-                    if self.image_bt_swapref_d.isChecked():
-                        pos = centroid[2][1]
-                    else:
-                        pos = centroid[1]
-                    if self.image_d_tracking is None:
-                        self.image_d_tracking = self.draw_projection_ref(self.image_d_ax, pos, 'xkcd:sunflower yellow')
-                    else:
-                        self.update_projection_ref(self.image_d_ax, self.image_d_tracking[0], pos)
-
-                # Check if we have to plot or update gauss fit
-                if self.image_bt_gauss_d.isChecked():
-                    if self.image_d_fit is None:
-                        self.image_d_fit = self.draw_gauss_fit(self.image_d_ax, self.image_d_plot[0])
-                    else:
-                        self.update_gauss_fit(self.image_d_plot[0], self.image_d_fit[0])
+                    self.update_projection_ref(self.image_u_ax, self.image_u_tracking[0], pos)
+                self.blit_u.update()
 
-                # Update canvas
-                self.canvas_u.draw()
-                self.canvas_d.draw()
+            # Check if tracking is enabled
+            if self.image_bt_tracking_d.isChecked():
+                if self.image_bt_swapref_d.isChecked():
+                    pos = centroid[2][1]
+                else:
+                    pos = centroid[1]
+                if self.image_d_tracking is None:
+                    self.image_d_tracking = self.draw_projection_ref(self.image_d_ax, pos, 'xkcd:sunflower yellow')
+                else:
+                    self.update_projection_ref(self.image_d_ax, self.image_d_tracking[0], pos)
+                self.blit_d.update()
 
     def remove_plot_lines(self, ax, lines):
         """ Remove the given list of lines from the given axes
         """
         for line in lines:
-            index = ax.lines.index(line)
-            del ax.lines[index]
+            line.remove()
 
     def any_centroid_on(self, attr_name):
         if str(self.image_l_select.currentText()).lower() == attr_name:
@@ -652,77 +1157,9 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
                 return True
         return False
 
-    def draw_centroid(self, ax, centroid):
-        xlim = ax.get_xlim()
-        ylim = ax.get_ylim()
-        out = []
-        # First plot horizontal
-        out += ax.plot(xlim, (centroid[1], centroid[1]), color='xkcd:sunflower yellow', linewidth=2)
-        # Second plot vertical
-        out += ax.plot((centroid[0], centroid[0]), ylim, color='xkcd:sunflower yellow', linewidth=2)
-        if len(centroid) > 2:
-            # Draw also ellipse
-            e = Ellipse((centroid[0], centroid[1]), centroid[2], centroid[3], angle=0, fill=False, color='xkcd:sunflower yellow', linewidth=2)
-            ax.add_patch(e)
-            out.append(e)
-        return out
-
-    def update_centroid(self, ax, lines, centroid):
-        xlim = ax.get_xlim()
-        ylim = ax.get_ylim()
-        # First update horizontal
-        lines[0].set_data(xlim, (centroid[1], centroid[1]))
-        # Second update vertical
-        lines[1].set_data((centroid[0], centroid[0]), ylim)
-        # Update ellipse
-        if len(centroid) > 2:
-            if len(lines) > 2:
-                lines[2].remove()
-            else:
-                lines.append(None)
-            e = Ellipse((centroid[0], centroid[1]), centroid[2], centroid[3], angle=0, fill=False, color='xkcd:sunflower yellow', linewidth=2)
-            ax.add_patch(e)
-            lines[2] = e
-
-    def draw_reference(self, ax, ref):
-        xlim = ax.get_xlim()
-        ylim = ax.get_ylim()
-        out = []
-        # First plot horizontal
-        out += ax.plot(xlim, (ref['y'], ref['y']), color='xkcd:lime green', linewidth=2)
-        # Second plot vertical
-        out += ax.plot((ref['x'], ref['x']), ylim, color='xkcd:lime green', linewidth=2)
-        if ref['v'] > 0 and ref['h'] > 0:
-            # Draw also ellipse
-            e = Ellipse((ref['x'], ref['y']), ref['h'], ref['v'], angle=0, fill=False, color='xkcd:lime green', linewidth=2)
-            ax.add_patch(e)
-            out.append(e)
-        return out
-
-    def update_reference(self, ax, lines, ref):
-        xlim = ax.get_xlim()
-        ylim = ax.get_ylim()
-        # First update horizontal
-        lines[0].set_data(xlim, (ref['y'], ref['y']))
-        # Second update vertical
-        lines[1].set_data((ref['x'], ref['x']), ylim)
-        # Update ellipse
-        if ref['h'] > 0 and ref['v'] > 0:
-            if len(lines) > 2:
-                lines[2].remove()
-            else:
-                lines.append(None)
-            e = Ellipse((ref['x'], ref['y']), ref['h'], ref['v'], angle=0, fill=False, color='xkcd:lime green', linewidth=2)
-            ax.add_patch(e)
-            lines[2] = e
-        else:
-            if len(lines) > 2:
-                lines[2].remove()
-                del lines[2]
-
     def draw_projection_ref(self, ax, pos, color):
         ylim = ax.get_ylim()
-        lines = ax.plot((pos, pos), ylim, color=color)
+        lines = ax.plot((pos, pos), ylim, color=color, animated=True)
         return lines
 
     def update_projection_ref(self, ax, line, pos):
@@ -731,21 +1168,15 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
 
     @QtCore.pyqtSlot(bool)
     def on_image_bt_tracking_l_toggled(self, state):
-        if not state and self.image_l_tracking is not None:
-            if len(self.image_l_tracking) > 2:
-                self.image_l_tracking[-1].remove()
-            self.remove_plot_lines(self.image_l_ax, self.image_l_tracking[0:2])
-            self.image_l_tracking = None
-            self.canvas_l.draw()
+        if not state:
+            self.view_l.clear_tracking()
+            self.view_l.clear_spots()
 
     @QtCore.pyqtSlot(bool)
     def on_image_bt_tracking_r_toggled(self, state):
-        if not state and self.image_r_tracking is not None:
-            if len(self.image_r_tracking) > 2:
-                self.image_r_tracking[-1].remove()
-            self.remove_plot_lines(self.image_r_ax, self.image_r_tracking[0:2])
-            self.image_r_tracking = None
-            self.canvas_r.draw()
+        if not state:
+            self.view_r.clear_tracking()
+            self.view_r.clear_spots()
 
     @QtCore.pyqtSlot(bool)
     def on_image_bt_tracking_u_toggled(self, state):
@@ -767,9 +1198,12 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
             self.image_bt_swapref_l.setIcon(self.track_e_icon)
         else:
             self.image_bt_swapref_l.setIcon(self.track_c_icon)
-            if self.image_l_tracking is not None and len(self.image_l_tracking) > 2:
-                self.image_l_tracking[-1].remove()
-                del self.image_l_tracking[-1]
+            if self.view_l.tracking is not None:
+                # Remove ellipse
+                attribute = str(self.image_l_select.currentText()).lower()
+                if self.last_centroid.get(attribute) is not None:
+                    self.view_l.set_tracking(self.last_centroid[attribute][0:2])
+                    self.view_l.refresh()
 
     @QtCore.pyqtSlot(bool)
     def on_image_bt_swapref_r_toggled(self, state):
@@ -777,9 +1211,12 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
             self.image_bt_swapref_r.setIcon(self.track_e_icon)
         else:
             self.image_bt_swapref_r.setIcon(self.track_c_icon)
-            if self.image_r_tracking is not None and len(self.image_r_tracking) > 2:
-                self.image_r_tracking[-1].remove()
-                del self.image_r_tracking[-1]
+            if self.view_r.tracking is not None:
+                # Remove ellipse
+                attribute = str(self.image_r_select.currentText()).lower()
+                if self.last_centroid.get(attribute) is not None:
+                    self.view_r.set_tracking(self.last_centroid[attribute][0:2])
+                    self.view_r.refresh()
 
     @QtCore.pyqtSlot(bool)
     def on_image_bt_swapref_u_toggled(self, state):
@@ -800,28 +1237,20 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
         if state:
             attribute = str(self.image_l_select.currentText()).lower()
             if attribute in self.references and self.references[attribute] is not None:
-                self.image_l_ref = self.draw_reference(self.image_l_ax, self.references[attribute])
+                self.view_l.set_reference(self.references[attribute])
+                self.view_l.refresh()
         else:
-            if self.image_l_ref is not None:
-                if len(self.image_l_ref) > 2:
-                    self.image_l_ref[-1].remove()
-                self.remove_plot_lines(self.image_l_ax, self.image_l_ref[0:2])
-                self.image_l_ref = None
-                self.canvas_l.draw()
+            self.view_l.clear_reference()
 
     @QtCore.pyqtSlot(bool)
     def on_image_bt_reference_r_toggled(self, state):
         if state:
             attribute = str(self.image_r_select.currentText()).lower()
             if attribute in self.references and self.references[attribute] is not None:
-                self.image_r_ref = self.draw_reference(self.image_r_ax, self.references[attribute])
+                self.view_r.set_reference(self.references[attribute])
+                self.view_r.refresh()
         else:
-            if self.image_r_ref is not None:
-                if len(self.image_r_ref) > 2:
-                    self.image_r_ref[-1].remove()
-                self.remove_plot_lines(self.image_r_ax, self.image_r_ref[0:2])
-                self.image_r_ref = None
-                self.canvas_r.draw()
+            self.view_r.clear_reference()
 
     @QtCore.pyqtSlot(bool)
     def on_image_bt_reference_u_toggled(self, state):
@@ -847,22 +1276,22 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
                 self.image_d_ref = None
                 self.canvas_d.draw()
 
-    def draw_gauss_fit(self, ax, plot):
-        """ Add gauss fit plot to figure
+    def draw_gauss_fit(self, ax, plot, param=None):
+        """ Add gauss fit plot to figure. If param is not given the plot data are fitted
         """
         x = plot.get_xdata()
-        y = plot.get_ydata()
-        param = self.gf.fit(x, y)
+        if param is None:
+            param = self.gf.fit_batch(x, plot.get_ydata())[0]
         fit = self.gf.gaussian_1D(x, *param)
-        lines = ax.plot(x, fit, 'r')
+        lines = ax.plot(x, fit, 'r', animated=True)
         return lines
 
-    def update_gauss_fit(self, plot, line):
-        """ Update a gauss fit given the plot and the fit line
+    def update_gauss_fit(self, plot, line, param=None):
+        """ Update a gauss fit given the plot and the fit line. If param is not given the plot data are fitted
         """
         x = plot.get_xdata()
-        y = plot.get_ydata()
-        param = self.gf.fit(x, y)
+        if param is None:
+            param = self.gf.fit_batch(x, plot.get_ydata())[0]
         fit = self.gf.gaussian_1D(x, *param)
         line.set_ydata(fit)
 
@@ -892,85 +1321,6 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
                 self.image_d_fit = None
                 self.canvas_d.draw()
 
-    def compute_profiles(self, img):
-        v = np.sum(img, axis=1) / img.shape[1]
-        h = np.sum(img, axis=0) / img.shape[0]
-        return (v, h)
-
-    def check_mean(self, c1, c2, c3, c4):
-        corners = np.array([c1, c2, c3, c4])
-        return np.mean(corners[corners <= np.median(corners)])
-
-    def compute_centroid(self, img):
-        """ Compute a centroid from the image
-        """
-        # Transpose the image if needed
-        #img = cv2.transpose(img)
-
-        # Find background (minumum) of the image by taking the value at the four corners
-        c1 = np.mean(img[0:10,0:10])  # Up left
-        c2 = np.mean(img[0:10,-10:])  # Up right
-        c3 = np.mean(img[-10:,0:10])  # Down left
-        c4 = np.mean(img[-10:,-10:])  # Down right
-        img_min = int(self.check_mean(c1, c2, c3, c4))
-
-        # Find maximum value of the image
-        img_max = int(np.max(img))
-        self.debug("Centroid: Min = {0:d}, Max = {1:d}".format(img_min, img_max))
-
-        # Check if we have at least some singal
-        if np.abs(img_max - img_min) > 10:
-
-            # Compute threshold
-            th = int(0.33 * (img_max - img_min))
-            self.debug("Centroid: threshold = {0:d}".format(th))
-
-            # Threshold the image
-            mask = cv2.inRange(img, th, int(np.max(img)))
-
-            #mask = cv2.GaussianBlur(mask, (5,5),0)
-            element = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2,2))
-            mask = cv2.erode(mask, element, iterations=1)
-            mask = cv2.dilate(mask, element, iterations=1)
-
-            # Find contours in the mask and inititalize the current
-            # (x,y) of the ball
-            cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if len(cnts) == 3:
-                cnts = cnts[1]
-            else:
-                cnts = cnts[0]
-            self.debug("Centroid: found {0:d} contours".format(len(cnts)))
-
-            # Proceed only if at least one contour is found
-            if len(cnts) > 0:
-                # Get the contour with the largest area
-                c = max(cnts, key=cv2.contourArea)
-
-                # Fit ellipse
-                #ellipse = cv2.fitEllipse(c)
-
-                ## Gauss 2D fit
-                # Params: baseline, maximum, mean_x, mean_y, sigma_x, sigma_y, theta
-                x = np.arange(img.shape[1])
-                y = np.arange(img.shape[0])
-                params = self.gf.fit_2d(x, y, img)
-                ellipse = (params[2], params[3], 2*np.sqrt(2)*params[4], 2*np.sqrt(2)*params[5])
-                self.debug("Ellipse: {0!s}".format(ellipse))
-
-                # Create a mask from the single contour
-                mask = np.zeros(img.shape, dtype=np.uint8)
-                cv2.drawContours(mask, [c], 0, 1, -1)
-
-                # Take the moments to get the centroid (by using the masked image)
-                moments = cv2.moments(img * mask)
-                if moments['m00'] != 0:
-                    centroid_x = (moments['m10']/moments['m00'])
-                    centroid_y = (moments['m01']/moments['m00'])
-                    return (centroid_x, centroid_y, ellipse)
-
-        return None
-
     @QtCore.pyqtSlot(int)
     def on_image_l_select_currentIndexChanged(self, index):
         if self.dev is not None:
@@ -1015,9 +1365,45 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
 
     @QtCore.pyqtSlot(bool)
     def on_ac_save_triggered(self, checked):
-        """ Save image
+        """ Start or stop recording frames to HDF5
+        """
+        if self.recorder is None:
+            self.start_recording()
+        else:
+            self.stop_recording()
+
+    def start_recording(self):
+        """ Ask for a file and start recording all incoming frames
         """
-        self.debug("Save Image")
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filename, ext = QFileDialog.getSaveFileName(self, "Record frames", "", "HDF5 (*.h5)", options=options)
+        if not filename:
+            return
+        if re.match(".*\.h5$", filename) is None:
+            filename += ".h5"
+
+        metadata = {}
+        metadata["Camera"] = "simulator" if self.simulation else self.dev.name()
+        metadata["Beam estimator"] = self.beam.centroid_engine
+        try:
+            self.recorder = FrameRecorder(filename, metadata=metadata)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Failed to start recording", "Error: {0!s}".format(e))
+            return
+        self.ac_save.setText("Stop recording")
+        self.statusbar.showMessage("Recording frames to {0}".format(filename))
+
+    def stop_recording(self):
+        """ Stop recording and close the file
+        """
+        if self.recorder is None:
+            return
+        recorder = self.recorder
+        self.recorder = None
+        recorder.stop()
+        self.ac_save.setText("Record frames")
+        self.statusbar.showMessage("Recorded {0:d} frames to {1} ({2:d} dropped)".format(recorder.recorded, recorder.filename, recorder.dropped))
 
     @QtCore.pyqtSlot(bool)
     def on_ac_setref_triggered(self, checked):
@@ -1029,32 +1415,97 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
 
     @QtCore.pyqtSlot(bool)
     def on_ac_save_db_triggered(self, checked):
-        """ Save references to database
+        """ Save the modified references of all the cameras to database
         """
-        prop = {}
-        if self.simulation:
-            dev_name = "simulator"
-        else:
-            dev_name = self.dev.name()
-
-        for k, v in self.references.items():
-            if v is not None:
-                prop[dev_name + ":" + k] = "x={0:.2f}:y={1:.2f}:h={2:.2f}:v={3:.2f}".format(v['x'], v['y'], v['h'], v['v'])
         try:
-            if self.simulation:
-                for k, v in prop.items():
-                    print("Setting property '{0}' to '{1}'".format(k, v))
-            else:
-                self.db.put_property("LaserCamera", prop)
+            n = self.ref_store.save()
+            self.statusbar.showMessage("Saved {0:d} references".format(n) if n else "No modified references to save")
         except PT.DevFailed as e:
             QtWidgets.QMessageBox.critical(self, "Failed to save references", "Error: {0!s}".format(e.args[0].desc))
 
+    def set_reference(self, attr_name, ref):
+        """ Set the reference of an attribute of the current camera. It is saved to database with the others
+        """
+        self.references[attr_name] = None if ref is None else dict(ref)
+        self.ref_store.set("simulator" if self.simulation else self.dev.name(), attr_name, ref)
+
+    @QtCore.pyqtSlot(bool)
+    def on_ac_multi_spot_toggled(self, state):
+        self.multi_spot = state
+        self.spot_trackers = {}
+        self.frames.clear()
+        if not state:
+            for view in (self.view_l, self.view_r):
+                view.clear_spots()
+
+    @QtCore.pyqtSlot(bool)
+    def on_ac_dark_store_triggered(self, checked):
+        """ Store the newest frame in the history of each image as its dark frame
+        """
+        dark_frames = {}
+        for (attr_name, ring) in self.history.items():
+            if len(ring):
+                (ts, img) = ring.get(0)
+                dark_frames[attr_name] = img
+        if len(dark_frames) == 0:
+            self.statusbar.showMessage("No frames available to store as dark frames")
+            return
+        # Replace the dict so that analysis threads never see a partial update
+        self.beam.dark_frames = dark_frames
+        self.ac_dark_subtract.setEnabled(True)
+        self.frames.clear()
+        self.statusbar.showMessage("Stored dark frames for {0}".format(", ".join(sorted(dark_frames.keys()))))
+
+    @QtCore.pyqtSlot(bool)
+    def on_ac_dark_subtract_toggled(self, state):
+        self.beam.dark_subtract = state
+        self.frames.clear()
+        self.gf.reset()
+
+    @QtCore.pyqtSlot(bool)
+    def on_ac_dark_clear_triggered(self, checked):
+        self.beam.dark_frames = {}
+        self.ac_dark_subtract.setChecked(False)
+        self.ac_dark_subtract.setEnabled(False)
+
+    @QtCore.pyqtSlot(QtWidgets.QAction)
+    def on_centroid_engine_triggered(self, action):
+        self.beam.centroid_engine = str(action.data())
+        self.reset_analysis()
+
+    @QtCore.pyqtSlot(bool)
+    def on_ac_fit_roi_toggled(self, state):
+        self.beam.fit_roi = state
+        self.reset_analysis()
+
+    @QtCore.pyqtSlot(QtWidgets.QAction)
+    def on_fit_binning_triggered(self, action):
+        self.beam.fit_binning = int(action.data())
+        self.reset_analysis()
+
+    @QtCore.pyqtSlot(bool)
+    def on_ac_fit_warm_toggled(self, state):
+        self.gf.warm_start = state
+        self.gf.reset()
+
+    @QtCore.pyqtSlot(bool)
+    def on_ac_fit_refine_toggled(self, state):
+        self.beam.fit_refine = state
+        self.reset_analysis()
+
+    def reset_analysis(self):
+        """ Forget the cached results of the frames and the warm start solutions after a change of the
+            analysis settings, so that centroids computed with the old settings are not shown again
+        """
+        self.frames.clear()
+        self.gf.reset()
+
     @QtCore.pyqtSlot(bool)
     def on_ac_setup_triggered(self, checked):
         """ Configure camera
         """
         try:
-            dlg = CameraSetup(self.dev, self.scaling, self)
+            dlg = CameraSetup(self.dev, self.scaling, self, backend=self.view_backend)
         except RuntimeError:
             # No camera
             QtWidgets.QMessageBox.critical(self, "No camera", "Cannot find any camera available. Cannot open configuration window")
@@ -1082,6 +1533,9 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
         reply = QtWidgets.QMessageBox.question(self, 'Message', "Are you sure to quit?", QtWidgets.QMessageBox.Yes, QtWidgets.QMessageBox.No)
         if reply == QtWidgets.QMessageBox.Yes:
             self.close_camera()
+            self.analyzer.shutdown()
+            self.stop_recording()
+            self.latency.close()
             event.accept()
         else:
             event.ignore()
@@ -1129,17 +1583,39 @@ class LaserCamera(QtWidgets.QMainWindow, Ui_LaserCamera):
 
 if __name__ == "__main__":
     import sys
+    import argparse
     app = QtWidgets.QApplication(sys.argv)
     if app.primaryScreen().physicalDotsPerInch() > 120:
         app.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True) # Enable HiDpi
-    debug = False
-    simulation = False
-    if len(sys.argv):
-        if "--debug" in sys.argv:
-            debug = True
-        if "--simulation" in sys.argv:
-            simulation = True
-    ui = LaserCamera(debug=debug, simulation=simulation)
+
+    parser = argparse.ArgumentParser(description="Laser camera GUI")
+    parser.add_argument("--debug", action="store_true", help="Print debug messages")
+    parser.add_argument("--pyqtgraph", action="store_true", help="Use pyqtgraph for the image views")
+    parser.add_argument("--simulation", action="store_true", help="Use simulated images instead of a camera")
+    parser.add_argument("--sim-size", default="100x120", help="Simulated frame size as WIDTHxHEIGHT (up to 2048x2048)")
+    parser.add_argument("--sim-rate", type=float, default=2.0, help="Simulated frame rate in fps (0 for as fast as possible)")
+    parser.add_argument("--sim-attributes", type=int, default=2, help="Number of simulated image attributes")
+    parser.add_argument("--sim-drift", type=float, default=0.0, help="Beam drift in pixels per second")
+    parser.add_argument("--sim-jitter", type=float, default=5.0, help="RMS beam jitter in pixels")
+    parser.add_argument("--sim-noise", type=float, default=5.0, help="RMS noise in counts")
+    parser.add_argument("--sim-sigma", type=float, default=10.0, help="Beam sigma in pixels")
+    parser.add_argument("--sim-pool", type=int, default=32, help="Number of pre-generated frames")
+    # Qt arguments are consumed by QApplication, ignore anything else
+    (args, unknown) = parser.parse_known_args(app.arguments()[1:])
+
+    backend = 'pyqtgraph' if args.pyqtgraph else 'matplotlib'
+    sim_options = None
+    if args.simulation:
+        try:
+            (width, height) = [int(v) for v in args.sim_size.lower().split("x")]
+        except ValueError:
+            parser.error("invalid frame size '{0}'".format(args.sim_size))
+        if not (0 < width <= 2048 and 0 < height <= 2048):
+            parser.error("frame size must be between 1x1 and 2048x2048")
+        sim_options = {'width': width, 'height': height, 'rate': max(args.sim_rate, 0.0), 'attributes': args.sim_attributes,
+                       'drift': args.sim_drift, 'jitter': args.sim_jitter, 'noise': args.sim_noise, 'sigma': args.sim_sigma,
+                       'pool': args.sim_pool}
+    ui = LaserCamera(debug=args.debug, simulation=args.simulation, backend=backend, sim_options=sim_options)
     ui.show()
     ret = app.exec_()
     sys.exit(ret)
\ No newline at end of file
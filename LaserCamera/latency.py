@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:37 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import time
+import threading
+import collections
+import numpy as np
+
+
+class LatencyMonitor(object):
+    """ Latency statistics of the stages of the frame pipeline
+
+    Stages:
+        delivery        device timestamp to Tango callback (wall clock, needs synchronized clocks)
+        queue           Tango callback to event handler (event dispatcher)
+        handler         event handler
+        analysis_wait   event handler to analysis start (analysis worker pool)
+        analysis        beam analysis
+        result_queue    analysis end to result handler (Qt signal queue)
+        overlay         result handler (overlays update)
+        draw            image or projection update
+        end_to_end      Tango callback to the frame drawn
+
+    The durations of the last window samples of each stage are kept to compute the statistics. record()
+    can be called from any thread. If trace is a file name each sample is also
+    written to it as a CSV row (time, attribute, frame timestamp, stage, duration in ms).
+    """
+
+    stages = ('delivery', 'queue', 'handler', 'analysis_wait', 'analysis', 'result_queue', 'overlay', 'draw', 'end_to_end')
+
+    def __init__(self, window=200, trace=None):
+        self.lock = threading.Lock()
+        self.samples = {s: collections.deque(maxlen=window) for s in self.stages}
+        self.counts = dict.fromkeys(self.stages, 0)
+        self.last_counts = dict(self.counts)
+        self.last_time = time.monotonic()
+        self.trace = None
+        if trace is not None:
+            self.trace = open(trace, "w")
+            self.trace.write("time,attribute,frame_timestamp,stage,ms\n")
+
+    def record(self, stage, duration, attr_name="", timestamp=0.0):
+        """ Add a sample (in seconds) to a stage
+        """
+        with self.lock:
+            self.samples[stage].append(duration)
+            self.counts[stage] += 1
+            if self.trace is not None:
+                self.trace.write("{0:.6f},{1},{2:.6f},{3},{4:.3f}\n".format(time.monotonic(), attr_name, timestamp, stage, 1e3 * duration))
+
+    def summary(self):
+        """ Return (latency, rates). latency is the median duration in ms of the recent samples of each stage,
+            rates the number of samples per second of each stage since the last call
+        """
+        now = time.monotonic()
+        with self.lock:
+            latency = {s: 1e3 * np.median(d) if len(d) else np.nan for (s, d) in self.samples.items()}
+            dt = max(now - self.last_time, 1e-6)
+            rates = {s: (self.counts[s] - self.last_counts[s]) / dt for s in self.stages}
+            self.last_counts = dict(self.counts)
+            self.last_time = now
+            if self.trace is not None:
+                self.trace.flush()
+        return (latency, rates)
+
+    def clear(self):
+        with self.lock:
+            for d in self.samples.values():
+                d.clear()
+
+    def close(self):
+        """ Close the trace file
+        """
+        with self.lock:
+            if self.trace is not None:
+                self.trace.close()
+                self.trace = None
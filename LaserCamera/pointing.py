@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 14 15:08:33 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import numpy as np
+
+from PyQt5 import QtCore
+from PyQt5 import QtWidgets
+
+# Matplotlib stuff
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+
+class TimeSeries(object):
+    """ Append-only time series of beam parameters with incremental statistics
+
+    Samples are stored in preallocated arrays that double in size when full. Prefix sums of the values,
+    of their squares and of their products with time are updated on each append, so rolling RMS and
+    drift over any window are computed in constant time. The overlapping Allan deviation is accumulated
+    incrementally for octave spaced averaging factors, assuming approximately uniform sampling.
+    Values are stored relative to the first sample to limit the loss of precision of the sums.
+    """
+
+    columns = ('x', 'y', 'width', 'height', 'angle')
+
+    def __init__(self, capacity=1024):
+        ncols = len(self.columns)
+        self.n = 0
+        self.t0 = None
+        self.offset = np.zeros(ncols)
+        self.t = np.empty(capacity)
+        self.data = np.empty((capacity, ncols))
+        # Prefix sums (element i is the sum of the first i samples)
+        self.s_t = np.zeros(capacity + 1)
+        self.s_tt = np.zeros(capacity + 1)
+        self.s_x = np.zeros((capacity + 1, ncols))
+        self.s_xx = np.zeros((capacity + 1, ncols))
+        self.s_tx = np.zeros((capacity + 1, ncols))
+        # Allan variance accumulators for averaging factors 1, 2, 4, ...
+        self.allan_m = 2 ** np.arange(24)
+        self.allan_sum = np.zeros((len(self.allan_m), ncols))
+
+    def __len__(self):
+        return self.n
+
+    def grow(self):
+        """ Double the size of all the arrays
+        """
+        cap = 2 * self.t.shape[0]
+        for name in ('t', 'data', 's_t', 's_tt', 's_x', 's_xx', 's_tx'):
+            old = getattr(self, name)
+            # Prefix sums have one more element
+            extra = 1 if name.startswith('s_') else 0
+            new = np.zeros((cap + extra, ) + old.shape[1:])
+            new[0:old.shape[0]] = old
+            setattr(self, name, new)
+
+    def append(self, t, centroid):
+        """ Append a centroid (x, y, ellipse) taken at time t. Samples not newer than the last one are ignored
+        """
+        if self.n and t <= self.t0 + self.t[self.n - 1]:
+            return False
+        ellipse = centroid[2]
+        row = np.array([centroid[0], centroid[1], ellipse[2], ellipse[3], ellipse[4] if len(ellipse) > 4 else 0.0], dtype=np.float64)
+
+        if self.n == 0:
+            self.t0 = t
+            self.offset = row.copy()
+        if self.n == self.t.shape[0]:
+            self.grow()
+
+        n = self.n
+        tr = t - self.t0
+        x = row - self.offset
+        self.t[n] = tr
+        self.data[n] = row
+        self.s_t[n + 1] = self.s_t[n] + tr
+        self.s_tt[n + 1] = self.s_tt[n] + tr * tr
+        self.s_x[n + 1] = self.s_x[n] + x
+        self.s_xx[n + 1] = self.s_xx[n] + x * x
+        self.s_tx[n + 1] = self.s_tx[n] + tr * x
+        self.n = n + 1
+
+        # New overlapping Allan terms. The prefix sums are the phase of the data
+        m = self.allan_m[2 * self.allan_m <= self.n]
+        k = self.n
+        d = self.s_x[k] - 2 * self.s_x[k - m] + self.s_x[k - 2 * m]
+        self.allan_sum[0:len(m)] += d * d
+        return True
+
+    def times(self):
+        """ Sample times relative to the first sample
+        """
+        return self.t[0:self.n]
+
+    def values(self, column=None):
+        if column is None:
+            return self.data[0:self.n]
+        return self.data[0:self.n, self.columns.index(column)]
+
+    def window(self, window):
+        w = self.n if window is None else min(window, self.n)
+        return (self.n - w, self.n, w)
+
+    def rms(self, window=None):
+        """ RMS deviation from the mean of the last window samples
+        """
+        (a, b, w) = self.window(window)
+        if w < 2:
+            return np.full(len(self.columns), np.nan)
+        mean = (self.s_x[b] - self.s_x[a]) / w
+        var = (self.s_xx[b] - self.s_xx[a]) / w - mean * mean
+        return np.sqrt(np.maximum(var, 0))
+
+    def drift(self, window=None):
+        """ Least squares drift rate (per second) over the last window samples
+        """
+        (a, b, w) = self.window(window)
+        if w < 2:
+            return np.full(len(self.columns), np.nan)
+        st = self.s_t[b] - self.s_t[a]
+        stt = self.s_tt[b] - self.s_tt[a]
+        sx = self.s_x[b] - self.s_x[a]
+        stx = self.s_tx[b] - self.s_tx[a]
+        den = w * stt - st * st
+        if den <= 0:
+            return np.full(len(self.columns), np.nan)
+        return (w * stx - st * sx) / den
+
+    def sample_time(self):
+        """ Mean sampling interval
+        """
+        if self.n < 2:
+            return np.nan
+        return self.t[self.n - 1] / (self.n - 1)
+
+    def allan(self):
+        """ Overlapping Allan deviation. Return (tau, adev) with adev of shape (len(tau), ncols)
+        """
+        valid = 2 * self.allan_m <= self.n
+        m = self.allan_m[valid]
+        count = self.n - 2 * m + 1
+        avar = self.allan_sum[valid] / (2.0 * (m * m * count))[:, np.newaxis]
+        return (m * self.sample_time(), np.sqrt(avar))
+
+
+class PointingPanel(QtWidgets.QWidget):
+    """ Tab with the beam pointing history and drift statistics of the image attributes
+    """
+
+    def __init__(self, parent=None):
+        QtWidgets.QWidget.__init__(self, parent)
+        self.series = {}
+
+        # Controls
+        self.attr_select = QtWidgets.QComboBox()
+        self.attr_select.currentIndexChanged.connect(self.on_attr_select_currentIndexChanged)
+        self.window = QtWidgets.QSpinBox()
+        self.window.setRange(2, 100000)
+        self.window.setValue(100)
+        self.window.setSuffix(" samples")
+        self.window.setToolTip("Window for RMS jitter and drift")
+        self.clear_button = QtWidgets.QPushButton("Clear")
+        self.clear_button.released.connect(self.on_clear_button_released)
+        self.stats = QtWidgets.QLabel()
+
+        hbox = QtWidgets.QHBoxLayout()
+        hbox.addWidget(QtWidgets.QLabel("Attribute"))
+        hbox.addWidget(self.attr_select)
+        hbox.addWidget(QtWidgets.QLabel("Window"))
+        hbox.addWidget(self.window)
+        hbox.addWidget(self.clear_button)
+        hbox.addStretch()
+
+        # Plots
+        self.fig = Figure()
+        self.canvas = FigureCanvas(self.fig)
+        self.canvas.setParent(self)
+        self.ax_pos = self.fig.add_subplot(211)
+        self.ax_pos.set_xlabel("Time [s]")
+        self.ax_pos.set_ylabel("Deviation [px]")
+        self.pos_lines = self.ax_pos.plot([], [], [], [])
+        self.ax_pos.legend(self.pos_lines, ("x", "y"), loc='upper left')
+        self.ax_allan = self.fig.add_subplot(212)
+        self.ax_allan.set_xlabel("Tau [s]")
+        self.ax_allan.set_ylabel("Allan deviation [px]")
+        self.ax_allan.set_xscale('log')
+        self.ax_allan.set_yscale('log')
+        self.allan_lines = self.ax_allan.plot([], [], 'o-', [], [], 'o-')
+        self.fig.tight_layout()
+
+        vbox = QtWidgets.QVBoxLayout()
+        vbox.addLayout(hbox)
+        vbox.addWidget(self.canvas)
+        vbox.addWidget(self.stats)
+        self.setLayout(vbox)
+
+        # Redraw at most once per second
+        self.modified = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+
+    def append(self, attr_name, t, centroid):
+        """ Add a centroid to the time series of an attribute
+        """
+        if attr_name not in self.series:
+            self.series[attr_name] = TimeSeries()
+            self.attr_select.addItem(attr_name)
+        if self.series[attr_name].append(t, centroid) and attr_name == self.attr_select.currentText():
+            self.modified = True
+
+    def remove(self, attr_name):
+        """ Remove the time series of an attribute
+        """
+        if self.series.pop(attr_name, None) is not None:
+            self.attr_select.removeItem(self.attr_select.findText(attr_name))
+            self.modified = True
+
+    def clear(self):
+        self.series = {}
+        self.attr_select.clear()
+        self.modified = True
+
+    @QtCore.pyqtSlot(int)
+    def on_attr_select_currentIndexChanged(self, index):
+        self.modified = True
+
+    @QtCore.pyqtSlot()
+    def on_clear_button_released(self):
+        self.clear()
+
+    @QtCore.pyqtSlot()
+    def refresh(self):
+        """ Update plots and statistics if the panel is visible
+        """
+        if not self.modified or not self.isVisible():
+            return
+        self.modified = False
+
+        ts = self.series.get(self.attr_select.currentText())
+        if ts is None or len(ts) == 0:
+            for l in self.pos_lines + self.allan_lines:
+                l.set_data([], [])
+            self.stats.setText("")
+            self.canvas.draw_idle()
+            return
+
+        t = ts.times()
+        for (i, l) in enumerate(self.pos_lines):
+            v = ts.values(ts.columns[i])
+            l.set_data(t, v - ts.offset[i])
+        (tau, adev) = ts.allan()
+        for (i, l) in enumerate(self.allan_lines):
+            l.set_data(tau, adev[:, i])
+        for ax in (self.ax_pos, self.ax_allan):
+            ax.relim()
+            ax.autoscale_view()
+
+        rms = ts.rms(self.window.value())
+        drift = 60.0 * ts.drift(self.window.value())
+        self.stats.setText("Samples: {0:d}    RMS jitter x: {1:.2f} px, y: {2:.2f} px    Drift x: {3:.3f} px/min, y: {4:.3f} px/min".format(len(ts), rms[0], rms[1], drift[0], drift[1]))
+        self.canvas.draw_idle()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 13 09:42:18 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import time
+import datetime
+import threading
+import queue
+import collections
+import numpy as np
+import h5py as h5
+
+
+class FrameRecorder(threading.Thread):
+    """ Stream camera frames to an HDF5 file from a background thread
+
+    Each attribute is stored in its own group with the datasets:
+        frames      (N, H, W) chunked and compressed images
+        timestamps  (N,) event timestamps in seconds since the epoch
+        centroid    (N, 2) beam centroid (x, y), NaN if not computed
+        ellipse     (N, 5) beam ellipse (x, y, width, height, angle), NaN if not computed
+
+    Frames are passed through a bounded queue. When the writer cannot keep up, new frames are dropped
+    instead of accumulating in memory. Centroids are matched to the frames by attribute and timestamp,
+    so they can be recorded whenever the analysis completes.
+    """
+
+    def __init__(self, filename, queue_size=64, compression='lzf', metadata=None):
+        """ Open the file and start the writer thread
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.filename = filename
+        self.compression = compression
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.recorded = 0
+        self.dropped = 0
+        self.groups = {}
+        self.index = {}
+        self.file = h5.File(filename, "w")
+        now = datetime.datetime.now()
+        self.file.attrs.create("Date", now.strftime("%Y-%m-%d, %H:%M:%S"))
+        self.file.attrs.create("Timestamp", now.timestamp())
+        if metadata is not None:
+            for k, v in metadata.items():
+                self.file.attrs.create(k, v)
+        self.start()
+
+    def record_frame(self, attr_name, timestamp, img):
+        """ Queue a frame for writing. Return False if the frame was dropped
+        """
+        try:
+            self.queue.put_nowait(('frame', attr_name, timestamp, img))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def record_centroid(self, attr_name, timestamp, centroid):
+        """ Queue the centroid of an already recorded frame
+        """
+        if centroid is None:
+            return
+        try:
+            self.queue.put_nowait(('centroid', attr_name, timestamp, centroid))
+        except queue.Full:
+            pass
+
+    def stop(self):
+        """ Write the pending frames, close the file and terminate the thread
+        """
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        """ Writer loop
+        """
+        last_flush = time.time()
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=1.0)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if len(item):
+                    try:
+                        if item[0] == 'frame':
+                            self.write_frame(*item[1:])
+                        else:
+                            self.write_centroid(*item[1:])
+                    except Exception as e:
+                        print("[E] Failed to record {0} of '{1}' ({2!s})".format(item[0], item[1], e))
+                if time.time() - last_flush > 1.0:
+                    self.file.flush()
+                    last_flush = time.time()
+        finally:
+            self.file.close()
+
+    def create_group(self, attr_name, img):
+        """ Create the group and the datasets of an attribute
+        """
+        g = self.file.create_group(attr_name)
+        (h, w) = img.shape
+        g.create_dataset("frames", shape=(0, h, w), maxshape=(None, h, w), dtype=img.dtype, chunks=(1, h, w), compression=self.compression)
+        g.create_dataset("timestamps", shape=(0, ), maxshape=(None, ), dtype=np.float64, chunks=(1024, ))
+        g.create_dataset("centroid", shape=(0, 2), maxshape=(None, 2), dtype=np.float64, chunks=(1024, 2), fillvalue=np.nan)
+        g.create_dataset("ellipse", shape=(0, 5), maxshape=(None, 5), dtype=np.float64, chunks=(1024, 5), fillvalue=np.nan)
+        self.groups[attr_name] = g
+        self.index[attr_name] = collections.OrderedDict()
+        return g
+
+    def write_frame(self, attr_name, timestamp, img):
+        g = self.groups.get(attr_name)
+        if g is None:
+            g = self.create_group(attr_name, img)
+        if img.shape != g['frames'].shape[1:]:
+            raise ValueError("frame shape changed from {0!s} to {1!s}".format(g['frames'].shape[1:], img.shape))
+
+        n = g['frames'].shape[0]
+        for d in ('frames', 'timestamps', 'centroid', 'ellipse'):
+            g[d].resize(n + 1, axis=0)
+        g['frames'][n] = img
+        g['timestamps'][n] = timestamp
+        # Keep the index of the latest frames only, older frames are unlikely to get a centroid
+        index = self.index[attr_name]
+        index[timestamp] = n
+        while len(index) > 1024:
+            index.popitem(last=False)
+        self.recorded += 1
+
+    def write_centroid(self, attr_name, timestamp, centroid):
+        n = self.index.get(attr_name, {}).pop(timestamp, None)
+        if n is None:
+            # Frame not recorded
+            return
+        g = self.groups[attr_name]
+        g['centroid'][n] = centroid[0:2]
+        ellipse = list(centroid[2])
+        if len(ellipse) < 5:
+            ellipse.append(0.0)
+        g['ellipse'][n] = ellipse[0:5]
@@ -11,9 +11,9 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 sys.path.insert(1, os.path.join(sys.path[0], '../Icons'))
 
+import re
 import time
 import numpy as np
-import copy
 
 from PyQt5 import QtCore
 from PyQt5 import QtWidgets
@@ -24,6 +24,108 @@ import PyTango as PT
 from PyQTango import TangoUtil
 
 
+class ReferenceStore(object):
+    """ Local cache of the beam references of all the cameras
+
+    References are stored as properties of the LaserCamera free object in the Tango database, named
+    "<camera device>:<image attribute>" with value "x=<x>:y=<y>:h=<h>:v=<v>". All of them are loaded at
+    once by load(). Changed references are kept in the cache and marked as dirty until save() writes
+    them back with a single put_property call (and a single delete_property call for removed ones).
+    Without a database (simulation) save() only prints the properties.
+    """
+
+    regex = re.compile(r"x=([-+\d.eE]+):y=([-+\d.eE]+):h=([-+\d.eE]+):v=([-+\d.eE]+)")
+
+    def __init__(self, db=None, obj="LaserCamera"):
+        self.db = db
+        self.obj = obj
+        self.refs = {}
+        self.dirty = set()
+
+    @staticmethod
+    def key(device, attr_name):
+        # Tango property names are case insensitive
+        return "{0}:{1}".format(device, attr_name).lower()
+
+    @classmethod
+    def parse(cls, value):
+        """ Parse a property value. Return the reference dict or None if not valid
+        """
+        m = cls.regex.match(value)
+        if m is None:
+            return None
+        try:
+            return dict(zip(('x', 'y', 'h', 'v'), [float(g) for g in m.groups()]))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def format(ref):
+        return "x={0:.2f}:y={1:.2f}:h={2:.2f}:v={3:.2f}".format(ref['x'], ref['y'], ref['h'], ref['v'])
+
+    def load(self):
+        """ Load the references of all the cameras with one query for the property names and one for the values
+        """
+        self.refs = {}
+        self.dirty = set()
+        if self.db is None:
+            return 0
+        names = [n for n in self.db.get_property_list(self.obj, "*") if ':' in n]
+        if len(names) == 0:
+            return 0
+        for (name, value) in self.db.get_property(self.obj, names).items():
+            if len(value):
+                ref = self.parse(value[0])
+                if ref is not None:
+                    self.refs[name.lower()] = ref
+        return len(self.refs)
+
+    def get(self, device, attr_name):
+        """ Return a copy of the reference of an attribute, or None
+        """
+        ref = self.refs.get(self.key(device, attr_name))
+        return None if ref is None else dict(ref)
+
+    def set(self, device, attr_name, ref):
+        """ Update the reference of an attribute (None to remove it) and mark it as dirty if changed
+        """
+        k = self.key(device, attr_name)
+        if ref is not None:
+            ref = {c: float(ref[c]) for c in ('x', 'y', 'h', 'v')}
+        if self.refs.get(k) == ref:
+            return
+        if ref is None:
+            self.refs.pop(k, None)
+        else:
+            self.refs[k] = ref
+        self.dirty.add(k)
+
+    def references(self, device, attributes):
+        """ Return a dict with a copy of the reference of each attribute (lower case) of a camera
+        """
+        return {a.lower(): self.get(device, a) for a in attributes}
+
+    def save(self):
+        """ Write back the dirty references. Return the number of properties written or deleted
+        """
+        if len(self.dirty) == 0:
+            return 0
+        put = {k: self.format(self.refs[k]) for k in self.dirty if k in self.refs}
+        delete = [k for k in self.dirty if k not in self.refs]
+        if self.db is None:
+            for (k, v) in sorted(put.items()):
+                print("Setting property '{0}' to '{1}'".format(k, v))
+            for k in delete:
+                print("Deleting property '{0}'".format(k))
+        else:
+            if len(put):
+                self.db.put_property(self.obj, put)
+            if len(delete):
+                self.db.delete_property(self.obj, delete)
+        self.dirty = set()
+        return len(put) + len(delete)
+
+
 class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
 
     def __init__(self, parent, scaling=1.0):
@@ -37,8 +139,8 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
         self.setupUi(self)
         self.setup_fonts_and_scaling()
 
-        # Load references from parent
-        self.references = copy.deepcopy(self.parent.references)
+        # Working copies of the references, copied from the parent on first use
+        self.references = {}
         self.ref_mod = False
 
         # Position dialog to the right
@@ -111,7 +213,7 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
         for w in ('x', 'y', 'v', 'h'):
             getattr(self, w).blockSignals(True)
 
-        ref = self.references[self.current_attribute]
+        ref = self.current_reference()
         if ref is not None:
             self.x.setValue(ref['x'])
             self.y.setValue(ref['y'])
@@ -128,7 +230,7 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
 
     @QtCore.pyqtSlot(float)
     def on_x_valueChanged(self, value):
-        if self.references[self.current_attribute] is None:
+        if self.current_reference() is None:
             self.references[self.current_attribute] = {'x': 0, 'y': 0, 'h': 0, 'v': 0}
         self.references[self.current_attribute]['x'] = value
         self.update_reference()
@@ -136,7 +238,7 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
 
     @QtCore.pyqtSlot(float)
     def on_y_valueChanged(self, value):
-        if self.references[self.current_attribute] is None:
+        if self.current_reference() is None:
             self.references[self.current_attribute] = {'x': 0, 'y': 0, 'h': 0, 'v': 0}
         self.references[self.current_attribute]['y'] = value
         self.update_reference()
@@ -144,7 +246,7 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
 
     @QtCore.pyqtSlot(float)
     def on_h_valueChanged(self, value):
-        if self.references[self.current_attribute] is None:
+        if self.current_reference() is None:
             self.references[self.current_attribute] = {'x': 0, 'y': 0, 'h': 0, 'v': 0}
         self.references[self.current_attribute]['h'] = value
         self.update_reference()
@@ -152,26 +254,28 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
 
     @QtCore.pyqtSlot(float)
     def on_v_valueChanged(self, value):
-        if self.references[self.current_attribute] is None:
+        if self.current_reference() is None:
             self.references[self.current_attribute] = {'x': 0, 'y': 0, 'h': 0, 'v': 0}
         self.references[self.current_attribute]['v'] = value
         self.update_reference()
         self.set_ref_modified()
 
+    def current_reference(self):
+        """ Working copy of the reference of the current attribute
+        """
+        if self.current_attribute not in self.references:
+            ref = self.parent.references.get(self.current_attribute)
+            self.references[self.current_attribute] = None if ref is None else dict(ref)
+        return self.references[self.current_attribute]
+
     def update_reference(self):
         if self.view_select.currentIndex() == 0:
-            if self.parent.image_l_ref is None:
-                self.parent.image_l_ref = self.parent.draw_reference(self.parent.image_l_ax, self.references[self.current_attribute])
-            else:
-                self.parent.update_reference(self.parent.image_l_ax, self.parent.image_l_ref, self.references[self.current_attribute])
-            self.parent.canvas_l.draw()
+            self.parent.view_l.set_reference(self.references[self.current_attribute])
+            self.parent.view_l.refresh()
 
         elif self.view_select.currentIndex() == 1:
-            if self.parent.image_r_ref is None:
-                self.parent.image_r_ref = self.parent.draw_reference(self.parent.image_r_ax, self.references[self.current_attribute])
-            else:
-                self.parent.update_reference(self.parent.image_r_ax, self.parent.image_r_ref, self.references[self.current_attribute])
-            self.parent.canvas_r.draw()
+            self.parent.view_r.set_reference(self.references[self.current_attribute])
+            self.parent.view_r.refresh()
 
         elif self.view_select.currentIndex() == 2:
             if self.parent.image_u_ref is None:
@@ -192,20 +296,10 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
 
     def remove_reference(self):
         if self.view_select.currentIndex() == 0:
-            if self.parent.image_l_ref is not None:
-                if len(self.parent.image_l_ref)> 2:
-                    self.parent.image_l_ref[-1].remove()
-                self.parent.remove_plot_lines(self.parent.image_l_ax, self.parent.image_l_ref[0:2])
-                self.parent.image_l_ref = None
-                self.parent.canvas_l.draw()
+            self.parent.view_l.clear_reference()
 
         elif self.view_select.currentIndex() == 1:
-            if self.parent.image_r_ref is not None:
-                if len(self.parent.image_r_ref)> 2:
-                    self.parent.image_r_ref[-1].remove()
-                self.parent.remove_plot_lines(self.parent.image_r_ax, self.parent.image_r_ref[0:2])
-                self.parent.image_r_ref = None
-                self.parent.canvas_r.draw()
+            self.parent.view_r.clear_reference()
 
         elif self.view_select.currentIndex() == 2:
             if self.parent.image_u_ref is not None:
@@ -260,14 +354,14 @@ class ReferencePanel(QtWidgets.QDialog, Ui_Reference):
     @QtCore.pyqtSlot()
     def on_pb_save_released(self):
         if self.ref_mod:
-            self.parent.references[self.current_attribute] = copy.deepcopy(self.references[self.current_attribute])
+            self.parent.set_reference(self.current_attribute, self.current_reference())
         self.ref_mod = False
         self.pb_save.setStyleSheet("")
 
     @QtCore.pyqtSlot()
     def on_pb_reset_released(self):
-        self.references[self.current_attribute] = copy.deepcopy(self.parent.references[self.current_attribute])
-        if self.references[self.current_attribute] is None:
+        self.references.pop(self.current_attribute, None)
+        if self.current_reference() is None:
             self.remove_reference()
         else:
             self.x.setValue(self.references[self.current_attribute]['x'])
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:02:37 2026
+
+Tests of the beam estimators on synthetic frames. Run with:
+    python -m unittest test_beamanalysis
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import unittest
+import numpy as np
+
+from beamanalysis import BeamAnalyzer
+
+
+class MomentsTest(unittest.TestCase):
+    """ Second moments estimator on a rotated gaussian beam with a non integer background
+    """
+
+    shape = (480, 640)
+    # Principal axes of the beam (1/e^2 diameters of 42.4 and 28.3 pixels)
+    sigma = (15.0, 10.0)
+    # Signal levels (baseline, maximum, noise) for each type
+    levels = {'uint8': (10.3, 200, 1), 'uint16': (100.4, 2000, 10), 'float32': (100.4, 2000, 10)}
+
+    def frames(self, analyzer, dtype, theta, count=16):
+        """ Generate count frames with the beam at the center of the frame, rotated by theta
+        """
+        (baseline, maximum, noise) = self.levels[dtype]
+        (y, x) = np.mgrid[0:self.shape[0], 0:self.shape[1]].astype(np.float64)
+        (x0, y0) = (self.shape[1] / 2, self.shape[0] / 2)
+        # Coordinates along the principal axes
+        xr = (x - x0) * np.cos(theta) + (y - y0) * np.sin(theta)
+        yr = -(x - x0) * np.sin(theta) + (y - y0) * np.cos(theta)
+        beam = analyzer.gf.gaussian_2D(xr, yr, baseline, maximum, 0.0, 0.0, *self.sigma)
+        rng = np.random.default_rng(0)
+        dtype = np.dtype(dtype)
+        for i in range(count):
+            img = beam + noise * rng.standard_normal(self.shape)
+            if dtype.kind == 'f':
+                yield img.astype(dtype)
+            else:
+                yield np.clip(np.rint(img), 0, np.iinfo(dtype).max).astype(dtype)
+
+    def check_estimator(self, fit_roi, dtype, theta):
+        analyzer = BeamAnalyzer(engine='moments', fit_roi=fit_roi)
+        results = []
+        for img in self.frames(analyzer, dtype, theta):
+            (cx, cy, ellipse) = analyzer.compute_centroid(img)
+            results.append((ellipse[2] / (2 * np.sqrt(2)), ellipse[3] / (2 * np.sqrt(2)), ellipse[4]))
+        (sigma_x, sigma_y, angle) = np.mean(results, axis=0)
+        msg = "{0}, theta = {1:.0f} deg, ROI = {2!s}".format(dtype, np.degrees(theta), fit_roi)
+        self.assertLess(abs(sigma_x / self.sigma[0] - 1), 0.01, msg)
+        self.assertLess(abs(sigma_y / self.sigma[1] - 1), 0.01, msg)
+        self.assertLess(abs(angle - np.degrees(theta)), 0.25, msg)
+
+    def test_moments(self):
+        for fit_roi in (True, False):
+            for dtype in ('uint8', 'uint16', 'float32'):
+                for theta in (0.0, np.radians(30)):
+                    self.check_estimator(fit_roi, dtype, theta)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:02:51 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import time
+
+from PyQt5 import QtCore
+
+
+class EventDispatcher(QtCore.QObject):
+    """ Latest value handoff of Tango events from the callback threads to the GUI thread
+
+    push() can be used directly as Tango event callback. Each event is stored in a slot keyed by the full
+    attribute name, replacing any event of the same attribute not yet delivered, and a single wake-up is
+    posted to the thread owning the dispatcher. The wake-up delivers the newest event of each attribute
+    to the callback (as callback(event), or callback(event, push_time) if with_time is True, where
+    push_time is the monotonic time of the push) and through the dispatched signal.
+
+    However fast events arrive, at most one event per attribute and one wake-up are waiting in the Qt
+    event loop. Replaced events are counted in coalesced.
+
+    The handoff does not take locks. It relies on single dict operations being atomic (as they are in
+    CPython) and on the ordering of the operations: the wake-up flag is reset before the slots are
+    drained, so an event pushed during a drain is either delivered by that drain or posts a new wake-up.
+    """
+
+    dispatched = QtCore.pyqtSignal(object, float)
+
+    # Internal signal used to wake up the owner thread
+    __wakeup = QtCore.pyqtSignal()
+
+    def __init__(self, callback=None, parent=None, with_time=False):
+        # Parent constructor
+        QtCore.QObject.__init__(self, parent)
+
+        self.callback = callback
+        self.with_time = with_time
+        self.slots = {}
+        self.scheduled = False
+        self.pushed = 0
+        self.coalesced = 0
+        self.__wakeup.connect(self.drain, QtCore.Qt.QueuedConnection)
+
+    def push(self, event):
+        """ Store event as the latest value of its attribute and wake up the owner thread if needed
+        """
+        key = event.attr_name.lower() if event.attr_name else ""
+        if key in self.slots:
+            # Not exact under concurrent drains, it is just a statistic
+            self.coalesced += 1
+        self.slots[key] = (event, time.monotonic())
+        self.pushed += 1
+        if not self.scheduled:
+            self.scheduled = True
+            self.__wakeup.emit()
+
+    def pending(self):
+        """ Number of events waiting for delivery
+        """
+        return len(self.slots)
+
+    def discard(self):
+        """ Drop the events not yet delivered
+        """
+        for key in list(self.slots.keys()):
+            self.slots.pop(key, None)
+
+    @QtCore.pyqtSlot()
+    def drain(self):
+        """ Deliver the latest event of each attribute
+        """
+        self.scheduled = False
+        for key in list(self.slots.keys()):
+            item = self.slots.pop(key, None)
+            if item is None:
+                continue
+            (event, push_time) = item
+            if self.callback is not None:
+                if self.with_time:
+                    self.callback(event, push_time)
+                else:
+                    self.callback(event)
+            self.dispatched.emit(event, push_time)
@@ -11,6 +11,7 @@ from PyQt5 import QtWidgets
 from PyQt5 import QtGui
 
 from .PyQTango_rc import qInitResources
+from .EventDispatcher import EventDispatcher
 qInitResources()
 
 import PyTango as PT
@@ -18,9 +19,6 @@ import PyTango as PT
 
 class QAttribute(QtWidgets.QWidget):
 
-    # Internal Tango change event signal
-    __tango_event = QtCore.pyqtSignal(PT.EventData)
-
     # Dev-state style
     __devstate_style_common = "border-radius:3px;border: 1px solid black;"
     __devstate_style = {PT.DevState.ALARM: "background-color: rgb(255, 140, 0);color: rgb(0, 0, 0);",        # Black on orange
@@ -46,8 +44,8 @@ class QAttribute(QtWidgets.QWidget):
         self.attr = None
         self.evid = None
 
-        # Connect event to slot
-        self.__tango_event.connect(self.event_handler)
+        # Deliver events to slot
+        self.dispatcher = EventDispatcher(self.event_handler, self)
 
         # Create layout
         self.layout = QtWidgets.QHBoxLayout(self)
@@ -295,7 +293,7 @@ class QAttribute(QtWidgets.QWidget):
 
     def event_callback(self, event):
         # Tango event callback
-        self.__tango_event.emit(event)
+        self.dispatcher.push(event)
 
     @QtCore.pyqtSlot(PT.EventData)
     def event_handler(self, ev):
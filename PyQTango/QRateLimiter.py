@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 12 10:21:47 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import threading
+
+from PyQt5 import QtCore
+
+
+class QRateLimiter(QtCore.QObject):
+    """ Coalescing rate limiter for display updates
+
+    Values are pushed with a key and only the latest value for each key is kept. The first value after an
+    idle period is delivered immediately, then pending values are delivered on a timer tick at most fps
+    times per second. The timer stops when there is nothing left to deliver, so the last value of a burst
+    is never lost.
+
+    Values are delivered through the flushed signal and, if given, the callback. push() can be called from
+    any thread, delivery always happens in the thread owning the limiter. Values replaced before being
+    delivered are counted in coalesced.
+    """
+
+    flushed = QtCore.pyqtSignal(str, object)
+
+    # Internal signal used to start the timer from other threads
+    __wakeup = QtCore.pyqtSignal()
+
+    def __init__(self, fps=2.0, callback=None, parent=None):
+        # Parent constructor
+        QtCore.QObject.__init__(self, parent)
+
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.coalesced = 0
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.flush)
+        self.__wakeup.connect(self.wakeup, QtCore.Qt.QueuedConnection)
+
+        self.fps = 0
+        self.set_fps(fps)
+
+    def set_fps(self, fps):
+        """ Set the maximum delivery rate. A rate of zero disables the limiter
+        """
+        self.fps = max(float(fps), 0.0)
+        if self.fps > 0:
+            self.timer.setInterval(int(round(1000.0 / self.fps)))
+        elif self.timer.isActive():
+            self.timer.stop()
+            self.flush()
+
+    def push(self, key, value):
+        """ Store the latest value for key
+        """
+        with self.lock:
+            if key in self.pending:
+                self.coalesced += 1
+            self.pending[key] = value
+        if QtCore.QThread.currentThread() is self.thread():
+            self.wakeup()
+        else:
+            self.__wakeup.emit()
+
+    def discard(self, key=None):
+        """ Drop the pending value of key, or all the pending values
+        """
+        with self.lock:
+            if key is None:
+                self.pending.clear()
+            else:
+                self.pending.pop(key, None)
+
+    @QtCore.pyqtSlot()
+    def wakeup(self):
+        if self.timer.isActive():
+            # Delivered on the next tick
+            return
+        self.flush()
+        if self.fps > 0:
+            self.timer.start()
+
+    @QtCore.pyqtSlot()
+    def flush(self):
+        """ Deliver all the pending values
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+
+        if len(pending) == 0:
+            # Nothing to deliver, go idle
+            self.timer.stop()
+            return
+
+        for (key, value) in pending.items():
+            if self.callback is not None:
+                self.callback(key, value)
+            self.flushed.emit(key, value)
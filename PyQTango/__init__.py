@@ -12,6 +12,12 @@ from .QCommandExecuter import QCommandExecuter
 # QDigitDial
 from .QDigitDial import QDigitDial
 
+# Rate limiter for display updates
+from .QRateLimiter import QRateLimiter
+
+# Latest value handoff of Tango events to the GUI thread
+from .EventDispatcher import EventDispatcher
+
 # Note types
 from .CommonTree import TreeItem, DeviceItem, AttributeItem, ServerItem
 
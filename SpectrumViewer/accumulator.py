@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:24:05 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import threading
+import numpy as np
+
+
+class SpectrumAccumulator(object):
+    """ Client side averaging of spectra
+
+    Modes:
+        none    no averaging, the last spectrum is returned
+        mean    running mean of all the spectra since the last reset
+        ema     exponential moving average with a time constant of n spectra (alpha = 2 / (n + 1))
+        nshot   mean of blocks of n spectra. The last complete block is returned, or the partial one
+                until the first block is complete
+
+    The mean and the variance are updated in place in preallocated float64 arrays with the Welford
+    algorithm (or its exponentially weighted version), so no memory is allocated per spectrum. add() is
+    meant to be called from the Tango callback thread for every spectrum, result() from the GUI thread at
+    the display rate.
+    """
+
+    modes = ('none', 'mean', 'ema', 'nshot')
+
+    def __init__(self, mode='none', n=10):
+        self.lock = threading.Lock()
+        self.mode = mode
+        self.n = max(int(n), 1)
+        self.size = 0
+        self.alloc(0)
+
+    def alloc(self, size):
+        """ Allocate the accumulators for spectra of size points
+        """
+        self.size = size
+        self.last = np.zeros(size)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.delta = np.zeros(size)
+        self.scratch = np.zeros(size)
+        self.block_mean = np.zeros(size)
+        self.block_m2 = np.zeros(size)
+        self.count = 0
+        self.total = 0
+        self.blocks = 0
+
+    def configure(self, mode=None, n=None):
+        """ Change mode and/or number of spectra and restart the accumulation
+        """
+        with self.lock:
+            if mode is not None:
+                if mode not in self.modes:
+                    raise ValueError("Unknown averaging mode '{0}'".format(mode))
+                self.mode = mode
+            if n is not None:
+                self.n = max(int(n), 1)
+            self.count = 0
+            self.total = 0
+            self.blocks = 0
+
+    def reset(self):
+        """ Restart the accumulation
+        """
+        with self.lock:
+            self.count = 0
+            self.total = 0
+            self.blocks = 0
+
+    def add(self, sp):
+        """ Add a spectrum to the accumulators
+        """
+        with self.lock:
+            if self.size != len(sp):
+                self.alloc(len(sp))
+            self.last[:] = sp
+            self.total += 1
+            if self.mode == 'none':
+                return
+
+            if self.mode == 'ema' and self.count > 0:
+                # West's exponentially weighted mean and variance
+                alpha = 2.0 / (self.n + 1)
+                np.subtract(self.last, self.mean, out=self.delta)
+                np.multiply(self.delta, alpha, out=self.scratch)
+                self.mean += self.scratch
+                self.scratch *= self.delta
+                self.m2 += self.scratch
+                self.m2 *= (1.0 - alpha)
+                self.count = min(self.count + 1, self.n)
+                return
+
+            if self.count == 0:
+                self.mean[:] = self.last
+                self.m2[:] = 0
+                self.count = 1
+            else:
+                # Welford update
+                self.count += 1
+                np.subtract(self.last, self.mean, out=self.delta)
+                np.divide(self.delta, self.count, out=self.scratch)
+                self.mean += self.scratch
+                np.subtract(self.last, self.mean, out=self.scratch)
+                self.scratch *= self.delta
+                self.m2 += self.scratch
+
+            if self.mode == 'nshot' and self.count >= self.n:
+                # Block complete
+                self.block_mean[:] = self.mean
+                self.block_m2[:] = self.m2
+                self.blocks += 1
+                self.count = 0
+
+    def result(self):
+        """ Return (mean, std, count) of the current result. std is None in mode none or with less than two
+            spectra. Arrays are copies
+        """
+        with self.lock:
+            if self.size == 0:
+                return (None, None, 0)
+            if self.mode == 'none' or (self.count == 0 and self.blocks == 0):
+                return (self.last.copy(), None, min(self.total, 1))
+
+            if self.mode == 'nshot' and self.blocks > 0:
+                (mean, m2, count) = (self.block_mean, self.block_m2, self.n)
+            else:
+                (mean, m2, count) = (self.mean, self.m2, self.count)
+
+            if self.mode == 'ema':
+                # m2 is already the weighted variance
+                std = np.sqrt(m2) if count > 1 else None
+            else:
+                std = np.sqrt(m2 / (count - 1)) if count > 1 else None
+            return (mean.copy(), std, count)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:10:26 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import re
+import sys
+import datetime
+import argparse
+import numpy as np
+
+
+def format_rows(data, fmt, delimiter=","):
+    """ Format a 2D array as text lines in one pass. fmt is a printf style format for each column (a
+        single format is used for all the columns)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    if isinstance(fmt, str):
+        fmt = [fmt] * data.shape[1]
+    line = delimiter.join(fmt) + "\n"
+    return (line * data.shape[0]) % tuple(data.ravel().tolist())
+
+
+def write_spectrum(f, wl, sp, delimiter=","):
+    """ Write a spectrum as two columns (wavelength, counts) to an open text file
+    """
+    f.write(format_rows(np.column_stack((wl, sp)), ("%.2f", "%.3f"), delimiter))
+
+
+def export_csv(filename, wl, sp):
+    with open(filename, 'wt') as f:
+        write_spectrum(f, wl, sp, ",")
+
+
+def export_dat(filename, wl, sp):
+    with open(filename, 'wt') as f:
+        write_spectrum(f, wl, sp, "\t")
+
+
+def export_ooibase(filename, wl, sp, settings):
+    """ Export in the OOIBase32 format. settings must have the keys: serial, model, integration_time,
+        averages, boxcar, dark_correction
+    """
+    with open(filename, 'wt') as f:
+        f.write("OOIBase32 Version 2.0.6.3 Data File\n")
+        f.write("++++++++++++++++++++++++++++++++++++\n")
+        now = datetime.datetime.now()
+        f.write("Date: {0}\n".format(now.strftime("%m-%d-%Y, %H:%M:%S")))
+        f.write("User: Valued Ocean Optics Customer\n")
+        f.write("Spectrometer Serial Number: {0}\n".format(settings['serial']))
+        f.write("Spectrometer Channel: Master\n")
+        f.write("Integration Time (msec): {0:d}\n".format(int(settings['integration_time'])))
+        f.write("Spectra Averaged: {0:d}\n".format(int(settings['averages'])))
+        f.write("Boxcar Smoothing: {0:d}\n".format(int(settings['boxcar'])))
+        f.write("Correct for Electrical Dark: {0}\n".format("Enabled" if settings['dark_correction'] else "Disabled"))
+        f.write("Time Normalized: Disabled\n")
+        f.write("Dual-beam Reference: Disabled\n")
+        f.write("Reference Channel: Master\n")
+        f.write("Temperature: Not acquired\n")
+        f.write("Spectrometer Type: {0}\n".format(settings['model']))
+        f.write("ADC Type: {0}\n".format(settings['model']))
+        f.write("Number of Pixels in File: {0:d}\n".format(len(wl)))
+        f.write("Graph Title:\n")
+        f.write(">>>>>Begin Spectral Data<<<<<\n")
+        write_spectrum(f, wl, sp, "\t")
+        f.write(">>>>>End Spectral Data<<<<<\n")
+
+
+def write_spectra_header(f, wl, delimiter=","):
+    f.write(delimiter.join(["timestamp"] + ["{0:.2f}".format(w) for w in wl]) + "\n")
+
+
+def write_spectra(f, timestamps, spectra, delimiter=","):
+    """ Write a block of spectra, one per line with the timestamp in the first column
+    """
+    spectra = np.asarray(spectra, dtype=np.float64)
+    data = np.empty((spectra.shape[0], spectra.shape[1] + 1))
+    data[:, 0] = timestamps
+    data[:, 1:] = spectra
+    f.write(format_rows(data, ["%.6f"] + ["%.3f"] * spectra.shape[1], delimiter))
+
+
+def export_spectra(filename, wl, spectra, timestamps=None, delimiter=",", block=256):
+    """ Export many spectra to one text file. The first line has the wavelengths, then each line is a
+        spectrum with its timestamp (or NaN) in the first column. spectra can be any array-like of shape
+        (N, P) supporting slicing, like an h5py dataset, and is read in blocks of spectra
+    """
+    n = len(spectra)
+    with open(filename, 'wt') as f:
+        write_spectra_header(f, wl, delimiter)
+        for i in range(0, n, block):
+            j = min(i + block, n)
+            t = timestamps[i:j] if timestamps is not None else np.full(j - i, np.nan)
+            write_spectra(f, t, spectra[i:j], delimiter)
+    return n
+
+
+def export_recording(h5name, filename, delimiter=",", block=256):
+    """ Export all the spectra of an HDF5 recording to one text file
+    """
+    import h5py as h5
+    with h5.File(h5name, "r") as f:
+        return export_spectra(filename, f['wavelength'][()], f['spectra'], f['timestamps'], delimiter, block)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the spectra recorded by SpectrumViewer to text")
+    parser.add_argument("recording", help="HDF5 recording")
+    parser.add_argument("-o", "--output", help="Output file (default: recording name with .csv or .dat extension)")
+    parser.add_argument("--dat", action="store_true", help="Tab separated output")
+    args = parser.parse_args()
+
+    ext = ".dat" if args.dat else ".csv"
+    output = args.output if args.output else re.sub(r"\.h5$", "", args.recording) + ext
+    try:
+        n = export_recording(args.recording, output, "\t" if args.dat else ",")
+        print("Exported {0:d} spectra to {1}".format(n, output))
+    except Exception as e:
+        print("[E] Failed to export '{0}' ({1!s})".format(args.recording, e))
+        sys.exit(1)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:47:15 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import time
+import datetime
+import threading
+import queue
+import collections
+import numpy as np
+import h5py as h5
+
+
+class SpectrumRecorder(threading.Thread):
+    """ Stream spectra to an HDF5 file from a background thread
+
+    The file contains the datasets:
+        wavelength          (P,) wavelength axis
+        spectra             (N, P) chunked spectra
+        timestamps          (N,) event timestamps in seconds since the epoch
+        settings/<name>     (N,) value of each acquisition setting when the spectrum was received,
+                            NaN until the first event of the setting
+
+    Spectra are passed through a bounded queue. When the writer cannot keep up, new spectra are dropped
+    instead of accumulating in memory. The writer takes all the queued spectra at once and appends them
+    with a single resize of each dataset. Settings changes go through a separate unbounded deque, tagged
+    with the sequence number of the next spectrum, so they are never lost and never block the caller.
+    record_spectrum() and record_setting() must be called from the same thread.
+    """
+
+    def __init__(self, filename, wavelength, settings=(), queue_size=4096, block=256, compression='lzf', metadata=None):
+        """ Open the file and start the writer thread
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.filename = filename
+        self.block = block
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.recorded = 0
+        self.dropped = 0
+        self.settings = dict.fromkeys(settings, np.nan)
+        self.names = {n.lower(): n for n in settings}
+        self.changes = collections.deque()
+        self.sequence = 0
+
+        wavelength = np.asarray(wavelength, dtype=np.float64)
+        size = len(wavelength)
+        rows = max(1, min(block, (1 << 20) // (8 * max(size, 1))))
+        self.file = h5.File(filename, "w")
+        now = datetime.datetime.now()
+        self.file.attrs.create("Date", now.strftime("%Y-%m-%d, %H:%M:%S"))
+        self.file.attrs.create("Timestamp", now.timestamp())
+        if metadata is not None:
+            for k, v in metadata.items():
+                self.file.attrs.create(k, v)
+        self.file.create_dataset("wavelength", data=wavelength)
+        self.file.create_dataset("spectra", shape=(0, size), maxshape=(None, size), dtype=np.float64, chunks=(rows, size), compression=compression)
+        self.file.create_dataset("timestamps", shape=(0, ), maxshape=(None, ), dtype=np.float64, chunks=(4096, ))
+        g = self.file.create_group("settings")
+        for name in self.settings:
+            g.create_dataset(name, shape=(0, ), maxshape=(None, ), dtype=np.float64, chunks=(4096, ), fillvalue=np.nan)
+        self.start()
+
+    def record_spectrum(self, timestamp, sp):
+        """ Queue a spectrum for writing. Return False if the spectrum was dropped
+        """
+        seq = self.sequence
+        self.sequence += 1
+        try:
+            self.queue.put_nowait((seq, timestamp, sp))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def record_setting(self, name, value):
+        """ Queue the new value of an acquisition setting (name is case insensitive). It applies to the
+            following spectra
+        """
+        name = self.names.get(name.lower())
+        if name is None:
+            return
+        self.changes.append((self.sequence, name, value))
+
+    def stop(self):
+        """ Write the pending spectra, close the file and terminate the thread
+        """
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        """ Writer loop
+        """
+        last_flush = time.time()
+        done = False
+        try:
+            while not done:
+                try:
+                    items = [self.queue.get(timeout=1.0)]
+                except queue.Empty:
+                    items = []
+                # Take everything already queued
+                while len(items) and items[-1] is not None:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if len(items) and items[-1] is None:
+                    items.pop()
+                    done = True
+
+                spectra = []
+                for (seq, timestamp, sp) in items:
+                    # Apply the settings changed before this spectrum
+                    while len(self.changes) and self.changes[0][0] <= seq:
+                        self.update_setting(*self.changes.popleft()[1:])
+                    spectra.append((timestamp, sp, dict(self.settings)))
+                    if len(spectra) >= self.block:
+                        self.write_spectra(spectra)
+                        spectra = []
+                if len(spectra):
+                    self.write_spectra(spectra)
+
+                if time.time() - last_flush > 1.0:
+                    self.file.flush()
+                    last_flush = time.time()
+        finally:
+            self.file.close()
+
+    def update_setting(self, name, value):
+        try:
+            self.settings[name] = float(value)
+        except (TypeError, ValueError) as e:
+            print("[E] Invalid value for setting '{0}' ({1!s})".format(name, e))
+
+    def write_spectra(self, spectra):
+        """ Append a block of spectra with a single resize of each dataset
+        """
+        ds = self.file['spectra']
+        n = ds.shape[0]
+        m = len(spectra)
+        try:
+            block = np.array([s[1] for s in spectra], dtype=np.float64)
+            if block.ndim != 2 or block.shape[1] != ds.shape[1]:
+                raise ValueError("spectrum size does not match the wavelength axis ({0:d} points)".format(ds.shape[1]))
+            ds.resize(n + m, axis=0)
+            ds[n:n + m] = block
+            self.file['timestamps'].resize(n + m, axis=0)
+            self.file['timestamps'][n:n + m] = [s[0] for s in spectra]
+            g = self.file['settings']
+            for name in self.settings:
+                g[name].resize(n + m, axis=0)
+                g[name][n:n + m] = [s[2][name] for s in spectra]
+            self.recorded += m
+        except Exception as e:
+            self.dropped += m
+            print("[E] Failed to record {0:d} spectra ({1!s})".format(m, e))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:06:44 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import numpy as np
+
+# Speed of light in nm/fs
+C_NM_FS = 299.792458
+
+
+def spectral_metrics(wl, sp):
+    """ Compute the metrics of a spectrum (wavelength in nm). Return a dictionary with:
+        peak            wavelength of the maximum
+        left, right     half maximum crossings, linearly interpolated between pixels
+        fwhm            full width at half maximum
+        truncated       True if the spectrum does not fall below half maximum on one side of the peak. The
+                        crossing is then set at the end of the spectrum and the FWHM is a lower bound
+        centroid        intensity weighted mean wavelength
+        rms             RMS bandwidth (intensity weighted standard deviation of the wavelength)
+        peaks           number of separate regions above half maximum
+        tl_duration     transform limited duration in fs of a gaussian pulse, 0.441 * centroid^2 / (c * fwhm)
+
+    The minimum of the spectrum is taken as the baseline.
+    """
+    wl = np.asarray(wl, dtype=np.float64)
+    sp = np.asarray(sp, dtype=np.float64)
+    out = dict.fromkeys(('peak', 'left', 'right', 'fwhm', 'centroid', 'rms', 'tl_duration'), np.nan)
+    out['truncated'] = False
+    out['peaks'] = 0
+    if sp.size < 2 or sp.size != wl.size:
+        return out
+
+    p = int(np.argmax(sp))
+    base = sp.min()
+    amp = sp[p] - base
+    out['peak'] = wl[p]
+    if not amp > 0:
+        return out
+
+    # Half maximum crossings
+    half = base + amp / 2
+    above = sp >= half
+    below_left = np.flatnonzero(~above[0:p])
+    below_right = np.flatnonzero(~above[p:])
+    if len(below_left):
+        i = below_left[-1]
+        out['left'] = wl[i] + (half - sp[i]) * (wl[i + 1] - wl[i]) / (sp[i + 1] - sp[i])
+    else:
+        out['left'] = wl[0]
+        out['truncated'] = True
+    if len(below_right):
+        i = below_right[0] + p
+        out['right'] = wl[i - 1] + (half - sp[i - 1]) * (wl[i] - wl[i - 1]) / (sp[i] - sp[i - 1])
+    else:
+        out['right'] = wl[-1]
+        out['truncated'] = True
+    out['fwhm'] = abs(out['right'] - out['left'])
+
+    # Separate regions above half maximum
+    out['peaks'] = int(above[0]) + int(np.count_nonzero(above[1:] & ~above[0:-1]))
+
+    # Moments weighted by intensity and pixel width (wavelength may not be uniformly spaced)
+    w = (sp - base) * np.abs(np.gradient(wl))
+    norm = w.sum()
+    centroid = np.dot(w, wl) / norm
+    out['centroid'] = centroid
+    out['rms'] = np.sqrt(max(np.dot(w, (wl - centroid) ** 2) / norm, 0.0))
+    if out['fwhm'] > 0:
+        out['tl_duration'] = 0.441 * centroid ** 2 / (C_NM_FS * out['fwhm'])
+
+    return out
+
+
+class SpectralMetrics(object):
+    """ Cache of the metrics of the last spectrum
+
+    compute() returns the cached result while called with the same wavelength and spectrum arrays, so all
+    the readouts of a displayed spectrum share one computation. Arrays must not be modified in place after
+    being passed to compute().
+    """
+
+    def __init__(self):
+        self.wl = None
+        self.sp = None
+        self.result = None
+
+    def compute(self, wl, sp):
+        if self.result is None or wl is not self.wl or sp is not self.sp:
+            self.result = spectral_metrics(wl, sp)
+            self.wl = wl
+            self.sp = sp
+        return self.result
+
+    def latest(self):
+        """ Metrics of the last spectrum, or None
+        """
+        return self.result
+
+    def clear(self):
+        self.wl = None
+        self.sp = None
+        self.result = None
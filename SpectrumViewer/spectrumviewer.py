@@ -18,10 +18,15 @@ from PyQt5.QtWidgets import QFileDialog
 
 from Ui_spectrumviewer import Ui_SpectrumViewer
 from Ui_spectrumviewer_setscale import Ui_SpectrumViewer_SetScale
+from PyQTango import QRateLimiter, EventDispatcher
+from accumulator import SpectrumAccumulator
+from spectralmetrics import SpectralMetrics
+from recorder import SpectrumRecorder
+from waterfall import WaterfallView
+import export
 
 import re
 import h5py as h5
-import time
 import datetime
 import numpy as np
 import PyTango as PT
@@ -74,8 +79,8 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
 
     """ Spectrometer GUI main window. """
 
-    # Tango change event signal
-    tango_event = QtCore.pyqtSignal(PT.EventData)
+    # Acquisition settings stored with each recorded spectrum
+    recorded_settings = ('IntegrationTime', 'ScansToAverage', 'BoxcarWidth', 'enableBackgroundSubtraction', 'enableElectricalDarkCorrection', 'enableNLCorrection', 'EnableTEC', 'TECTemperature')
 
     def __init__(self, parent=None):
         # Parent constructors
@@ -161,17 +166,93 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
         self.spec_delta.released.connect(self.on_spec_delta_released)
         self.spec_toolbar.addWidget(self.spec_delta)
 
+        # Add refresh rate selector
+        self.spec_limiter = QRateLimiter(5.0, self.update_spectrum, self)
+        self.spec_fps = QtWidgets.QSpinBox()
+        self.spec_fps.setRange(0, 50)
+        self.spec_fps.setSuffix(" fps")
+        self.spec_fps.setSpecialValueText("Max fps")
+        self.spec_fps.setValue(int(self.spec_limiter.fps))
+        self.spec_fps.setObjectName("spec_fps")
+        self.spec_fps.setToolTip("Maximum refresh rate of the spectrum")
+        self.spec_fps.valueChanged.connect(self.spec_limiter.set_fps)
+        self.spec_toolbar.addWidget(self.spec_fps)
+        self.spec_toolbar.addSeparator()
+
+        # Add client side averaging controls
+        self.accumulator = SpectrumAccumulator()
+        self.spec_acc_mode = QtWidgets.QComboBox()
+        self.spec_acc_mode.addItems(["No average", "Running mean", "Moving average", "N-shot"])
+        self.spec_acc_mode.setObjectName("spec_acc_mode")
+        self.spec_acc_mode.setToolTip("Client side averaging of the spectra")
+        self.spec_acc_mode.currentIndexChanged.connect(self.on_spec_acc_changed)
+        self.spec_toolbar.addWidget(self.spec_acc_mode)
+        self.spec_acc_n = QtWidgets.QSpinBox()
+        self.spec_acc_n.setRange(2, 100000)
+        self.spec_acc_n.setValue(self.accumulator.n)
+        self.spec_acc_n.setEnabled(False)
+        self.spec_acc_n.setSuffix(" spectra")
+        self.spec_acc_n.setObjectName("spec_acc_n")
+        self.spec_acc_n.setToolTip("Time constant of the moving average or number of spectra per N-shot block")
+        self.spec_acc_n.valueChanged.connect(self.on_spec_acc_changed)
+        self.spec_toolbar.addWidget(self.spec_acc_n)
+        self.spec_acc_reset = QtWidgets.QToolButton()
+        self.spec_acc_reset.setText("Reset")
+        self.spec_acc_reset.setObjectName("spec_acc_reset")
+        self.spec_acc_reset.setToolTip("Restart averaging")
+        self.spec_acc_reset.released.connect(self.accumulator.reset)
+        self.spec_toolbar.addWidget(self.spec_acc_reset)
+        self.spec_acc_count = QtWidgets.QLabel()
+        self.spec_toolbar.addWidget(self.spec_acc_count)
+        self.spec_toolbar.addSeparator()
+
+        # Add record button
+        self.recorder = None
+        self.spec_record = QtWidgets.QToolButton()
+        self.spec_record.setText("Record")
+        self.spec_record.setCheckable(True)
+        self.spec_record.setObjectName("spec_record")
+        self.spec_record.setToolTip("Record all spectra to HDF5")
+        self.spec_record.released.connect(self.on_spec_record_released)
+        self.spec_toolbar.addWidget(self.spec_record)
+        self.spec_rec_status = QtWidgets.QLabel()
+        self.spec_toolbar.addWidget(self.spec_rec_status)
+        self.rec_timer = QtCore.QTimer(self)
+        self.rec_timer.timeout.connect(self.update_record_status)
+        self.spec_toolbar.addSeparator()
+
+        # Add waterfall controls
+        self.waterfall = WaterfallView(200, self)
+        self.waterfall.hide()
+        self.spec_waterfall = QtWidgets.QToolButton()
+        self.spec_waterfall.setText("Waterfall")
+        self.spec_waterfall.setCheckable(True)
+        self.spec_waterfall.setObjectName("spec_waterfall")
+        self.spec_waterfall.setToolTip("Show the history of the spectra")
+        self.spec_waterfall.released.connect(self.on_spec_waterfall_released)
+        self.spec_toolbar.addWidget(self.spec_waterfall)
+        self.spec_wf_rows = QtWidgets.QSpinBox()
+        self.spec_wf_rows.setRange(10, 10000)
+        self.spec_wf_rows.setValue(self.waterfall.buffer.rows)
+        self.spec_wf_rows.setSuffix(" spectra")
+        self.spec_wf_rows.setObjectName("spec_wf_rows")
+        self.spec_wf_rows.setToolTip("Number of spectra in the waterfall")
+        self.spec_wf_rows.valueChanged.connect(self.waterfall.buffer.resize)
+        self.spec_toolbar.addWidget(self.spec_wf_rows)
+
         # Layout
         vbox = QtWidgets.QVBoxLayout()
         vbox.addWidget(self.spec_canvas)
+        vbox.addWidget(self.waterfall)
         vbox.addWidget(self.spec_toolbar)
         self.spectrum_area.setLayout(vbox)
         self.spectrum_plot = None
-        self.last_spectrum_update = 0
+        self.spectrum_band = None
         self.wl = None
+        self.metrics = SpectralMetrics()
 
-        # Connect event to slot
-        self.tango_event.connect(self.event_handler)
+        # Deliver events to slot
+        self.dispatcher = EventDispatcher(self.event_handler, self)
 
         # Populate spectrometer selector
         spec_list = self.get_spec_list()
@@ -235,6 +316,9 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
             return []
 
     def close_spectrometer(self):
+        # Stop recording
+        self.stop_recording()
+
         # Close the old one
         if self.dev and len(self.ev_id) > 0:
             for ev in self.ev_id:
@@ -251,8 +335,13 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
 
         self.dev = None
         self.ev_id = []
+        self.dispatcher.discard()
+        self.spec_limiter.discard()
         self.spec_fig.clear()
         self.spectrum_plot = None
+        self.spectrum_band = None
+        self.metrics.clear()
+        self.waterfall.clear()
 
     def open_spectrometer(self, device):
         # Create new DeviceProxy
@@ -261,6 +350,7 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
         self.dev.ping()
         self.wl = self.dev.Wavelength
         self.counter = 0
+        self.accumulator.reset()
 
         # Update model, serial and firmware version
         self.spec_model.setText(self.dev.Model)
@@ -269,6 +359,8 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
 
         # List of attributes to subscribe for change events
         attr = ['enableBackgroundSubtraction', 'enableElectricalDarkCorrection', 'enableNLCorrection', 'Spectrum', 'State']
+        # Settings displayed by QAttributes, needed also by the recorder
+        attr += ['IntegrationTime', 'ScansToAverage', 'BoxcarWidth']
 
         # Check if TEC is available
         al = self.dev.attribute_list_query()
@@ -329,7 +421,17 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
     def event_callback(self, event):
         """ Event callback
         """
-        self.tango_event.emit(event)
+        # Every spectrum is accumulated and recorded here, as the dispatcher keeps only the latest event
+        if not event.err and event.attr_value is not None:
+            recorder = self.recorder
+            if event.attr_value.name.lower() == 'spectrum':
+                self.accumulator.add(event.attr_value.value)
+                self.waterfall.buffer.add(event.attr_value.time.totime(), event.attr_value.value)
+                if recorder is not None:
+                    recorder.record_spectrum(event.attr_value.time.totime(), event.attr_value.value)
+            elif recorder is not None:
+                recorder.record_setting(event.attr_value.name, event.attr_value.value)
+        self.dispatcher.push(event)
 
     @QtCore.pyqtSlot(PT.EventData)
     def event_handler(self, ev):
@@ -363,46 +465,16 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
             elif attr_name == 'tectemperature':
                 self.spec_tectemp.setText("{0:.1f} °C".format(ev.attr_value.value))
 
+            elif attr_name in ('integrationtime', 'scanstoaverage', 'boxcarwidth'):
+                # Shown by the QAttributes
+                pass
+
             elif attr_name == 'spectrum':
                 print("Got spectrum event {0:d} from {1!s}".format(self.counter, ev.device.name()))
                 self.counter += 1
 
-                #refresh = int(self.refresh_rate.itemText(self.refresh_rate.currentIndex()))
-                if (time.time() - self.last_spectrum_update) > 0.2:
-                    self.last_spectrum_update = time.time()
-
-                    sp = ev.attr_value.value
-                    fwhm = self.getFWHM(self.wl, sp)
-                    self.spec_bw.setText("{0:.1f}".format(fwhm[1] - fwhm[0]))
-
-                    if self.spectrum_plot is None:
-                        self.spectrum_plot = self.spec_fig.add_subplot(111)
-                        self.spectrum_plot.plot(self.wl, sp)
-                        # FWHM position
-                        yl = self.spectrum_plot.get_ylim()
-                        self.spectrum_plot.plot([fwhm[0], fwhm[0]], yl, 'r')
-                        self.spectrum_plot.plot([fwhm[1], fwhm[1]], yl, 'r')
-                        ## NOTE: workaround for tight_layout not working after first spectrum
-                        self.got_first = True
-                        ##=============================
-
-                    else:
-                        self.spectrum_plot.lines[0].set_data(self.wl, sp)
-                        if self.spec_autoscale.isChecked():
-                            #self.spectrum_plot.set_xlim([min(self.wl), max(self.wl)])
-                            self.spectrum_plot.set_ylim([min(sp), max(sp)*1.1])
-                        # FWHM position
-                        yl = self.spectrum_plot.get_ylim()
-                        self.spectrum_plot.lines[1].set_data([fwhm[0], fwhm[0]], yl)
-                        self.spectrum_plot.lines[2].set_data([fwhm[1], fwhm[1]], yl)
-                        ## NOTE: workaround for tight_layout not working after first spectrum
-                        if self.got_first:
-                            self.spec_fig.tight_layout()
-                            self.got_first = False
-                        ##=============================
-
-                    # Redraw canvas
-                    self.spec_canvas.draw()
+                # Coalesce spectra to the display refresh rate
+                self.spec_limiter.push(attr_name, ev.attr_value.value)
 
             elif attr_name == 'state':
                 self.dev_state = ev.attr_value.value
@@ -423,6 +495,81 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
                 # Unexpected event
                 print("Got an unexpected event from attribute {:}".format(ev.attr_name))
 
+    def update_spectrum(self, attr_name, sp):
+        """ Update the spectrum plot
+        """
+        std = None
+        if self.accumulator.mode != 'none':
+            (mean, std, count) = self.accumulator.result()
+            if mean is not None:
+                sp = mean
+            self.spec_acc_count.setText(" {0:d} averaged".format(count))
+
+        m = self.metrics.compute(self.wl, sp)
+        fwhm = (m['left'], m['right'])
+        self.spec_bw.setText("{0}{1:.1f}".format(">" if m['truncated'] else "", m['fwhm']))
+        self.spec_bw.setToolTip("Centroid: {0:.1f} nm\nRMS bandwidth: {1:.2f} nm\nPeaks: {2:d}\nTransform limit: {3:.1f} fs".format(m['centroid'], m['rms'], m['peaks'], m['tl_duration']))
+
+        if self.spectrum_plot is None:
+            self.spectrum_plot = self.spec_fig.add_subplot(111)
+            self.spectrum_plot.plot(self.wl, sp)
+            # FWHM position
+            yl = self.spectrum_plot.get_ylim()
+            self.spectrum_plot.plot([fwhm[0], fwhm[0]], yl, 'r')
+            self.spectrum_plot.plot([fwhm[1], fwhm[1]], yl, 'r')
+            ## NOTE: workaround for tight_layout not working after first spectrum
+            self.got_first = True
+            ##=============================
+
+        else:
+            self.spectrum_plot.lines[0].set_data(self.wl, sp)
+            if self.spec_autoscale.isChecked():
+                #self.spectrum_plot.set_xlim([min(self.wl), max(self.wl)])
+                self.spectrum_plot.set_ylim([min(sp), max(sp)*1.1])
+            # FWHM position
+            yl = self.spectrum_plot.get_ylim()
+            self.spectrum_plot.lines[1].set_data([fwhm[0], fwhm[0]], yl)
+            self.spectrum_plot.lines[2].set_data([fwhm[1], fwhm[1]], yl)
+            ## NOTE: workaround for tight_layout not working after first spectrum
+            if self.got_first:
+                self.spec_fig.tight_layout()
+                self.got_first = False
+            ##=============================
+
+        # Mean +/- std band
+        self.update_band(sp, std)
+
+        # Redraw canvas
+        self.spec_canvas.draw()
+        self.waterfall.refresh(self.wl)
+
+    def update_band(self, sp, std):
+        """ Update the standard deviation band around the averaged spectrum
+        """
+        if std is None:
+            if self.spectrum_band is not None:
+                self.spectrum_band.set_visible(False)
+            return
+
+        verts = np.empty((2 * len(sp), 2))
+        verts[:, 0] = np.concatenate((self.wl, self.wl[::-1]))
+        verts[0:len(sp), 1] = sp + std
+        verts[len(sp):, 1] = (sp - std)[::-1]
+        if self.spectrum_band is None:
+            self.spectrum_band = self.spectrum_plot.fill(verts[:, 0], verts[:, 1], color=self.spectrum_plot.lines[0].get_color(), alpha=0.3, linewidth=0)[0]
+        else:
+            self.spectrum_band.set_xy(verts)
+            self.spectrum_band.set_visible(True)
+
+    @QtCore.pyqtSlot()
+    def on_spec_acc_changed(self):
+        """ Change averaging mode """
+        mode = self.accumulator.modes[self.spec_acc_mode.currentIndex()]
+        self.accumulator.configure(mode, self.spec_acc_n.value())
+        self.spec_acc_n.setEnabled(mode in ('ema', 'nshot'))
+        if mode == 'none':
+            self.spec_acc_count.setText("")
+
     def add_or_move_marker(self, event):
         if event.inaxes is not None and event.button == 1 and not event.dblclick:
             if not self.marker_on:
@@ -609,12 +756,14 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
         file_types.append('CSV file (*.csv)')
         file_types.append('Text file (*.dat)')
         file_types.append('OOIBASE file (*.Master.Scope)')
+        file_types.append('Spectra history CSV file (*.csv)')
         file_types.append('All files (*)')
         file_handlers = []
         file_handlers.append(self.save_h5_spectrum)
         file_handlers.append(self.save_csv_spectrum)
         file_handlers.append(self.save_dat_spectrum)
         file_handlers.append(self.save_ooibase_spectrum)
+        file_handlers.append(self.save_history)
         file_handlers.append(self.save_gen_spectrum)
         # Open pick file dialog
         options = QFileDialog.Options()
@@ -639,6 +788,8 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
             f['spectrum'].attrs.create("Spectrometer serial", self.dev.SerialNumber)
             f['spectrum'].attrs.create("Boxcar width", self.dev.BoxcarWidth)
             f['spectrum'].attrs.create("Averages", self.dev.ScansToAverage)
+            f['spectrum'].attrs.create("Client averaging", self.accumulator.mode)
+            f['spectrum'].attrs.create("Client averaged spectra", self.accumulator.result()[2])
             f['spectrum'].attrs.create("Integration time", self.dev.IntegrationTime)
             f['spectrum'].attrs.create("Electrical dark subtraction", self.dev.enableElectricalDarkCorrection)
             f['spectrum'].attrs.create("Detector NL correction", self.dev.enableNLCorrection)
@@ -648,12 +799,7 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
     def save_csv_spectrum(self, filename):
         if re.match(".*\.csv$", filename) is None:
             filename += ".csv"
-
-        with open(filename, 'wt') as f:
-            wl = self.spectrum_plot.lines[0].get_xdata()
-            spec = self.spectrum_plot.lines[0].get_ydata()
-            for w, s in zip(wl, spec):
-                f.write("{0:.2f},{1:.3f}\n".format(w, s))
+        export.export_csv(filename, self.spectrum_plot.lines[0].get_xdata(), self.spectrum_plot.lines[0].get_ydata())
 
     def save_dat_spectrum(self, filename):
         if re.match(".*\.dat$", filename) is None:
@@ -661,43 +807,98 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
         self.save_gen_spectrum(filename)
 
     def save_gen_spectrum(self, filename):
-        with open(filename, 'wt') as f:
-            wl = self.spectrum_plot.lines[0].get_xdata()
-            spec = self.spectrum_plot.lines[0].get_ydata()
-            for w, s in zip(wl, spec):
-                f.write("{0:.2f}\t{1:.3f}\n".format(w, s))
+        export.export_dat(filename, self.spectrum_plot.lines[0].get_xdata(), self.spectrum_plot.lines[0].get_ydata())
 
     def save_ooibase_spectrum(self, filename):
         if re.match(".*\.Master\.Scope$", filename) is None:
             filename += ".Master.Scope"
 
-        with open(filename, 'wt') as f:
-            wl = self.spectrum_plot.lines[0].get_xdata()
-            spec = self.spectrum_plot.lines[0].get_ydata()
+        settings = {}
+        settings['serial'] = self.dev.SerialNumber
+        settings['model'] = self.dev.Model
+        settings['integration_time'] = self.dev.IntegrationTime
+        settings['averages'] = self.dev.ScansToAverage
+        settings['boxcar'] = self.dev.BoxcarWidth
+        settings['dark_correction'] = self.dev.enableElectricalDarkCorrection
+        export.export_ooibase(filename, self.spectrum_plot.lines[0].get_xdata(), self.spectrum_plot.lines[0].get_ydata(), settings)
+
+    def save_history(self, filename):
+        """ Save the spectra of the waterfall history, one per line """
+        if re.match(".*\.csv$", filename) is None:
+            filename += ".csv"
+        (data, times) = self.waterfall.buffer.snapshot()
+        if self.wl is None or len(data) == 0 or data.shape[1] != len(self.wl):
+            QtWidgets.QMessageBox.warning(self, "Nothing to save", "The spectra history is empty")
+            return
+        export.export_spectra(filename, self.wl, data, times)
 
-            f.write("OOIBase32 Version 2.0.6.3 Data File\n")
-            f.write("++++++++++++++++++++++++++++++++++++\n")
-            now = datetime.datetime.now()
-            f.write("Date: {0}\n".format(now.strftime("%m-%d-%Y, %H:%M:%S")))
-            f.write("User: Valued Ocean Optics Customer\n")
-            f.write("Spectrometer Serial Number: {0}\n".format(self.dev.SerialNumber))
-            f.write("Spectrometer Channel: Master\n")
-            f.write("Integration Time (msec): {0:d}\n".format(int(self.dev.IntegrationTime)))
-            f.write("Spectra Averaged: {0:d}\n".format(int(self.dev.ScansToAverage)))
-            f.write("Boxcar Smoothing: {0:d}\n".format(int(self.dev.BoxcarWidth)))
-            f.write("Correct for Electrical Dark: {0}\n".format("Enabled" if self.dev.enableElectricalDarkCorrection else "Disabled"))
-            f.write("Time Normalized: Disabled\n")
-            f.write("Dual-beam Reference: Disabled\n")
-            f.write("Reference Channel: Master\n")
-            f.write("Temperature: Not acquired\n")
-            f.write("Spectrometer Type: {0}\n".format(self.dev.Model))
-            f.write("ADC Type: {0}\n".format(self.dev.Model))
-            f.write("Number of Pixels in File: {0:d}\n".format(len(wl)))
-            f.write("Graph Title:\n")
-            f.write(">>>>>Begin Spectral Data<<<<<\n")
-            for w, s in zip(wl, spec):
-                f.write("{0:.2f}\t{1:.3f}\n".format(w, s))
-            f.write(">>>>>End Spectral Data<<<<<\n")
+    @QtCore.pyqtSlot()
+    def on_spec_waterfall_released(self):
+        """ Show or hide the waterfall """
+        self.waterfall.setVisible(self.spec_waterfall.isChecked())
+        if self.spec_waterfall.isChecked():
+            self.waterfall.refresh(self.wl)
+        self.spec_fig.tight_layout()
+
+    @QtCore.pyqtSlot()
+    def on_spec_record_released(self):
+        """ Start or stop recording spectra """
+        if self.recorder is None:
+            self.start_recording()
+        else:
+            self.stop_recording()
+        self.spec_record.setChecked(self.recorder is not None)
+
+    def start_recording(self):
+        """ Ask for a file and start recording all incoming spectra
+        """
+        if not self.dev or self.wl is None:
+            return
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filename, ext = QFileDialog.getSaveFileName(self, "Record spectra", "", "HDF5 file (*.h5)", options=options)
+        if not filename:
+            return
+        if re.match(".*\.h5$", filename) is None:
+            filename += ".h5"
+
+        metadata = {}
+        metadata["Spectrometer"] = self.dev.name()
+        metadata["Spectrometer model"] = self.spec_model.text()
+        metadata["Spectrometer serial"] = self.spec_serial.text()
+        try:
+            recorder = SpectrumRecorder(filename, self.wl, self.recorded_settings, metadata=metadata)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Failed to start recording", "Error: {0!s}".format(e))
+            return
+
+        # Initial value of the settings, later updated by events
+        for n in self.recorded_settings:
+            try:
+                recorder.record_setting(n, self.dev.read_attribute(n).value)
+            except PT.DevFailed:
+                pass
+        self.recorder = recorder
+        self.rec_timer.start(1000)
+        self.update_record_status()
+
+    def stop_recording(self):
+        """ Stop recording and close the file
+        """
+        if self.recorder is None:
+            return
+        recorder = self.recorder
+        self.recorder = None
+        self.rec_timer.stop()
+        recorder.stop()
+        self.spec_record.setChecked(False)
+        self.spec_rec_status.setText(" {0:d} spectra saved ({1:d} dropped)".format(recorder.recorded, recorder.dropped))
+
+    @QtCore.pyqtSlot()
+    def update_record_status(self):
+        recorder = self.recorder
+        if recorder is not None:
+            self.spec_rec_status.setText(" Recording: {0:d} spectra ({1:d} dropped)".format(recorder.recorded, recorder.dropped))
 
     @QtCore.pyqtSlot()
     def on_spec_delta_released(self):
@@ -780,22 +981,6 @@ class SpectrumViewer(QtWidgets.QMainWindow, Ui_SpectrumViewer):
         else:
             QtWidgets.QMainWindow.resizeEvent(self, event)
 
-    def getFWHM(self, wl, sp):
-        """ Compute the FWHM width of the spectrum. """
-        # ID of maximum value
-        max_id = np.argmax(sp)
-        if max_id == 0:
-            return (np.nan, np.nan)
-        # FWHM threshold
-        fwhm_th = (np.max(sp) +  np.min(sp)) / 2
-        # Absolute value of spectrum minus threshold
-        sp_abs = np.abs(sp - fwhm_th)
-        # Local minima (before and after the maximum)
-        x1 = np.argmin(sp_abs[0:max_id])
-        x2 = np.argmin(sp_abs[max_id:]) + max_id
-
-        return (wl[x1], wl[x2])
-
 
 if __name__ == "__main__":
     import sys
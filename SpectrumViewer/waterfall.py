@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:31:52 2026
+
+@author: Michele Devetta <michele.devetta@cnr.it>
+"""
+
+import threading
+import numpy as np
+
+from PyQt5 import QtWidgets
+
+# Matplotlib stuff
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+
+class WaterfallBuffer(object):
+    """ Circular buffer of the last spectra
+
+    Each spectrum is written twice, at row i and i + rows of a preallocated array of 2 * rows rows, so the
+    last rows spectra, from the oldest to the newest, are always the contiguous slice starting at the
+    next write position. No data is moved when a spectrum is added. add() can be called from any thread.
+    Rows not yet written are NaN.
+    """
+
+    def __init__(self, rows=200):
+        self.lock = threading.Lock()
+        self.rows = max(int(rows), 2)
+        self.alloc(0)
+
+    def alloc(self, size):
+        self.size = size
+        self.data = np.full((2 * self.rows, size), np.nan)
+        self.times = np.full(2 * self.rows, np.nan)
+        self.pos = 0
+        self.count = 0
+
+    def resize(self, rows):
+        """ Change the number of spectra kept. The buffer is cleared
+        """
+        with self.lock:
+            self.rows = max(int(rows), 2)
+            self.alloc(self.size)
+
+    def clear(self):
+        with self.lock:
+            self.alloc(self.size)
+
+    def add(self, timestamp, sp):
+        with self.lock:
+            if len(sp) != self.size:
+                self.alloc(len(sp))
+            i = self.pos
+            self.data[i] = sp
+            self.data[i + self.rows] = sp
+            self.times[i] = timestamp
+            self.times[i + self.rows] = timestamp
+            self.pos = (i + 1) % self.rows
+            self.count = min(self.count + 1, self.rows)
+
+    def view(self):
+        """ Return (spectra, timestamps, count) with the oldest spectrum first. Arrays are views of the buffer,
+            not copies, so rows may be overwritten by following spectra
+        """
+        with self.lock:
+            a = self.pos
+            b = self.pos + self.rows
+            return (self.data[a:b], self.times[a:b], self.count)
+
+    def snapshot(self):
+        """ Return a copy of the count spectra and timestamps in the buffer, oldest first
+        """
+        with self.lock:
+            b = self.pos + self.rows
+            a = b - self.count
+            return (self.data[a:b].copy(), self.times[a:b].copy())
+
+
+class WaterfallView(QtWidgets.QWidget):
+    """ Waterfall plot of the last spectra (wavelength vs time, newest on top)
+
+    The plot is a single animated image artist created once. The figure background is cached after each
+    full redraw and each refresh only replaces the image data and color limits, restores the background
+    and blits the image. A full redraw is done only when the time span of the buffer changes by more than
+    25%. The image assumes a uniformly spaced wavelength axis.
+    """
+
+    def __init__(self, rows=200, parent=None):
+        QtWidgets.QWidget.__init__(self, parent)
+        self.buffer = WaterfallBuffer(rows)
+
+        self.fig = Figure()
+        self.canvas = FigureCanvas(self.fig)
+        self.canvas.setParent(self)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_xlabel("Wavelength [nm]")
+        self.ax.set_ylabel("Time [s]")
+        self.image = None
+        self.extent = None
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+        vbox = QtWidgets.QVBoxLayout()
+        vbox.setContentsMargins(0, 0, 0, 0)
+        vbox.addWidget(self.canvas)
+        self.setLayout(vbox)
+
+    def on_draw(self, event):
+        """ Cache the background after a full redraw and paint the image over it
+        """
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        if self.image is not None:
+            self.fig.draw_artist(self.image)
+
+    def clear(self):
+        self.buffer.clear()
+        if self.image is not None:
+            self.image.remove()
+            self.image = None
+            self.extent = None
+            self.canvas.draw()
+
+    def refresh(self, wl):
+        """ Redraw with the current content of the buffer
+        """
+        if not self.isVisible() or wl is None:
+            return
+        (data, times, count) = self.buffer.view()
+        if count == 0 or data.shape[1] != len(wl):
+            return
+
+        # Time relative to the newest spectrum, from the mean interval between spectra
+        dt = (times[-1] - times[-count]) / (count - 1) if count > 1 else 0.0
+        if not dt > 0:
+            dt = 1.0
+        extent = (wl[0], wl[-1], -dt * (len(data) - 0.5), 0.5 * dt)
+        valid = data[-count:]
+        vmin = np.min(valid)
+        vmax = np.max(valid)
+        if vmax <= vmin:
+            vmax = vmin + 1.0
+
+        full = self.background is None
+        if self.image is None:
+            self.image = self.ax.imshow(data, origin='lower', aspect='auto', interpolation='nearest', extent=extent, vmin=vmin, vmax=vmax, animated=True)
+            self.extent = extent
+            self.fig.tight_layout()
+            full = True
+        else:
+            self.image.set_data(data)
+            self.image.set_clim(vmin, vmax)
+            if extent[0:2] != self.extent[0:2] or abs(extent[2] - self.extent[2]) > 0.25 * abs(self.extent[2]):
+                self.image.set_extent(extent)
+                self.extent = extent
+                full = True
+
+        if full:
+            # The background is cached by on_draw()
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.fig.draw_artist(self.image)
+            self.canvas.blit(self.fig.bbox)
@@ -12,9 +12,9 @@ modules = {
         'CryostarGUI': ['cryostar.py', 'Ui_cryostar.py'],
         'DryVacGUI': ['dryvac.py', 'Ui_dryvac.py'],
         'Icons': ['__init__.py', 'icons_rc.py'],
-        'LaserCamera': ['camerasetup.py', 'reference.py', 'lasercamera.py', 'Ui_lasercamera.py', 'Ui_camerasetup.py', 'Ui_reference.py'],
-        'PyQTango': ['AttributeTree.py', 'CommonTree.py', 'DeviceTree.py', '__init__.py', 'PyQTango_rc.py', 'TangoUtil.py', 'QAttribute.py', 'QCommandExecuter.py', 'QStatusLed.py'],
-        'SpectrumViewer': ['spectrumviewer.py', 'Ui_spectrumviewer_setscale.py', 'Ui_spectrumviewer.py'],
+        'LaserCamera': ['camerasetup.py', 'reference.py', 'imageview.py', 'recorder.py', 'pointing.py', 'beamanalysis.py', 'latency.py', 'lasercamera.py', 'Ui_lasercamera.py', 'Ui_camerasetup.py', 'Ui_reference.py'],
+        'PyQTango': ['AttributeTree.py', 'CommonTree.py', 'DeviceTree.py', '__init__.py', 'PyQTango_rc.py', 'TangoUtil.py', 'QAttribute.py', 'QCommandExecuter.py', 'QStatusLed.py', 'QRateLimiter.py', 'EventDispatcher.py'],
+        'SpectrumViewer': ['accumulator.py', 'spectralmetrics.py', 'recorder.py', 'waterfall.py', 'export.py', 'spectrumviewer.py', 'Ui_spectrumviewer_setscale.py', 'Ui_spectrumviewer.py'],
         'UdyniBrowser': ['browserconfig.xml', 'udynibrowser.py', 'Ui_udynibrowser.py']
 }
 